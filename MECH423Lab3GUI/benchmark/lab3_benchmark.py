@@ -0,0 +1,405 @@
+import argparse
+import atexit
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from ..motion.lab3_trajectory_planner import VelocityProfile, plan_line
+from ..serial_protocol.lab3_mcu_frame_decoder import MCUFrameDecoder
+from ..serial_protocol.lab3_serial_protocol import (
+    MCUPacket,
+    SerialControlBytes,
+    SerialPacket,
+)
+from ..telemetry.lab3_encoder_dsp import EncoderPipeline, VelocityEstimator
+from ..telemetry.lab3_lod_store import LodStore
+from ..telemetry.lab3_shared_telemetry import SharedTelemetryPublisher
+from ..worker.lab3_replay_worker import encode_mcu_packets
+
+BASELINE_PATH = Path(__file__).with_name("lab3_benchmark_baseline.json")
+# a case regresses once it is this much slower than its baseline, both relative
+# to the reference case
+REGRESSION_THRESHOLD = 0.25
+REPEAT = 15
+
+PACKAGE_ROOT = Path(__file__).parents[2]
+RX_CHUNK_SIZE = 4096
+RX_STREAM_PACKETS = 1 << 16
+
+
+# a benchmark case returns the function to time and how many items one call
+# handles, results are reported per item
+BenchmarkCase = Callable[[], tuple[Callable[[], object], int]]
+
+
+# a fixed mix of interpreter and small NumPy work, timed alongside every case so
+# that a slower machine or a busy moment slows both down alike
+def bench_reference():
+    values = list(range(256))
+    data = np.arange(256, dtype=np.float64)
+
+    def run():
+        total = 0
+        for value in values:
+            total += value * value
+        return total + float(np.cumsum(data)[-1])
+
+    return run, 1
+
+
+def _rx_stream(corruption: float) -> bytes:
+    rng = np.random.default_rng(423)
+    counts = rng.integers(0, 0x10000, RX_STREAM_PACKETS, dtype=np.uint16)
+    stream = np.frombuffer(encode_mcu_packets(counts), np.uint8).copy()
+    corrupted = rng.random(len(stream)) < corruption
+    stream[corrupted] = rng.integers(0, 0x100, int(corrupted.sum()), dtype=np.uint8)
+    return stream.tobytes()
+
+
+def _rx_resync(corruption: float) -> tuple[Callable[[], object], int]:
+    stream = _rx_stream(corruption)
+    chunks = [
+        stream[start : start + RX_CHUNK_SIZE]
+        for start in range(0, len(stream), RX_CHUNK_SIZE)
+    ]
+    decoder = MCUFrameDecoder()
+
+    def run():
+        decoder.reset()
+        for chunk in chunks:
+            decoder.feed_batch(chunk, 0)
+
+    return run, RX_STREAM_PACKETS
+
+
+def bench_serial_packet_to_bytearray():
+    packet = SerialPacket(
+        SerialControlBytes.DC_MOTOR_ABSOLUTE_POSITION, bytearray([0x00, 0x2C, 0x01])
+    )
+    return packet.to_bytearray, 1
+
+
+def bench_mcu_packet_from_bytes():
+    data = bytes([0xFF, 0x40, 0x00, 0x3F])
+    return lambda: MCUPacket.from_bytes(data), 1
+
+
+def bench_rx_resync_clean():
+    return _rx_resync(0)
+
+
+def bench_rx_resync_corrupted():
+    # roughly one corrupted byte every 400 packets
+    return _rx_resync(1 / 1600)
+
+
+def _dc_motor_widget():
+    from PySide6.QtWidgets import QApplication
+
+    from ..function_block.lab3_dc_motor_widget import DCMotorWidget
+
+    app = QApplication.instance() or QApplication([])
+    widget = DCMotorWidget()
+    widget.show()
+    app.processEvents()
+    return widget
+
+
+def bench_dc_motor_update_plot():
+    widget = _dc_motor_widget()
+    samples = 1000
+    start = datetime.now()
+    values = [
+        (0x4000 + (i % 200), start + timedelta(milliseconds=i)) for i in range(samples)
+    ]
+
+    def run():
+        for value in values:
+            widget.update_plot(value)
+        widget.redraw()
+
+    return run, samples
+
+
+def bench_dc_motor_update_plot_batch():
+    widget = _dc_motor_widget()
+    # one serial read worth of packets at 1 kHz telemetry and 30 fps
+    samples = 33
+    counts = (0x4000 + np.arange(samples) % 200).astype(np.uint16)
+    timestamps_ns = np.arange(samples, dtype=np.int64) * 1_000_000
+
+    def run():
+        widget.update_plot_batch(counts, timestamps_ns)
+        widget.redraw()
+
+    return run, samples
+
+
+def _encoder_pipeline(estimator: VelocityEstimator):
+    pipeline = EncoderPipeline(estimator)
+    # one serial read worth of packets, as in dc_motor_update_plot_batch
+    samples = 33
+    counts = (0x4000 + np.arange(samples) * 7 % 0x10000).astype(np.uint16)
+    timestamps_ns = np.arange(samples, dtype=np.int64) * 1_000_000
+
+    def run():
+        pipeline.process(counts, timestamps_ns + run.offset_ns)
+        run.offset_ns += samples * 1_000_000
+
+    run.offset_ns = 0
+    return run, samples
+
+
+def bench_encoder_moving_regression():
+    return _encoder_pipeline(VelocityEstimator.MOVING_REGRESSION)
+
+
+def bench_encoder_savitzky_golay():
+    return _encoder_pipeline(VelocityEstimator.SAVITZKY_GOLAY)
+
+
+def bench_encoder_alpha_beta():
+    return _encoder_pipeline(VelocityEstimator.ALPHA_BETA)
+
+
+def bench_lod_store_append():
+    store = LodStore(2)
+    samples = 33
+    x = np.arange(samples) * 1e-3
+    values = np.sin(x)
+
+    def run():
+        store.append(x + run.offset, values, values)
+        run.offset += samples * 1e-3
+
+    run.offset = 0.0
+    return run, samples
+
+
+def bench_lod_store_query():
+    # an hour of 1 kHz telemetry, queried over a range that moves each call
+    store = LodStore(2)
+    x = np.arange(3_600_000) * 1e-3
+    store.append(x, np.sin(x), np.cos(x))
+    ranges = [(start, start + 600.0) for start in np.linspace(0, 3000, 64)]
+
+    def run():
+        for x_start, x_stop in ranges:
+            store.query(x_start, x_stop, 4000)
+
+    return run, len(ranges)
+
+
+def bench_shared_telemetry_publish():
+    # one serial read worth of samples, the ring wraps many times over
+    publisher = SharedTelemetryPublisher(f"mech423_lab3_benchmark{os.getpid()}", 4096)
+    atexit.register(publisher.close)
+    samples = 33
+    counts = (np.arange(samples) * 97 % 0x10000).astype(np.uint16)
+    timestamps_ns = np.arange(samples, dtype=np.int64) * 1_000_000
+
+    def run():
+        publisher.publish(counts, timestamps_ns)
+
+    return run, samples
+
+
+def bench_two_axis_generation():
+    trajectory = plan_line(20, 15, 12.5, 50, VelocityProfile.S_CURVE)
+    packet_count = len(trajectory)
+
+    def run():
+        plan_line(20, 15, 12.5, 50, VelocityProfile.S_CURVE).frames
+
+    return run, packet_count
+
+
+# startup runs in a fresh interpreter every time, so that nothing is cached
+STARTUP_IMPORT_SCRIPT = "import MECH423Lab3GUI.window.lab3_main_window"
+STARTUP_WINDOW_SCRIPT = """
+import os
+
+from PySide6.QtCore import QEvent, QObject
+from PySide6.QtWidgets import QApplication
+
+app = QApplication([])
+
+from MECH423Lab3GUI.window.lab3_main_window import Lab3MainWindow
+
+
+class FirstPaint(QObject):
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Type.Paint:
+            os._exit(0)
+        return False
+
+
+window = Lab3MainWindow()
+first_paint = FirstPaint()
+window.installEventFilter(first_paint)
+window.show()
+app.exec()
+"""
+
+
+def _startup(script: str):
+    def run():
+        subprocess.run([sys.executable, "-c", script], cwd=PACKAGE_ROOT, check=True)
+
+    return run, 1
+
+
+def bench_startup_import():
+    return _startup(STARTUP_IMPORT_SCRIPT)
+
+
+def bench_startup_window():
+    # until the window is first painted, deferred widgets are built after it
+    return _startup(STARTUP_WINDOW_SCRIPT)
+
+
+BENCHMARKS: dict[str, BenchmarkCase] = {
+    "serial_packet_to_bytearray": bench_serial_packet_to_bytearray,
+    "mcu_packet_from_bytes": bench_mcu_packet_from_bytes,
+    "rx_resync_clean": bench_rx_resync_clean,
+    "rx_resync_corrupted": bench_rx_resync_corrupted,
+    "dc_motor_update_plot": bench_dc_motor_update_plot,
+    "dc_motor_update_plot_batch": bench_dc_motor_update_plot_batch,
+    "encoder_moving_regression": bench_encoder_moving_regression,
+    "encoder_savitzky_golay": bench_encoder_savitzky_golay,
+    "encoder_alpha_beta": bench_encoder_alpha_beta,
+    "lod_store_append": bench_lod_store_append,
+    "lod_store_query": bench_lod_store_query,
+    "shared_telemetry_publish": bench_shared_telemetry_publish,
+    "two_axis_generation": bench_two_axis_generation,
+    "startup_import": bench_startup_import,
+    "startup_window": bench_startup_window,
+}
+
+
+# returns the case in ns per item and relative to the reference case, the two
+# alternate so that both see the same disturbances
+def run_benchmark(case: BenchmarkCase, repeat: int = REPEAT) -> tuple[float, float]:
+    timers = []
+    for benchmark in (case, bench_reference):
+        function, items = benchmark()
+        timer = timeit.Timer(function)
+        number, _ = timer.autorange()
+        timers.append((timer, number, items, []))
+    for _ in range(repeat):
+        for timer, number, _, times in timers:
+            times.append(timer.timeit(number))
+
+    # the fastest repeat is the least disturbed by the rest of the system
+    ns_per_item, reference_ns = (
+        min(times) / number / items * 1e9 for _, number, items, times in timers
+    )
+    return ns_per_item, ns_per_item / reference_ns
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baseline(
+    ns_per_item: dict[str, float],
+    relative: dict[str, float],
+    path: Path = BASELINE_PATH,
+) -> None:
+    path.write_text(
+        json.dumps(
+            {
+                "machine": platform.platform(),
+                "python": platform.python_version(),
+                # for reference only, runs are compared relative to the
+                # reference case
+                "ns_per_item": {
+                    name: round(value, 1) for name, value in ns_per_item.items()
+                },
+                "relative": {
+                    name: float(f"{value:.4g}") for name, value in relative.items()
+                },
+            },
+            indent=2,
+        )
+        + "\n"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the protocol and plotting hot paths against a baseline"
+    )
+    parser.add_argument("cases", nargs="*", help="all cases if none are given")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="record cases that are not in the baseline yet",
+    )
+    parser.add_argument(
+        "--rebaseline",
+        action="store_true",
+        help="also replace recorded cases, only in a commit of its own",
+    )
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    arguments = parser.parse_args()
+    for name in arguments.cases:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown case {name}, choose from {', '.join(BENCHMARKS)}")
+
+    # plots are drawn without a display
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    baseline = load_baseline(arguments.baseline)
+    recorded = baseline.get("relative", {})
+    if baseline.get("python", platform.python_version()) != platform.python_version():
+        print(
+            f"baseline recorded with Python {baseline['python']}, cases may shift "
+            "by different amounts between versions"
+        )
+    ns_per_item: dict[str, float] = {}
+    relative: dict[str, float] = {}
+    regressions = []
+    for name in arguments.cases or BENCHMARKS:
+        ns_per_item[name], relative[name] = run_benchmark(
+            BENCHMARKS[name], arguments.repeat
+        )
+        line = f"{name:32s} {ns_per_item[name]:12.1f} ns/item"
+        if name in recorded:
+            ratio = relative[name] / recorded[name]
+            line += f" {ratio:6.2f}x baseline"
+            if ratio > 1 + arguments.threshold:
+                regressions.append(name)
+                line += " REGRESSION"
+        print(line)
+
+    if arguments.save_baseline or arguments.rebaseline:
+        # a baseline re-recorded along with a change hides its regressions
+        if not arguments.rebaseline:
+            ns_per_item = {
+                name: value
+                for name, value in ns_per_item.items()
+                if name not in recorded
+            }
+            relative = {name: relative[name] for name in ns_per_item}
+        save_baseline(
+            baseline.get("ns_per_item", {}) | ns_per_item,
+            recorded | relative,
+            arguments.baseline,
+        )
+        print(f"{len(relative)} cases saved to {arguments.baseline}")
+    if regressions and not arguments.rebaseline:
+        print(f"{len(regressions)} regressions over {arguments.threshold:.0%}")
+        sys.exit(1)
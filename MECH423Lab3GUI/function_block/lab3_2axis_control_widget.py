@@ -1,20 +1,35 @@
 from loguru import logger
-from PySide6.QtCore import Qt, QTimer, Signal
-from PySide6.QtWidgets import QDoubleSpinBox, QGroupBox, QHBoxLayout, QPushButton
-
-from ..serial_protocol.lab3_serial_protocol import SerialControlBytes, SerialPacket
+from PySide6.QtCore import Signal
+from PySide6.QtWidgets import (
+    QComboBox,
+    QDoubleSpinBox,
+    QFileDialog,
+    QGroupBox,
+    QHBoxLayout,
+    QLabel,
+    QProgressBar,
+    QPushButton,
+    QVBoxLayout,
+)
+
+from ..motion.lab3_toolpath import StreamingTrajectoryPlanner, ToolpathReader
+from ..motion.lab3_trajectory_planner import (
+    TWO_AXIS_MAX_SPEED_CM_S,
+    VelocityProfile,
+    plan_line,
+)
 
 
 class TwoAxisControlWidget(QGroupBox):
-    signal_serial_write = Signal(bytearray)
+    signal_serial_write = Signal(bytearray, "qint64")
+    # trajectories are streamed by whoever owns the serial link
+    signal_start_trajectory = Signal(object)
+    signal_start_trajectory_stream = Signal(object)
+    signal_stop_trajectory = Signal()
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        self.__timer = QTimer()
-        self.__timer.setTimerType(Qt.TimerType.PreciseTimer)
-        self.__timer.timeout.connect(self.__slot_on_timer_timeout)
-
         self.setTitle("2-Axis Control")
 
         self.__x_input = QDoubleSpinBox()
@@ -28,78 +43,106 @@ class TwoAxisControlWidget(QGroupBox):
         self.__y_input.setSuffix("cm")
 
         self.__speed_input = QDoubleSpinBox()
-        self.__speed_input.setRange(0, 100)
+        self.__speed_input.setRange(1, 100)
         self.__speed_input.setValue(100)
         self.__speed_input.setPrefix("Speed: ")
         self.__speed_input.setSuffix("%")
 
+        self.__acceleration_input = QDoubleSpinBox()
+        self.__acceleration_input.setRange(1, 1000)
+        self.__acceleration_input.setValue(50)
+        self.__acceleration_input.setPrefix("Accel: ")
+        self.__acceleration_input.setSuffix("cm/s²")
+
+        self.__profile_combobox = QComboBox()
+        for profile in VelocityProfile:
+            self.__profile_combobox.addItem(profile.value, profile)
+
         self.__button = QPushButton("Move")
         self.__button.clicked.connect(self.__slot_on_move_pushed)
 
-        self.setLayout(QHBoxLayout())
-        self.layout().addWidget(self.__x_input)
-        self.layout().addWidget(self.__y_input)
-        self.layout().addWidget(self.__speed_input)
-        self.layout().addWidget(self.__button)
+        move_layout = QHBoxLayout()
+        move_layout.addWidget(self.__x_input)
+        move_layout.addWidget(self.__y_input)
+        move_layout.addWidget(self.__speed_input)
+        move_layout.addWidget(self.__acceleration_input)
+        move_layout.addWidget(self.__profile_combobox)
+        move_layout.addWidget(self.__button)
+
+        # toolpath files
+        self.__load_path_button = QPushButton("Run Path...")
+        self.__load_path_button.clicked.connect(self.__slot_on_load_path_pushed)
+        self.__stop_button = QPushButton("Stop")
+        self.__stop_button.clicked.connect(self.signal_stop_trajectory)
+        self.__path_progress_bar = QProgressBar()
+        self.__path_progress_bar.setRange(0, 1000)
+        self.__path_statistics_label = QLabel()
+
+        path_layout = QHBoxLayout()
+        path_layout.addWidget(self.__load_path_button)
+        path_layout.addWidget(self.__stop_button)
+        path_layout.addWidget(self.__path_progress_bar)
+
+        self.setLayout(QVBoxLayout())
+        self.layout().addLayout(move_layout)  # type: ignore
+        self.layout().addLayout(path_layout)  # type: ignore
+        self.layout().addWidget(self.__path_statistics_label)
 
     def __slot_on_move_pushed(self):
-        self.__timer.stop()
-
-        x_input_cm = self.__x_input.value()
-        x_input_encoder_tick = x_input_cm * 58
+        self.signal_stop_trajectory.emit()
 
-        y_input_cm = self.__y_input.value()
-        y_input_step = y_input_cm * 100
-
-        timer_interval_ms = 8
-        self.__timer_count = int(((x_input_cm**2 + y_input_cm**2) ** 0.5) * 10)
-        if self.__timer_count == 0:
+        try:
+            trajectory = plan_line(
+                self.__x_input.value(),
+                self.__y_input.value(),
+                TWO_AXIS_MAX_SPEED_CM_S * self.__speed_input.value() / 100,
+                self.__acceleration_input.value(),
+                self.__profile_combobox.currentData(),
+            )
+        except ValueError as e:
+            logger.error(f"cannot plan move: {e}")
+            return
+        if len(trajectory) == 0:
             return
 
-        total_time_ms = self.__timer_count * timer_interval_ms
+        logger.info(
+            f"Start moving {len(trajectory)} total steps, {trajectory.x_steps.sum()} encoder ticks and {trajectory.y_steps.sum()} half steps in {trajectory.duration_s:.2f}s"
+        )
+        self.signal_start_trajectory.emit(trajectory)
+        self.__set_moving(True)
 
-        self.__x_step = int(x_input_encoder_tick / self.__timer_count)
-        self.__y_step = int(y_input_step / self.__timer_count)
+    def __slot_on_load_path_pushed(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Run Toolpath", "", "Toolpath (*.gcode *.nc *.ngc *.csv)"
+        )
+        if not path:
+            return
 
-        try:
-            stepper_interval_ms = (
-                total_time_ms / abs(y_input_step) / (self.__speed_input.value() / 100)
+        self.signal_stop_trajectory.emit()
+        # parsing and planning happen lazily while the path is streamed
+        self.signal_start_trajectory_stream.emit(
+            StreamingTrajectoryPlanner(
+                ToolpathReader(
+                    path, TWO_AXIS_MAX_SPEED_CM_S * self.__speed_input.value() / 100
+                ),
+                self.__acceleration_input.value(),
+                self.__profile_combobox.currentData(),
             )
-            self.__stepper_speed_interval = int(stepper_interval_ms / 1e3 * 8e6)
-        except Exception:
-            self.__stepper_speed_interval = 0xFF
-
-        self.__timer.start(int(timer_interval_ms / (self.__speed_input.value() / 100)))
-        logger.info(
-            f"Start moving {self.__timer_count} total steps with X step {self.__x_step} encoder ticks and Y step {self.__y_step} half steps"
+        )
+        logger.info(f"Start running toolpath {path}")
+        self.__set_moving(True)
+
+    def update_trajectory_progress(self, sent: int, total: int):
+        if total >= 0 and sent >= total:
+            self.__set_moving(False)
+
+    def update_trajectory_statistics(self, statistics: dict):
+        if statistics["source_progress"] is not None:
+            self.__path_progress_bar.setValue(int(statistics["source_progress"] * 1000))
+        self.__path_statistics_label.setText(
+            f"Sent: {statistics['sent']}, buffered: {statistics['buffered']}, {statistics['packets_per_s']:.0f} packets/s, underruns: {statistics['underruns']}"
         )
 
-        self.__button.setDisabled(True)
-
-    def __slot_on_timer_timeout(self):
-        if self.isEnabled():
-            if self.__timer_count > 0:
-                self.__timer_count -= 1
-
-                logger.debug(f"{self.__timer_count}")
-                self.signal_serial_write.emit(
-                    SerialPacket(
-                        SerialControlBytes.TWO_AXIS_CONTROL,
-                        bytearray([0x00])
-                        + bytearray(  # DC motor relative position
-                            self.__x_step.to_bytes(2, "little", signed=True)
-                        )
-                        + bytearray(  # stepper motor speed
-                            self.__stepper_speed_interval.to_bytes(
-                                2, "little", signed=False
-                            )
-                        )
-                        + bytearray(  # stepper motor relative position
-                            self.__y_step.to_bytes(2, "little", signed=True)
-                        ),
-                    ).to_bytearray()
-                )
-            else:
-                self.__timer.stop()
-                self.__button.setEnabled(True)
-                return
+    def __set_moving(self, moving: bool):
+        self.__button.setDisabled(moving)
+        self.__load_path_button.setDisabled(moving)
@@ -1,16 +1,43 @@
+import time
 from datetime import datetime
 
+import numpy as np
 from loguru import logger
-from pyqtgraph import GraphicsLayoutWidget
-from PySide6.QtCore import Signal
-from PySide6.QtWidgets import QGroupBox, QHBoxLayout, QPushButton, QSpinBox, QVBoxLayout
+from PySide6.QtCore import QTimer, Signal
+from PySide6.QtWidgets import (
+    QCheckBox,
+    QComboBox,
+    QGroupBox,
+    QHBoxLayout,
+    QPushButton,
+    QSpinBox,
+    QVBoxLayout,
+    QWidget,
+)
 
-from ..serial_protocol.lab3_serial_protocol import SerialControlBytes, SerialPacket
+from ..instrumentation.lab3_metrics import metrics
+from ..serial_protocol.lab3_motor_commands import (
+    dc_motor_absolute_position_command,
+    dc_motor_duty_command,
+    dc_motor_relative_position_command,
+)
+from ..telemetry.lab3_encoder_dsp import (
+    ENCODER_COUNTS_PER_CYCLE,
+    EncoderPipeline,
+    VelocityEstimator,
+)
+from ..telemetry.lab3_lod_store import LodStore
+from ..widget.lazy_widget import LazyWidget
+from ..widget.plot_theme import load_pyqtgraph
 from ..widget.valued_slider import ValuedSlider
 
+# points handed to a curve per redraw, about two per horizontal pixel
+PLOT_MAX_POINTS = 4000
+
 
 class DCMotorWidget(QGroupBox):
-    signal_serial_write = Signal(bytearray)
+    # frames with the perf_counter_ns time the user issued them
+    signal_serial_write = Signal(bytearray, "qint64")
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -59,36 +86,94 @@ class DCMotorWidget(QGroupBox):
         left_slider_layout.addWidget(dc_motor_duty_group_box)
         left_slider_layout.addWidget(dc_motor_position_group_box)
 
-        # data plot
-        self.__graphics_layout_widget = GraphicsLayoutWidget()
-        self.__position_plot = self.__graphics_layout_widget.addPlot(
-            title="Position", row=0, col=0
+        # data plot, built when first shown
+        self.__plot_widget = LazyWidget(self.__create_plot_widget)
+        self.__position_plot = None
+        self.__velocity_plot = None
+
+        self.__history_spinbox = QSpinBox()
+        self.__history_spinbox.setRange(100, 1_000_000)
+        self.__history_spinbox.setSingleStep(100)
+        self.__history_spinbox.setValue(1000)
+        self.__history_spinbox.setPrefix("Live: ")
+        self.__history_spinbox.setSuffix(" samples")
+        self.__history_spinbox.valueChanged.connect(self.__slot_on_history_changed)
+
+        self.__encoder_pipeline = EncoderPipeline()
+        self.__velocity_estimator_combo_box = QComboBox()
+        for estimator in VelocityEstimator:
+            self.__velocity_estimator_combo_box.addItem(estimator.value, estimator)
+        self.__velocity_estimator_combo_box.setCurrentIndex(
+            self.__velocity_estimator_combo_box.findData(
+                self.__encoder_pipeline.estimator
+            )
+        )
+        self.__velocity_estimator_combo_box.currentIndexChanged.connect(
+            self.__slot_on_velocity_estimator_changed
         )
-        self.__position_plot.setLabel("left", "Position (Cycle)")
 
-        self.__velocity_plot = self.__graphics_layout_widget.addPlot(
-            title="Velocity", row=1, col=0
+        # the whole history, position and velocity
+        self.__lod_store = LodStore(2)
+        self.__spill_check_box = QCheckBox("Spill to Disk")
+        self.__spill_check_box.toggled.connect(self.__lod_store.set_spill_to_disk)
+        self.__clear_button = QPushButton("Clear")
+        self.__clear_button.clicked.connect(self.clear)
+
+        plot_settings_layout = QHBoxLayout()
+        plot_settings_layout.addWidget(self.__history_spinbox)
+        plot_settings_layout.addWidget(self.__velocity_estimator_combo_box)
+        plot_settings_layout.addWidget(self.__spill_check_box)
+        plot_settings_layout.addWidget(self.__clear_button)
+
+        self.__update_histogram = metrics.histogram(
+            "plot_update_time_ns", "Time to append one batch to the plot history"
         )
-        self.__velocity_plot.setLabel("left", "Velocity (RPM)")
+        self.__redraw_histogram = metrics.histogram(
+            "plot_redraw_time_ns", "Time to query the plot history into the curves"
+        )
+        self.__plot_timer_lateness_histogram = metrics.histogram(
+            "plot_timer_lateness_ns", "Lateness of the plot frame timer"
+        )
+        self.__plot_timer_ns = time.perf_counter_ns()
 
-        self.__x_data = []
-        self.__y_data1 = []
-        self.__y_data2 = [0]
+        self.__plot_dirty = False
+        self.__plot_timer = QTimer()
+        self.__plot_timer.timeout.connect(self.__slot_on_plot_timer_timeout)
+        self.__plot_timer.start(1000 // 30)
 
         dc_motor_data_plot_group_box = QGroupBox("Data Plot")
-        dc_motor_data_plot_group_box.setLayout(QHBoxLayout())
-        dc_motor_data_plot_group_box.layout().addWidget(self.__graphics_layout_widget)
+        dc_motor_data_plot_group_box.setLayout(QVBoxLayout())
+        dc_motor_data_plot_group_box.layout().addLayout(plot_settings_layout)  # type: ignore
+        dc_motor_data_plot_group_box.layout().addWidget(self.__plot_widget)
 
         self.setLayout(QHBoxLayout())
         self.layout().addLayout(left_slider_layout)  # type: ignore
-        # self.layout().addWidget(dc_motor_data_plot_group_box)
+        self.layout().addWidget(dc_motor_data_plot_group_box)
+
+    def __create_plot_widget(self) -> QWidget:
+        graphics_layout_widget = load_pyqtgraph().GraphicsLayoutWidget()
+        self.__position_plot = graphics_layout_widget.addPlot(
+            title="Position", row=0, col=0
+        )
+        self.__position_plot.setLabel("left", "Position (Cycle)")
+        self.__position_curve = self.__position_plot.plot(pen="r")
+
+        self.__velocity_plot = graphics_layout_widget.addPlot(
+            title="Velocity", row=1, col=0
+        )
+        self.__velocity_plot.setLabel("left", "Velocity (RPM)")
+        self.__velocity_plot.setXLink(self.__position_plot)
+        self.__velocity_curve = self.__velocity_plot.plot(pen="g")
+
+        # the visible range is queried from the level of detail store once
+        # the view no longer follows the newest samples
+        self.__position_plot.sigXRangeChanged.connect(self.__slot_on_x_range_changed)
+        self.__plot_dirty = True
+        return graphics_layout_widget
 
     def __slot_on_dc_motor_duty_changed(self, value: int):
         self.signal_serial_write.emit(
-            SerialPacket(
-                SerialControlBytes.DC_MOTOR_OPEN_LOOP_VOLTAGE,
-                bytearray([int(value > 0), abs(value) >> 8, abs(value) & 0x00FF]),
-            ).to_bytearray()
+            dc_motor_duty_command(value), time.perf_counter_ns()
         )
         logger.info(
             f"DC motor duty changed to {abs(value)}, direction: {int(value > 0)}"
@@ -96,48 +181,94 @@ class DCMotorWidget(QGroupBox):
 
     def update_plot(self, value: tuple[int, datetime]):
         count, time = value
+        self.update_plot_batch(
+            np.array([count], np.uint16),
+            np.array([int(time.timestamp() * 1e9)], np.int64),
+        )
 
-        self.__x_data.append(time.timestamp())
-        count_in_cycle = (count - 0x4000) / (20.4 * 48 / 4)
-        self.__y_data1.append(count_in_cycle)
-        if len(self.__y_data1) >= 2:
-            self.__y_data2.append(
-                (self.__y_data1[-1] - self.__y_data1[-2])
-                / (self.__x_data[-1] - self.__x_data[-2])
-                * 60
-            )
+    def update_plot_batch(self, counts: np.ndarray, timestamps_ns: np.ndarray):
+        if len(counts) == 0:
+            return
+        start_ns = time.perf_counter_ns()
+
+        # unwrapped, dejittered and filtered before it is plotted
+        samples = self.__encoder_pipeline.process(counts, timestamps_ns)
+        if samples.timestamps_ns[0] / 1e9 < self.__lod_store.x_last:
+            # a different session, e.g. a replay after live data, starts over
+            logger.warning("telemetry went back in time, plot history cleared")
+            self.clear()
+            samples = self.__encoder_pipeline.process(counts, timestamps_ns)
+        self.__lod_store.append(
+            samples.timestamps_ns / 1e9,
+            samples.positions / ENCODER_COUNTS_PER_CYCLE,
+            samples.velocities / ENCODER_COUNTS_PER_CYCLE * 60,
+        )
+        self.__plot_dirty = True
+        self.__update_histogram.record(time.perf_counter_ns() - start_ns)
+
+    def set_plot_frame_rate(self, frame_rate: float):
+        self.__plot_timer.setInterval(max(1, int(1000 / frame_rate)))
 
-        self.__x_data = self.__x_data[-100:]
-        self.__y_data1 = self.__y_data1[-100:]
-        self.__y_data2 = self.__y_data2[-100:]
+    def redraw(self):
+        self.__plot_widget.ensure_created()
+        self.__plot_dirty = False
+        start_ns = time.perf_counter_ns()
 
-        self.__position_plot.clear()
-        self.__position_plot.plot(self.__x_data, self.__y_data1, pen="r", symbol="o")
+        view_box = self.__position_plot.getViewBox()  # type: ignore
+        x_start, x_stop = view_box.viewRange()[0]
+        if view_box.autoRangeEnabled()[0]:
+            # follow the newest samples
+            first = max(len(self.__lod_store) - self.__history_spinbox.value(), 0)
+            x_start = self.__lod_store.x_at(first) if self.__lod_store else 0.0
+            x_stop = np.inf
+        x_data, y_data = self.__lod_store.query(x_start, x_stop, PLOT_MAX_POINTS)
+        self.__position_curve.setData(x_data, y_data[0])
+        self.__velocity_curve.setData(x_data, y_data[1])
+        self.__redraw_histogram.record(time.perf_counter_ns() - start_ns)
 
-        self.__velocity_plot.clear()
-        self.__velocity_plot.plot(self.__x_data, self.__y_data2, pen="g", symbol="o")
+    def __slot_on_plot_timer_timeout(self):
+        now_ns = time.perf_counter_ns()
+        self.__plot_timer_lateness_histogram.record(
+            now_ns - self.__plot_timer_ns - self.__plot_timer.interval() * 1_000_000
+        )
+        self.__plot_timer_ns = now_ns
+        if self.__plot_dirty and self.isVisible():
+            self.redraw()
+
+    def __slot_on_history_changed(self, value: int):
+        self.__plot_dirty = True
+
+    def __slot_on_x_range_changed(self):
+        self.__plot_dirty = True
+
+    def clear(self):
+        self.__lod_store.clear()
+        self.__encoder_pipeline.reset()
+        if self.__position_plot is not None and self.__velocity_plot is not None:
+            self.__position_plot.enableAutoRange()
+            self.__velocity_plot.enableAutoRange()
+        self.__plot_dirty = True
+
+    def __slot_on_velocity_estimator_changed(self, index: int):
+        self.__encoder_pipeline.set_estimator(
+            self.__velocity_estimator_combo_box.itemData(index)
+        )
+        logger.info(
+            f"velocity estimator changed to {self.__encoder_pipeline.estimator.value}"
+        )
 
     def __slot_on_absolute_position_changed(self, value: int):
         self.signal_serial_write.emit(
-            SerialPacket(
-                SerialControlBytes.DC_MOTOR_ABSOLUTE_POSITION,
-                bytearray([0x00])+
-                bytearray(value.to_bytes(length=2, byteorder="little", signed=True)),
-            ).to_bytearray()
+            dc_motor_absolute_position_command(value), time.perf_counter_ns()
         )
         logger.info(f"DC motor absolute position changed to {value}")
 
     def __slot_on_relative_position_changed(self):
         self.signal_serial_write.emit(
-            SerialPacket(
-                SerialControlBytes.DC_MOTOR_RELATIVE_POSITION,
-                bytearray([0x00])+
-                bytearray(
-                    self.__dc_motor_position_increment_spinbox.value().to_bytes(
-                        length=2, byteorder="little", signed=True
-                    )
-                ),
-            ).to_bytearray()
+            dc_motor_relative_position_command(
+                self.__dc_motor_position_increment_spinbox.value()
+            ),
+            time.perf_counter_ns(),
         )
 
         self.__dc_motor_position_slider.blockSignals(True)
@@ -1,3 +1,5 @@
+import time
+
 from loguru import logger
 from PySide6.QtCore import Signal
 from PySide6.QtWidgets import (
@@ -9,12 +11,15 @@ from PySide6.QtWidgets import (
     QVBoxLayout,
 )
 
-from ..serial_protocol.lab3_serial_protocol import SerialControlBytes, SerialPacket
+from ..serial_protocol.lab3_motor_commands import (
+    stepper_motor_single_step_command,
+    stepper_motor_speed_command,
+)
 from ..widget.valued_slider import ValuedSlider
 
 
 class StepperMotorWidget(QGroupBox):
-    signal_serial_write = Signal(bytearray)
+    signal_serial_write = Signal(bytearray, "qint64")
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -31,12 +36,12 @@ class StepperMotorWidget(QGroupBox):
         self.__speed_widget.signal_serial_write.connect(self.__slot_on_serial_write)
         self.layout().addWidget(self.__speed_widget)
 
-    def __slot_on_serial_write(self, message: bytearray):
-        self.signal_serial_write.emit(message)
+    def __slot_on_serial_write(self, message: bytearray, issued_ns: int):
+        self.signal_serial_write.emit(message, issued_ns)
 
 
 class StepperMotorSingleStepWidget(QGroupBox):
-    signal_serial_write = Signal(bytearray)
+    signal_serial_write = Signal(bytearray, "qint64")
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -63,25 +68,19 @@ class StepperMotorSingleStepWidget(QGroupBox):
     def __slot_on_stepper_motor_single_step(self, button: QAbstractButton):
         if button is self.__stepper_motor_single_step_cw_button:
             self.signal_serial_write.emit(
-                SerialPacket(
-                    SerialControlBytes.STEPPER_MOTOR_SINGLE_STEP,
-                    bytearray([1]),
-                ).to_bytearray()
+                stepper_motor_single_step_command(True), time.perf_counter_ns()
             )
             logger.info("stepper motor cw single step")
 
         elif button is self.__stepper_motor_single_step_ccw_button:
             self.signal_serial_write.emit(
-                SerialPacket(
-                    SerialControlBytes.STEPPER_MOTOR_SINGLE_STEP,
-                    bytearray([0]),
-                ).to_bytearray()
+                stepper_motor_single_step_command(False), time.perf_counter_ns()
             )
             logger.info("stepper motor ccw single step")
 
 
 class StepperMotorOpenLoopSpeedWidget(QGroupBox):
-    signal_serial_write = Signal(bytearray)
+    signal_serial_write = Signal(bytearray, "qint64")
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -97,13 +96,8 @@ class StepperMotorOpenLoopSpeedWidget(QGroupBox):
         self.layout().addWidget(self.__valued_slider)
 
     def __slot_on_speed_changed(self, value: int):
-        interval = -abs(value) + 2**16 - 1
-
         self.signal_serial_write.emit(
-            SerialPacket(
-                SerialControlBytes.STEPPER_MOTOR_OPEN_LOOP_SPEED,
-                bytearray([int(value > 0), abs(interval) >> 8, abs(interval) & 0x00FF]),
-            ).to_bytearray()
+            stepper_motor_speed_command(value), time.perf_counter_ns()
         )
         logger.info(
             f"stepper motor speed changed to {abs(value)}, direction {int(value>0)}"
@@ -0,0 +1,427 @@
+import time
+from collections.abc import Callable, Iterable
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+from PySide6.QtCore import QCoreApplication
+from PySide6.QtSerialPort import QSerialPort
+
+from ..motion.lab3_toolpath import StreamingTrajectoryPlanner, ToolpathReader
+from ..motion.lab3_trajectory_planner import (
+    TRAJECTORY_TICK_S,
+    TWO_AXIS_MAX_SPEED_CM_S,
+    Trajectory,
+    VelocityProfile,
+    plan_line,
+)
+from ..serial_protocol.lab3_mcu_frame_decoder import MCUFrameDecoder, MCUPacketBatch
+from ..serial_protocol.lab3_motor_commands import (
+    dc_motor_absolute_position_command,
+    dc_motor_duty_command,
+    dc_motor_relative_position_command,
+    stepper_motor_single_step_command,
+    stepper_motor_speed_command,
+)
+from ..serial_protocol.lab3_serial_protocol import (
+    ECHO_TAG_ACK,
+    ECHO_TAG_FRAMING_REQUEST,
+    SerialControlBytes,
+    SerialFraming,
+    SerialPacket,
+    encode_frame,
+)
+from ..telemetry.lab3_telemetry_recorder import TelemetryRecorder
+from ..worker.lab3_flow_control import AckFlowControl
+
+
+# drives the MCU with the blocking QSerialPort API from the calling thread, no
+# event loop and no widgets, every wait keeps reading so telemetry is decoded
+# and recorded while commands are paced
+class Lab3Controller:
+    WRITE_TIMEOUT_MS = 1000
+    FRAMING_NEGOTIATION_TIMEOUT_S = 0.5
+    # the blocking waits hold the GIL, they are cut into slices so that other
+    # Python threads and Ctrl+C get their turn
+    WAIT_SLICE_MS = 5
+
+    def __init__(
+        self,
+        port_name: str,
+        baud_rate: int = 115200,
+        framing: SerialFraming = SerialFraming.FIXED,
+        flow_control_window: int = 0,
+        packet_callback: Callable[[MCUPacketBatch], None] | None = None,
+    ) -> None:
+        # the serial port's socket notifiers want a Qt application, even
+        # though none of them is ever dispatched
+        if QCoreApplication.instance() is None:
+            self.__application = QCoreApplication([])
+
+        self.__serial_port = QSerialPort()
+        self.__serial_port.setPortName(port_name)
+        self.__serial_port.setBaudRate(baud_rate)
+        self.__serial_port.setDataBits(QSerialPort.DataBits.Data8)
+        self.__serial_port.setParity(QSerialPort.Parity.NoParity)
+        self.__serial_port.setStopBits(QSerialPort.StopBits.OneStop)
+        self.__serial_port.setFlowControl(QSerialPort.FlowControl.NoFlowControl)
+
+        self.__requested_framing = SerialFraming(framing)
+        self.__framing = SerialFraming.FIXED
+        self.__framing_answer: int | None = None
+        self.__flow_control = AckFlowControl(flow_control_window)
+        self.__flow_control_window = flow_control_window
+        self.__decoder = MCUFrameDecoder()
+        self.__recorder: TelemetryRecorder | None = None
+        self.__packet_callback = packet_callback
+
+        self.__encoder_count: int | None = None
+        self.__tx_packet_count = 0
+        self.__tx_byte_count = 0
+        self.__rx_packet_count = 0
+        self.__rx_byte_count = 0
+        self.__open_ns = 0
+
+    def __enter__(self) -> "Lab3Controller":
+        self.open()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def port_name(self) -> str:
+        return self.__serial_port.portName()
+
+    @property
+    def is_open(self) -> bool:
+        return self.__serial_port.isOpen()
+
+    @property
+    def framing(self) -> SerialFraming:
+        return self.__framing
+
+    # the last encoder count the MCU reported, if any
+    @property
+    def encoder_count(self) -> int | None:
+        return self.__encoder_count
+
+    def statistics(self) -> dict:
+        elapsed_s = max(time.perf_counter_ns() - self.__open_ns, 1) / 1e9
+        return {
+            "tx_packets": self.__tx_packet_count,
+            "tx_bytes": self.__tx_byte_count,
+            "tx_bytes_per_s": self.__tx_byte_count / elapsed_s,
+            "rx_packets": self.__rx_packet_count,
+            "rx_bytes": self.__rx_byte_count,
+            "rx_resyncs": self.__decoder.resync_count,
+            "rx_checksum_errors": self.__decoder.checksum_error_count,
+        } | self.__flow_control.statistics()
+
+    def open(self) -> None:
+        if not self.__serial_port.open(QSerialPort.OpenModeFlag.ReadWrite):
+            raise OSError(
+                f"cannot open {self.port_name}: {self.__serial_port.errorString()}"
+            )
+        self.__decoder.reset()
+        self.__flow_control.set_window(self.__flow_control_window)
+        self.__framing = SerialFraming.FIXED
+        self.__open_ns = time.perf_counter_ns()
+        logger.info(f"opened {self.port_name}")
+        if self.__requested_framing != SerialFraming.FIXED:
+            self.__negotiate_framing()
+
+    def close(self) -> None:
+        self.stop_recording()
+        if not self.__serial_port.isOpen():
+            return
+        self.__serial_port.close()
+        logger.info(
+            f"closed {self.port_name}, sent {self.__tx_packet_count} packets, received {self.__rx_packet_count}"
+        )
+
+    def start_recording(self, path: str | Path) -> None:
+        self.stop_recording()
+        self.__recorder = TelemetryRecorder(path)
+        logger.info(f"recording telemetry to {path}")
+
+    def stop_recording(self) -> None:
+        if self.__recorder is None:
+            return
+        self.__recorder.close()
+        logger.info(
+            f"recorded {self.__recorder.record_count} records to {self.__recorder.path}"
+        )
+        self.__recorder = None
+
+    def set_dc_motor_duty(self, duty: int) -> None:
+        self.send(dc_motor_duty_command(duty))
+
+    def move_dc_motor_to(self, position: int) -> None:
+        self.send(dc_motor_absolute_position_command(position))
+
+    def move_dc_motor_by(self, increment: int) -> None:
+        self.send(dc_motor_relative_position_command(increment))
+
+    def set_stepper_motor_speed(self, speed: int) -> None:
+        self.send(stepper_motor_speed_command(speed))
+
+    def stop_motors(self) -> None:
+        self.set_dc_motor_duty(0)
+        self.set_stepper_motor_speed(0)
+
+    def step_stepper_motor(
+        self, clockwise: bool, count: int = 1, interval_s: float = TRAJECTORY_TICK_S
+    ) -> None:
+        if count < 0 or interval_s < 0:
+            raise ValueError(f"Invalid {count} steps {interval_s}s apart")
+        frame = np.frombuffer(stepper_motor_single_step_command(clockwise), np.uint8)
+        self.__stream([(np.tile(frame, (count, 1)), int(interval_s * 1e9))])
+
+    # a straight 2-axis move relative to the current position
+    def move(
+        self,
+        x_cm: float,
+        y_cm: float,
+        speed_percent: float = 100,
+        acceleration: float = 50,
+        profile: VelocityProfile = VelocityProfile.CONSTANT,
+    ) -> None:
+        trajectory = plan_line(
+            x_cm,
+            y_cm,
+            TWO_AXIS_MAX_SPEED_CM_S * speed_percent / 100,
+            acceleration,
+            profile,
+        )
+        logger.info(
+            f"moving {x_cm}, {y_cm} cm in {len(trajectory)} ticks, {trajectory.duration_s:.2f}s"
+        )
+        self.run_trajectory([trajectory])
+
+    # a G-code or CSV toolpath, planned while it is streamed
+    def run_toolpath(
+        self,
+        path: str | Path,
+        speed_percent: float = 100,
+        acceleration: float = 50,
+        profile: VelocityProfile = VelocityProfile.CONSTANT,
+    ) -> None:
+        logger.info(f"running toolpath {path}")
+        self.run_trajectory(
+            StreamingTrajectoryPlanner(
+                ToolpathReader(path, TWO_AXIS_MAX_SPEED_CM_S * speed_percent / 100),
+                acceleration,
+                profile,
+            )
+        )
+
+    def run_trajectory(self, chunks: Iterable[Trajectory]) -> None:
+        sent = self.__stream(
+            (chunk.frames, int(chunk.tick_s * 1e9)) for chunk in chunks
+        )
+        logger.info(f"sent {sent} trajectory packets")
+
+    def send(self, frame: bytearray) -> None:
+        while not self.__flow_control.can_send():
+            self.__wait_for_credit()
+        self.__write_frames(np.frombuffer(frame, np.uint8).reshape(1, -1))
+
+    # keeps reading telemetry for the given time
+    def wait(self, seconds: float) -> None:
+        self.__flush_flow_control()
+        deadline_ns = time.perf_counter_ns() + int(seconds * 1e9)
+        while (remaining_ns := deadline_ns - time.perf_counter_ns()) > 0:
+            self.poll(remaining_ns / 1e9)
+        self.poll()
+
+    # with flow control, waits until every command sent was acknowledged or
+    # timed out
+    def drain(self) -> None:
+        self.__flush_flow_control()
+        while self.__flow_control.in_flight > 0:
+            self.__wait_for_credit()
+
+    # decodes what has arrived, waiting up to the timeout for the first bytes
+    def poll(self, timeout_s: float = 0) -> MCUPacketBatch:
+        serial_port = self.__serial_port
+        if timeout_s > 0 and serial_port.bytesAvailable() == 0:
+            deadline_ns = time.perf_counter_ns() + int(timeout_s * 1e9)
+            while (remaining_ns := deadline_ns - time.perf_counter_ns()) > 0:
+                if serial_port.waitForReadyRead(
+                    max(1, min(remaining_ns // 1_000_000, self.WAIT_SLICE_MS))
+                ):
+                    break
+                self.__check_error()
+        data = serial_port.readAll().data()
+        if not data:
+            return MCUPacketBatch(
+                np.empty(0, np.uint16), np.empty(0, np.bool_), np.empty(0, np.int64)
+            )
+
+        timestamp_ns = time.monotonic_ns()
+        batch = self.__decoder.feed_batch(data, timestamp_ns)
+        self.__rx_byte_count += len(data)
+        for echo, echo_timestamp_ns in self.__decoder.take_echo_packets():
+            self.__handle_echo(echo, echo_timestamp_ns)
+        if len(batch) > 0:
+            self.__rx_packet_count += len(batch)
+            self.__encoder_count = int(batch.counts[-1])
+            if self.__recorder is not None:
+                self.__recorder.record_mcu_packets(batch.counts, batch.timestamps_ns)
+            if self.__packet_callback is not None:
+                self.__packet_callback(batch)
+        return batch
+
+    # frames are due on a grid one tick apart and late frames go out together,
+    # the MCU applies every frame as it arrives, so flow control credit only
+    # caps how many go out and frames held back shift the grid
+    def __stream(self, chunks: Iterable[tuple[np.ndarray, int]]) -> int:
+        next_ns = time.perf_counter_ns()
+        sent = 0
+
+        for frames, tick_ns in chunks:
+            now_ns = time.perf_counter_ns()
+            if now_ns > next_ns + tick_ns:
+                # planning fell behind, shift the grid rather than burst
+                next_ns = now_ns
+            cursor = 0
+            while cursor < len(frames):
+                # -1 without flow control
+                credit = self.__flow_control.credit
+                if credit == 0:
+                    self.__wait_for_credit()
+                    # frames held back continue from now, not as a burst
+                    next_ns = max(next_ns, time.perf_counter_ns())
+                    continue
+
+                now_ns = time.perf_counter_ns()
+                if now_ns < next_ns:
+                    self.poll((next_ns - now_ns) / 1e9)
+                    continue
+                # a zero tick sends everything at once
+                due = (
+                    (now_ns - next_ns) // tick_ns + 1
+                    if tick_ns > 0
+                    else len(frames) - cursor
+                )
+                due = min(due, len(frames) - cursor)
+                count = due if credit < 0 else min(due, credit)
+
+                self.__write_frames(frames[cursor : cursor + count])
+                cursor += count
+                sent += count
+                # with too little credit the grid moves on without the rest
+                next_ns += due * tick_ns
+                self.poll()
+        self.__flush_flow_control()
+        return sent
+
+    # commands short of a full acknowledgement interval get their marker once
+    # no more follow, otherwise they would stay in flight
+    def __flush_flow_control(self) -> None:
+        marker = self.__flow_control.flush(time.monotonic_ns())
+        if marker is None:
+            return
+        wire_marker = encode_frame(marker, self.__framing)
+        if self.__recorder is not None:
+            self.__recorder.record_serial_packet(wire_marker, time.monotonic_ns())
+        self.__write(wire_marker)
+
+    def __wait_for_credit(self) -> None:
+        deadline_ns = self.__flow_control.next_deadline_ns()
+        timeout_s = 0.001
+        if deadline_ns is not None:
+            timeout_s = max(deadline_ns - time.monotonic_ns(), 1_000_000) / 1e9
+        self.poll(timeout_s)
+        if self.__flow_control.expire(time.monotonic_ns()):
+            if not self.__flow_control.enabled:
+                logger.warning(
+                    "MCU stopped acknowledging commands, flow control is off until reopened"
+                )
+
+    def __write_frames(self, frames: np.ndarray) -> None:
+        if self.__framing == SerialFraming.FIXED and not self.__flow_control.enabled:
+            # the frame block goes out as it is
+            wire_frames = [frames.tobytes()]
+        else:
+            wire_frames = []
+            for frame in frames:
+                wire_frames.append(encode_frame(bytearray(frame), self.__framing))
+                marker = self.__flow_control.on_sent(time.monotonic_ns())
+                if marker is not None:
+                    wire_frames.append(encode_frame(marker, self.__framing))
+
+        data = b"".join(wire_frames)
+        if self.__recorder is not None:
+            if len(wire_frames) == 1 and len(frames) > 1:
+                wire_frames = [frame.tobytes() for frame in frames]
+            timestamp_ns = time.monotonic_ns()
+            for wire_frame in wire_frames:
+                self.__recorder.record_serial_packet(wire_frame, timestamp_ns)
+        self.__write(data)
+        self.__tx_packet_count += len(frames)
+
+    def __write(self, data: bytes) -> None:
+        serial_port = self.__serial_port
+        serial_port.write(data)
+        self.__tx_byte_count += len(data)
+
+        # hands the bytes to the OS at the pace of the link, short waits keep
+        # reading telemetry and do not rely on timely write notifications,
+        # which e.g. a pty does not give
+        pending = serial_port.bytesToWrite()
+        stall_deadline_ns = time.perf_counter_ns() + self.WRITE_TIMEOUT_MS * 1_000_000
+        while pending > 0:
+            serial_port.waitForBytesWritten(1)
+            self.poll()
+            now_ns = time.perf_counter_ns()
+            if serial_port.bytesToWrite() < pending:
+                pending = serial_port.bytesToWrite()
+                stall_deadline_ns = now_ns + self.WRITE_TIMEOUT_MS * 1_000_000
+            elif now_ns > stall_deadline_ns:
+                self.__check_error()
+                raise OSError(f"writing to {self.port_name} timed out")
+
+    def __check_error(self) -> None:
+        error = self.__serial_port.error()
+        if error in (
+            QSerialPort.SerialPortError.ResourceError,
+            QSerialPort.SerialPortError.ReadError,
+            QSerialPort.SerialPortError.WriteError,
+        ):
+            message = f"lost {self.port_name}: {self.__serial_port.errorString()}"
+            self.__serial_port.close()
+            raise OSError(message)
+
+    def __handle_echo(self, echo: bytes, timestamp_ns: int) -> None:
+        if echo[0] == ECHO_TAG_ACK:
+            self.__flow_control.acknowledge(echo[1], timestamp_ns)
+        elif echo[0] == ECHO_TAG_FRAMING_REQUEST:
+            self.__framing_answer = echo[1]
+
+    # asks the MCU to switch framing, it stays fixed unless acknowledged
+    def __negotiate_framing(self) -> None:
+        self.__framing_answer = None
+        self.send(
+            SerialPacket(
+                SerialControlBytes.ECHO,
+                bytearray([ECHO_TAG_FRAMING_REQUEST, self.__requested_framing, 0x00]),
+            ).to_bytearray()
+        )
+        deadline_ns = time.perf_counter_ns() + int(
+            self.FRAMING_NEGOTIATION_TIMEOUT_S * 1e9
+        )
+        while self.__framing_answer is None:
+            remaining_ns = deadline_ns - time.perf_counter_ns()
+            if remaining_ns <= 0:
+                break
+            self.poll(remaining_ns / 1e9)
+
+        if self.__framing_answer == self.__requested_framing:
+            self.__framing = self.__requested_framing
+            logger.info(f"switched to {self.__framing.name} framing")
+        else:
+            logger.warning(
+                f"MCU did not accept {self.__requested_framing.name} framing, staying with FIXED framing"
+            )
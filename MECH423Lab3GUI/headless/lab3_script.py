@@ -0,0 +1,256 @@
+import math
+import shlex
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+from ..motion.lab3_toolpath import ToolpathReader
+from ..motion.lab3_trajectory_planner import VelocityProfile
+from ..serial_protocol.lab3_motor_commands import (
+    DC_MOTOR_POSITION_LIMIT,
+    MOTOR_COMMAND_SPEED_LIMIT,
+)
+from .lab3_controller import Lab3Controller
+
+# one command per line, arguments separated by spaces, "#" starts a comment:
+#
+#   duty <duty>                      DC motor open loop duty, signed
+#   position <count>                 DC motor absolute position
+#   relative <count>                 DC motor relative position
+#   speed <speed>                    stepper motor open loop speed, signed
+#   step <cw|ccw> [count] [interval s]
+#   move <x cm> <y cm> [speed %] [accel cm/s²] [profile]
+#   path <file> [speed %] [accel cm/s²] [profile]
+#   wait <seconds>                   telemetry keeps being read
+#   stop                             DC motor duty and stepper speed to zero
+#   record <file>                    telemetry recording, *.l3tr
+#   stop_recording
+#   repeat <n>
+#     ...
+#   end
+
+
+def _signed(limit: int) -> Callable[[str], int]:
+    def parse(text: str) -> int:
+        value = int(text)
+        if not -limit <= value <= limit:
+            raise ValueError(f"{value} is outside ±{limit}")
+        return value
+
+    return parse
+
+
+def _count(text: str) -> int:
+    value = int(text)
+    if value < 0:
+        raise ValueError(f"invalid count {value}")
+    return value
+
+
+def _seconds(text: str) -> float:
+    value = float(text)
+    if not (math.isfinite(value) and value >= 0):
+        raise ValueError(f"invalid time {value}")
+    return value
+
+
+def _coordinate(text: str) -> float:
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"invalid coordinate {value}")
+    return value
+
+
+def _speed_percent(text: str) -> float:
+    value = float(text)
+    if not 0 < value <= 100:
+        raise ValueError(f"speed {value}% is outside 0 to 100%")
+    return value
+
+
+def _acceleration(text: str) -> float:
+    value = float(text)
+    if not (math.isfinite(value) and value > 0):
+        raise ValueError(f"invalid acceleration {value}")
+    return value
+
+
+# the whole toolpath is parsed once up front, it is planned while it runs
+def _toolpath(path: Path) -> Path:
+    for _ in ToolpathReader(path, 1.0):
+        pass
+    return path
+
+
+def _direction(text: str) -> bool:
+    if text.lower() not in ("cw", "ccw"):
+        raise ValueError(f"expected cw or ccw, not {text}")
+    return text.lower() == "cw"
+
+
+def _profile(text: str) -> VelocityProfile:
+    for profile in VelocityProfile:
+        if text.lower() in (profile.name.lower(), profile.value.lower()):
+            return profile
+    raise ValueError(f"unknown velocity profile {text}")
+
+
+# command: controller method, argument types, required argument count
+SCRIPT_COMMANDS: dict[str, tuple[str, tuple[Callable, ...], int]] = {
+    "duty": ("set_dc_motor_duty", (_signed(MOTOR_COMMAND_SPEED_LIMIT),), 1),
+    "position": ("move_dc_motor_to", (_signed(DC_MOTOR_POSITION_LIMIT),), 1),
+    "relative": ("move_dc_motor_by", (_signed(DC_MOTOR_POSITION_LIMIT),), 1),
+    "speed": ("set_stepper_motor_speed", (_signed(MOTOR_COMMAND_SPEED_LIMIT),), 1),
+    "step": ("step_stepper_motor", (_direction, _count, _seconds), 1),
+    "move": (
+        "move",
+        (_coordinate, _coordinate, _speed_percent, _acceleration, _profile),
+        2,
+    ),
+    "path": ("run_toolpath", (_toolpath, _speed_percent, _acceleration, _profile), 1),
+    "wait": ("wait", (_seconds,), 1),
+    "stop": ("stop_motors", (), 0),
+    "record": ("start_recording", (Path,), 1),
+    "stop_recording": ("stop_recording", (), 0),
+}
+
+
+@dataclass(frozen=True)
+class ScriptStep:
+    location: str
+    command: str
+    arguments: tuple
+    body: tuple["ScriptStep", ...] = ()
+
+
+# everything is checked before the first command is sent, so a typo does not
+# end an unattended run halfway
+def parse_script(
+    lines: Iterable[str], source: str = "<script>", directory: Path = Path()
+) -> list[ScriptStep]:
+    blocks: list[tuple[str, int, list[ScriptStep]]] = [("", 0, [])]
+
+    for line_number, line in enumerate(lines, 1):
+        location = f"{source}:{line_number}"
+        words = shlex.split(line, comments=True)
+        if not words:
+            continue
+        command, texts = words[0].lower(), words[1:]
+
+        if command == "repeat":
+            if len(texts) != 1 or not texts[0].isdigit():
+                raise ValueError(f"{location}: repeat takes a count")
+            blocks.append((location, int(texts[0]), []))
+            continue
+        if command == "end":
+            if len(blocks) == 1 or texts:
+                raise ValueError(f"{location}: end without repeat")
+            repeat_location, count, body = blocks.pop()
+            blocks[-1][2].append(
+                ScriptStep(repeat_location, "repeat", (count,), tuple(body))
+            )
+            continue
+
+        if command not in SCRIPT_COMMANDS:
+            raise ValueError(f"{location}: unknown command {command}")
+        _, types, required = SCRIPT_COMMANDS[command]
+        if not required <= len(texts) <= len(types):
+            raise ValueError(
+                f"{location}: {command} takes {required} to {len(types)} arguments"
+            )
+        try:
+            arguments = tuple(
+                kind(directory / text) if kind in (Path, _toolpath) else kind(text)
+                for kind, text in zip(types, texts)
+            )
+        except (OSError, ValueError) as e:
+            raise ValueError(f"{location}: {e}") from None
+        blocks[-1][2].append(ScriptStep(location, command, arguments))
+
+    if len(blocks) > 1:
+        raise ValueError(f"{blocks[-1][0]}: repeat without end")
+    return blocks[0][2]
+
+
+def load_script(path: str | Path) -> list[ScriptStep]:
+    path = Path(path)
+    with open(path) as file:
+        # files named in a script are relative to the script
+        return parse_script(file, str(path), path.parent)
+
+
+def run_script(controller: Lab3Controller, steps: Iterable[ScriptStep]) -> None:
+    for step in steps:
+        if step.command == "repeat":
+            for iteration in range(step.arguments[0]):
+                logger.info(f"{step.location}: repeat {iteration + 1}")
+                run_script(controller, step.body)
+            continue
+        logger.info(f"{step.location}: {step.command} {step.arguments}")
+        method, _, _ = SCRIPT_COMMANDS[step.command]
+        getattr(controller, method)(*step.arguments)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from ..serial_protocol.lab3_serial_protocol import SerialFraming
+
+    parser = argparse.ArgumentParser(
+        description="Run MECH423 Lab3 command scripts without the GUI"
+    )
+    parser.add_argument("port", help="serial port, e.g. COM3 or /dev/ttyUSB0")
+    parser.add_argument("scripts", nargs="*", help="script files, - reads stdin")
+    parser.add_argument(
+        "-c", "--command", action="append", default=[], help="one script line"
+    )
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument(
+        "--framing",
+        choices=[framing.name.lower() for framing in SerialFraming],
+        default="fixed",
+    )
+    parser.add_argument(
+        "--flow-window", type=int, default=0, help="ACK flow control, 0 is off"
+    )
+    parser.add_argument("--record", help="telemetry recording of the whole run")
+    arguments = parser.parse_args()
+
+    logger.enable("MECH423Lab3GUI")
+    try:
+        steps = []
+        for script in arguments.scripts:
+            if script == "-":
+                steps += parse_script(sys.stdin, "<stdin>")
+            else:
+                steps += load_script(script)
+        steps += parse_script(arguments.command, "<command>")
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    controller = Lab3Controller(
+        arguments.port,
+        arguments.baud,
+        SerialFraming[arguments.framing.upper()],
+        arguments.flow_window,
+    )
+    try:
+        with controller:
+            if arguments.record:
+                controller.start_recording(arguments.record)
+            try:
+                run_script(controller, steps)
+            except KeyboardInterrupt:
+                logger.warning("interrupted, stopping the motors")
+            finally:
+                # whatever ends the script, the motors do not keep running
+                if controller.is_open:
+                    controller.stop_motors()
+                    controller.drain()
+            print(controller.statistics(), flush=True)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,212 @@
+import json
+import math
+import threading
+
+import numpy as np
+
+# HDR style buckets, linear below 2 ** HISTOGRAM_SIGNIFICANT_BITS and then
+# HISTOGRAM_SUB_BUCKETS buckets per power of two, so every recorded value is
+# kept to within 1 / HISTOGRAM_SUB_BUCKETS, about 1.6 %
+HISTOGRAM_SIGNIFICANT_BITS = 7
+HISTOGRAM_SUB_BUCKETS = 1 << (HISTOGRAM_SIGNIFICANT_BITS - 1)
+# values up to 2 ** 40, about 18 minutes in ns
+HISTOGRAM_MAX_EXPONENT = 40 - HISTOGRAM_SIGNIFICANT_BITS + 1
+HISTOGRAM_BUCKET_COUNT = HISTOGRAM_SUB_BUCKETS * (HISTOGRAM_MAX_EXPONENT + 2)
+HISTOGRAM_PERCENTILES = (50, 90, 99, 99.9)
+
+
+def _bucket_values() -> np.ndarray:
+    # the lowest value of every bucket
+    index = np.arange(HISTOGRAM_BUCKET_COUNT, dtype=np.int64)
+    exponent = np.maximum(index // HISTOGRAM_SUB_BUCKETS - 1, 0)
+    return np.where(
+        index < 2 * HISTOGRAM_SUB_BUCKETS,
+        index,
+        (index - HISTOGRAM_SUB_BUCKETS * exponent) << exponent,
+    )
+
+
+_BUCKET_VALUES = _bucket_values()
+
+
+class Counter:
+    def __init__(self, name: str, help: str = "") -> None:
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def add(self, value: int = 1) -> None:
+        self.value += value
+
+    def reset(self) -> None:
+        self.value = 0
+
+    def snapshot(self) -> dict:
+        return {"type": "counter", "help": self.help, "value": self.value}
+
+
+class Histogram:
+    def __init__(self, name: str, help: str = "") -> None:
+        self.name = name
+        self.help = help
+        self.reset()
+
+    def reset(self) -> None:
+        # a list of ints is cheaper to increment than a numpy array
+        self.__counts = [0] * HISTOGRAM_BUCKET_COUNT
+        self.__count = 0
+        self.__sum = 0
+        self.__min = 0
+        self.__max = 0
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    def record(self, value: int) -> None:
+        # runs once per packet on hot paths, so the bucket index is inlined
+        if value < 0:
+            value = 0
+        exponent = value.bit_length() - HISTOGRAM_SIGNIFICANT_BITS
+        if exponent <= 0:
+            self.__counts[value] += 1
+        elif exponent <= HISTOGRAM_MAX_EXPONENT:
+            self.__counts[HISTOGRAM_SUB_BUCKETS * exponent + (value >> exponent)] += 1
+        else:
+            self.__counts[-1] += 1
+        if value < self.__min or self.__count == 0:
+            self.__min = value
+        if value > self.__max:
+            self.__max = value
+        self.__count += 1
+        self.__sum += value
+
+    def record_many(self, values: np.ndarray) -> None:
+        values = np.maximum(np.asarray(values, np.int64), 0)
+        if len(values) == 0:
+            return
+        exponent = np.clip(
+            np.floor(np.log2(np.maximum(values, 1))).astype(np.int64)
+            + 1
+            - HISTOGRAM_SIGNIFICANT_BITS,
+            0,
+            HISTOGRAM_MAX_EXPONENT,
+        )
+        index = np.where(
+            exponent == 0,
+            np.minimum(values, 2 * HISTOGRAM_SUB_BUCKETS - 1),
+            HISTOGRAM_SUB_BUCKETS * exponent + (values >> exponent),
+        )
+        index = np.minimum(index, HISTOGRAM_BUCKET_COUNT - 1)
+        for bucket, count in zip(*np.unique(index, return_counts=True)):
+            self.__counts[bucket] += int(count)
+        low, high = int(values.min()), int(values.max())
+        if self.__count == 0 or low < self.__min:
+            self.__min = low
+        self.__max = max(self.__max, high)
+        self.__count += len(values)
+        self.__sum += int(values.sum())
+
+    def percentiles(self, percentiles=HISTOGRAM_PERCENTILES) -> dict[float, int]:
+        # ranked against the buckets themselves, the writer may be ahead of
+        # the count by the time they are summed
+        cumulative = np.cumsum(self.__counts)
+        count = int(cumulative[-1])
+        if count == 0:
+            return {percentile: 0 for percentile in percentiles}
+        result = {}
+        for percentile in percentiles:
+            rank = max(1, math.ceil(percentile / 100 * count))
+            bucket = int(np.searchsorted(cumulative, rank))
+            result[percentile] = min(int(_BUCKET_VALUES[bucket]), self.__max)
+        return result
+
+    def snapshot(self) -> dict:
+        return {
+            "type": "histogram",
+            "help": self.help,
+            "count": self.__count,
+            "sum": self.__sum,
+            "min": self.__min,
+            "max": self.__max,
+            "percentiles": {
+                str(percentile): value
+                for percentile, value in self.percentiles().items()
+            },
+        }
+
+
+# metrics are written by a single thread each and read from any, a torn read
+# only ever shows a value one update behind
+class MetricsRegistry:
+    def __init__(self, prefix: str = "mech423") -> None:
+        self.__prefix = prefix
+        self.__lock = threading.Lock()
+        self.__metrics: dict[str, Counter | Histogram] = {}
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self.__get(Counter, name, help)
+
+    def histogram(self, name: str, help: str = "") -> Histogram:
+        return self.__get(Histogram, name, help)
+
+    # the same metrics under `prefix_`, e.g. one set per serial device
+    def scope(self, prefix: str) -> "MetricsRegistry | MetricsScope":
+        return MetricsScope(self, prefix) if prefix else self
+
+    def reset(self) -> None:
+        with self.__lock:
+            for metric in self.__metrics.values():
+                metric.reset()
+
+    def snapshot(self) -> dict[str, dict]:
+        with self.__lock:
+            metrics = dict(self.__metrics)
+        return {name: metric.snapshot() for name, metric in sorted(metrics.items())}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for name, snapshot in self.snapshot().items():
+            name = f"{self.__prefix}_{name}"
+            if snapshot["help"]:
+                lines.append(f"# HELP {name} {snapshot['help']}")
+            if snapshot["type"] == "counter":
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {snapshot['value']}")
+                continue
+            # HDR percentiles map onto a Prometheus summary
+            lines.append(f"# TYPE {name} summary")
+            for percentile, value in snapshot["percentiles"].items():
+                lines.append(
+                    f'{name}{{quantile="{float(percentile) / 100:g}"}} {value}'
+                )
+            lines.append(f"{name}_sum {snapshot['sum']}")
+            lines.append(f"{name}_count {snapshot['count']}")
+        return "\n".join(lines) + "\n"
+
+    def __get(self, kind: type, name: str, help: str):
+        with self.__lock:
+            metric = self.__metrics.get(name)
+            if metric is None:
+                metric = self.__metrics[name] = kind(name, help)
+            elif not isinstance(metric, kind):
+                raise ValueError(f"Metric {name} is not a {kind.__name__}")
+            return metric
+
+
+class MetricsScope:
+    def __init__(self, registry: MetricsRegistry, prefix: str) -> None:
+        self.__registry = registry
+        self.__prefix = prefix
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self.__registry.counter(f"{self.__prefix}_{name}", help)
+
+    def histogram(self, name: str, help: str = "") -> Histogram:
+        return self.__registry.histogram(f"{self.__prefix}_{name}", help)
+
+
+metrics = MetricsRegistry()
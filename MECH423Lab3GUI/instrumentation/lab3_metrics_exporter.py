@@ -0,0 +1,105 @@
+import os
+from pathlib import Path
+
+from loguru import logger
+from PySide6.QtCore import QObject, QTimer
+from PySide6.QtNetwork import QHostAddress, QTcpServer, QTcpSocket
+
+from .lab3_metrics import MetricsRegistry, metrics
+
+
+def render_metrics(registry: MetricsRegistry, as_json: bool) -> str:
+    return registry.to_json() if as_json else registry.to_prometheus()
+
+
+def export_metrics(path: str | Path, registry: MetricsRegistry = metrics) -> None:
+    # JSON for .json files, Prometheus text otherwise, replaced atomically so
+    # a scraper never reads half a file
+    path = Path(path)
+    temporary_path = path.with_name(path.name + ".tmp")
+    temporary_path.write_text(render_metrics(registry, path.suffix == ".json"))
+    os.replace(temporary_path, path)
+
+
+class MetricsExporter(QObject):
+    def __init__(self, *args, registry: MetricsRegistry = metrics, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.__registry = registry
+        self.__export_path: Path | None = None
+        self.__export_timer = QTimer(self)
+        self.__export_timer.timeout.connect(self.__slot_on_export_timeout)
+
+        self.__server = QTcpServer(self)
+        self.__server.newConnection.connect(self.__slot_on_new_connection)
+
+    @property
+    def export_path(self) -> Path | None:
+        return self.__export_path
+
+    @property
+    def server_port(self) -> int | None:
+        return self.__server.serverPort() if self.__server.isListening() else None
+
+    def start_file_export(self, path: str | Path, interval_ms: int = 1000) -> None:
+        self.__export_path = Path(path)
+        self.__slot_on_export_timeout()
+        self.__export_timer.start(interval_ms)
+
+    def stop_file_export(self) -> None:
+        self.__export_timer.stop()
+        self.__export_path = None
+
+    # serves GET /metrics as Prometheus text and GET /metrics.json as JSON
+    def start_server(self, port: int, host: str = "127.0.0.1") -> bool:
+        self.stop_server()
+        if not self.__server.listen(QHostAddress(host), port):
+            logger.error(
+                f"cannot serve metrics on {host}:{port}: {self.__server.errorString()}"
+            )
+            return False
+        logger.info(f"serving metrics on http://{host}:{port}/metrics")
+        return True
+
+    def stop_server(self) -> None:
+        if self.__server.isListening():
+            self.__server.close()
+
+    def __slot_on_export_timeout(self):
+        if self.__export_path is None:
+            return
+        try:
+            export_metrics(self.__export_path, self.__registry)
+        except OSError as e:
+            logger.error(f"cannot export metrics to {self.__export_path}: {e}")
+            self.stop_file_export()
+
+    def __slot_on_new_connection(self):
+        while self.__server.hasPendingConnections():
+            socket = self.__server.nextPendingConnection()
+            socket.disconnected.connect(socket.deleteLater)
+            socket.readyRead.connect(lambda socket=socket: self.__respond(socket))
+
+    def __respond(self, socket: QTcpSocket):
+        if not socket.canReadLine():
+            return
+        request = socket.readLine().data().decode("latin-1").split()
+        path = request[1] if len(request) >= 2 else "/"
+        if path in ("/metrics", "/metrics.json"):
+            body = render_metrics(self.__registry, path.endswith(".json")).encode()
+            content_type = (
+                "application/json"
+                if path.endswith(".json")
+                else "text/plain; version=0.0.4"
+            )
+            status = "200 OK"
+        else:
+            body, content_type, status = b"not found\n", "text/plain", "404 Not Found"
+        socket.write(
+            (
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+            ).encode()
+            + body
+        )
+        socket.disconnectFromHost()
@@ -0,0 +1,126 @@
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import (
+    QFileDialog,
+    QHBoxLayout,
+    QHeaderView,
+    QPushButton,
+    QSpinBox,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+
+from .lab3_metrics import HISTOGRAM_PERCENTILES, MetricsRegistry, metrics
+from .lab3_metrics_exporter import MetricsExporter
+
+METRICS_SERVER_PORT = 9423
+
+
+def format_metric_value(name: str, value: int) -> str:
+    if name.endswith("_ns"):
+        return f"{value / 1e6:.3f} ms"
+    return str(value)
+
+
+class MetricsPanel(QWidget):
+    def __init__(self, *args, registry: MetricsRegistry = metrics, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.__registry = registry
+        self.__exporter = MetricsExporter(self, registry=registry)
+
+        columns = ["Metric", "Count", *(f"p{p:g}" for p in HISTOGRAM_PERCENTILES)]
+        self.__table = QTableWidget(0, len(columns) + 1)
+        self.__table.setHorizontalHeaderLabels([*columns, "Max"])
+        self.__table.horizontalHeader().setSectionResizeMode(
+            QHeaderView.ResizeMode.ResizeToContents
+        )
+        self.__table.verticalHeader().setVisible(False)
+        self.__table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+
+        self.__reset_button = QPushButton("Reset")
+        self.__reset_button.clicked.connect(self.__slot_on_reset)
+
+        self.__export_button = QPushButton("Export...")
+        self.__export_button.setCheckable(True)
+        self.__export_button.clicked.connect(self.__slot_on_export)
+
+        self.__server_port_spinbox = QSpinBox()
+        self.__server_port_spinbox.setRange(1, 0xFFFF)
+        self.__server_port_spinbox.setValue(METRICS_SERVER_PORT)
+        self.__server_port_spinbox.setPrefix("Port: ")
+        self.__serve_button = QPushButton("Serve")
+        self.__serve_button.setCheckable(True)
+        self.__serve_button.clicked.connect(self.__slot_on_serve)
+
+        toolbar_layout = QHBoxLayout()
+        toolbar_layout.addWidget(self.__reset_button)
+        toolbar_layout.addWidget(self.__export_button)
+        toolbar_layout.addStretch()
+        toolbar_layout.addWidget(self.__server_port_spinbox)
+        toolbar_layout.addWidget(self.__serve_button)
+
+        self.setLayout(QVBoxLayout())
+        self.layout().addLayout(toolbar_layout)  # type: ignore
+        self.layout().addWidget(self.__table)
+
+        self.__refresh_timer = QTimer(self)
+        self.__refresh_timer.timeout.connect(self.__slot_on_refresh_timeout)
+        self.__refresh_timer.start(500)
+
+    def refresh(self):
+        snapshot = self.__registry.snapshot()
+        self.__table.setRowCount(len(snapshot))
+        for row, (name, metric) in enumerate(snapshot.items()):
+            if metric["type"] == "counter":
+                cells = [name, str(metric["value"])]
+            else:
+                cells = [
+                    name,
+                    str(metric["count"]),
+                    *(
+                        format_metric_value(name, value)
+                        for value in metric["percentiles"].values()
+                    ),
+                    format_metric_value(name, metric["max"]),
+                ]
+            for column in range(self.__table.columnCount()):
+                text = cells[column] if column < len(cells) else ""
+                item = self.__table.item(row, column)
+                if item is None:
+                    self.__table.setItem(row, column, QTableWidgetItem(text))
+                elif item.text() != text:
+                    item.setText(text)
+
+    def __slot_on_refresh_timeout(self):
+        if self.isVisible():
+            self.refresh()
+
+    def __slot_on_reset(self):
+        self.__registry.reset()
+        self.refresh()
+
+    def __slot_on_export(self):
+        if not self.__export_button.isChecked():
+            self.__exporter.stop_file_export()
+            self.__export_button.setText("Export...")
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Metrics", "", "Prometheus Text (*.prom);;JSON (*.json)"
+        )
+        if not path:
+            self.__export_button.setChecked(False)
+            return
+        # rewritten every second until stopped
+        self.__exporter.start_file_export(path)
+        self.__export_button.setText("Stop Export")
+
+    def __slot_on_serve(self):
+        if self.__serve_button.isChecked():
+            if not self.__exporter.start_server(self.__server_port_spinbox.value()):
+                self.__serve_button.setChecked(False)
+                return
+        else:
+            self.__exporter.stop_server()
+        self.__server_port_spinbox.setDisabled(self.__serve_button.isChecked())
@@ -0,0 +1,272 @@
+import math
+import re
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import numpy as np
+
+from .lab3_trajectory_planner import (
+    TRAJECTORY_TICK_S,
+    Trajectory,
+    VelocityProfile,
+    plan_polyline,
+)
+
+GCODE_WORD = re.compile(r"([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+GCODE_COMMENT = re.compile(r"\(.*?\)|;.*")
+
+# G-code lengths are in mm unless G20 selects inches, feed rates per minute
+GCODE_CM_PER_MM = 0.1
+GCODE_CM_PER_INCH = 2.54
+# arcs are run as chords that stray from the arc by about one step of either axis
+GCODE_ARC_TOLERANCE_CM = 0.01
+# plane, feed mode, work offset and cancel codes that match how paths are run
+GCODE_IGNORED = frozenset({17, 40, 49, 54, 80, 94})
+
+
+# a bad point would only fail once the planner reaches it, with part of the
+# path already sent
+def _check_point(
+    line_number: int, x: float, y: float, speed: float
+) -> tuple[float, float, float]:
+    if not (math.isfinite(x) and math.isfinite(y)):
+        raise ValueError(f"line {line_number}: invalid position {x}, {y}")
+    if not (math.isfinite(speed) and speed > 0):
+        raise ValueError(f"line {line_number}: invalid speed {speed}")
+    return x, y, speed
+
+
+def _arc_center(
+    line_number: int,
+    start: tuple[float, float],
+    end: tuple[float, float],
+    radius: float,
+    clockwise: bool,
+) -> tuple[float, float]:
+    chord = math.dist(start, end)
+    if chord == 0 or abs(radius) < chord / 2 - GCODE_ARC_TOLERANCE_CM:
+        raise ValueError(f"line {line_number}: invalid arc radius {radius}")
+    # the center is off the middle of the chord, a negative radius selects the
+    # arc over 180 degrees
+    offset = math.sqrt(max(0.0, radius**2 - (chord / 2) ** 2)) / chord
+    if clockwise != (radius < 0):
+        offset = -offset
+    return (
+        (start[0] + end[0]) / 2 - offset * (end[1] - start[1]),
+        (start[1] + end[1]) / 2 + offset * (end[0] - start[0]),
+    )
+
+
+def _arc_points(
+    line_number: int,
+    start: tuple[float, float],
+    end: tuple[float, float],
+    center: tuple[float, float],
+    clockwise: bool,
+) -> Iterator[tuple[float, float]]:
+    start_radius = math.dist(start, center)
+    end_radius = math.dist(end, center)
+    if abs(end_radius - start_radius) > GCODE_ARC_TOLERANCE_CM:
+        raise ValueError(f"line {line_number}: arc end is off the circle")
+
+    start_angle = math.atan2(start[1] - center[1], start[0] - center[0])
+    end_angle = math.atan2(end[1] - center[1], end[0] - center[0])
+    # an arc ending where it starts is a full circle
+    sweep = (end_angle - start_angle) % math.tau
+    if clockwise:
+        sweep -= math.tau
+    elif sweep == 0:
+        sweep = math.tau
+
+    # a chord over angle a strays r (1 - cos(a / 2)) from the arc
+    radius = max(start_radius, end_radius)
+    max_angle = (
+        2 * math.acos(1 - GCODE_ARC_TOLERANCE_CM / radius)
+        if radius > GCODE_ARC_TOLERANCE_CM
+        else math.pi
+    )
+    count = max(1, math.ceil(abs(sweep) / max_angle))
+    for index in range(1, count):
+        angle = start_angle + sweep * index / count
+        # the radius blends over the arc so that it ends exactly at the target
+        point_radius = start_radius + (end_radius - start_radius) * index / count
+        yield (
+            center[0] + point_radius * math.cos(angle),
+            center[1] + point_radius * math.sin(angle),
+        )
+    yield end
+
+
+def iter_gcode(
+    lines: Iterable[str], speed: float
+) -> Iterator[tuple[float, float, float]]:
+    x = y = 0.0
+    scale = GCODE_CM_PER_MM
+    absolute = True
+    feed_speed = speed
+    # the motion mode carries over to lines with only coordinates
+    motion = None
+
+    for line_number, line in enumerate(lines, 1):
+        words = GCODE_WORD.findall(GCODE_COMMENT.sub("", line).upper())
+        if not words:
+            continue
+
+        target_x = target_y = None
+        offset_i = offset_j = radius = None
+        for letter, value in words:
+            number = float(value)
+            match letter:
+                case "G" if number in (0, 1, 2, 3):
+                    motion = int(number)
+                case "G" if number == 20:
+                    scale = GCODE_CM_PER_INCH
+                case "G" if number == 21:
+                    scale = GCODE_CM_PER_MM
+                case "G" if number == 90:
+                    absolute = True
+                case "G" if number == 91:
+                    absolute = False
+                case "G" if number in GCODE_IGNORED:
+                    pass
+                case "G":
+                    raise ValueError(f"line {line_number}: unsupported G{value}")
+                case "X":
+                    target_x = number * scale
+                case "Y":
+                    target_y = number * scale
+                case "I":
+                    offset_i = number * scale
+                case "J":
+                    offset_j = number * scale
+                case "R":
+                    radius = number * scale
+                case "F":
+                    feed_speed = number * scale / 60
+
+        arc = motion in (2, 3)
+        if target_x is None and target_y is None:
+            # only an arc around a center can run without a target, as a
+            # full circle
+            if not arc or (offset_i is None and offset_j is None):
+                continue
+        start = (x, y)
+        if absolute:
+            x = x if target_x is None else target_x
+            y = y if target_y is None else target_y
+        else:
+            x += target_x or 0.0
+            y += target_y or 0.0
+
+        if not arc:
+            # rapid moves run at the configured speed, feed moves at F
+            yield _check_point(
+                line_number, x, y, speed if motion == 0 else min(feed_speed, speed)
+            )
+            continue
+
+        clockwise = motion == 2
+        if radius is not None:
+            center = _arc_center(line_number, start, (x, y), radius, clockwise)
+        elif offset_i is not None or offset_j is not None:
+            # I and J are relative to the start in either distance mode
+            center = (start[0] + (offset_i or 0.0), start[1] + (offset_j or 0.0))
+        else:
+            raise ValueError(f"line {line_number}: arc without I, J or R")
+        for point_x, point_y in _arc_points(
+            line_number, start, (x, y), center, clockwise
+        ):
+            yield _check_point(line_number, point_x, point_y, min(feed_speed, speed))
+
+
+def iter_csv(
+    lines: Iterable[str], speed: float
+) -> Iterator[tuple[float, float, float]]:
+    for line_number, line in enumerate(lines, 1):
+        fields = line.replace(";", ",").split(",")
+        try:
+            values = [float(field) for field in fields if field.strip()]
+        except ValueError:
+            continue  # header
+        if len(values) < 2:
+            continue
+        yield _check_point(
+            line_number,
+            values[0],
+            values[1],
+            min(values[2], speed) if len(values) > 2 else speed,
+        )
+
+
+class ToolpathReader:
+    def __init__(self, path: str | Path, speed: float) -> None:
+        self.__path = Path(path)
+        self.__speed = speed
+        self.__size = max(self.__path.stat().st_size, 1)
+        self.__position = 0
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    @property
+    def progress(self) -> float:
+        return self.__position / self.__size
+
+    def __iter__(self) -> Iterator[tuple[float, float, float]]:
+        parse = iter_csv if self.__path.suffix.lower() == ".csv" else iter_gcode
+        with open(self.__path, "rb") as file:
+            yield from parse(self.__iter_lines(file), self.__speed)
+        self.__position = self.__size
+
+    def __iter_lines(self, file) -> Iterator[str]:
+        for line in file:
+            self.__position += len(line)
+            yield line.decode(errors="replace")
+
+
+# plans a toolpath a chunk of segments at a time while it is streamed, every
+# segment starts and ends at rest, there is no blending across corners
+class StreamingTrajectoryPlanner:
+    def __init__(
+        self,
+        reader: ToolpathReader,
+        acceleration: float,
+        profile: VelocityProfile,
+        segments_per_chunk: int = 64,
+        tick_s: float = TRAJECTORY_TICK_S,
+    ) -> None:
+        self.__reader = reader
+        self.__acceleration = acceleration
+        self.__profile = profile
+        self.__segments_per_chunk = segments_per_chunk
+        self.__tick_s = tick_s
+
+    @property
+    def progress(self) -> float:
+        return self.__reader.progress
+
+    def __iter__(self) -> Iterator[Trajectory]:
+        # the stage position when the path starts is the path origin
+        origin = np.zeros(2)
+        points = [(0.0, 0.0)]
+        speeds = []
+
+        for x, y, speed in self.__reader:
+            points.append((x, y))
+            speeds.append(speed)
+            if len(speeds) >= self.__segments_per_chunk:
+                yield self.__plan(points, speeds, origin)
+                points, speeds = points[-1:], []
+        if speeds:
+            yield self.__plan(points, speeds, origin)
+
+    def __plan(self, points, speeds, origin) -> Trajectory:
+        return plan_polyline(
+            np.array(points),
+            np.array(speeds),
+            self.__acceleration,
+            self.__profile,
+            self.__tick_s,
+            origin,
+        )
@@ -0,0 +1,155 @@
+from dataclasses import dataclass
+from enum import Enum
+
+import numpy as np
+
+from ..serial_protocol.lab3_serial_protocol import (
+    SERIAL_CONTROL_PAYLOAD_LENGTH,
+    SerialControlBytes,
+    encode_serial_packets,
+)
+
+X_ENCODER_TICKS_PER_CM = 58
+Y_HALF_STEPS_PER_CM = 100
+STEPPER_TIMER_FREQUENCY = 8e6
+TRAJECTORY_TICK_S = 8e-3
+# speed at 100%, matching the original 10 ticks of 8 ms per cm
+TWO_AXIS_MAX_SPEED_CM_S = 12.5
+
+
+class VelocityProfile(Enum):
+    CONSTANT = "Constant"
+    TRAPEZOIDAL = "Trapezoidal"
+    S_CURVE = "S-Curve"
+
+
+@dataclass(frozen=True)
+class Trajectory:
+    x_steps: np.ndarray  # DC motor encoder ticks per tick
+    y_steps: np.ndarray  # stepper half steps per tick
+    stepper_intervals: np.ndarray
+    tick_s: float = TRAJECTORY_TICK_S
+
+    def __len__(self) -> int:
+        return len(self.x_steps)
+
+    @property
+    def duration_s(self) -> float:
+        return len(self) * self.tick_s
+
+    @property
+    def frames(self) -> np.ndarray:
+        return encode_two_axis_packets(
+            self.x_steps, self.stepper_intervals, self.y_steps
+        )
+
+
+def encode_two_axis_packets(
+    x_steps: np.ndarray, stepper_intervals: np.ndarray, y_steps: np.ndarray
+) -> np.ndarray:
+    data = np.zeros(
+        (
+            len(x_steps),
+            SERIAL_CONTROL_PAYLOAD_LENGTH[SerialControlBytes.TWO_AXIS_CONTROL],
+        ),
+        np.uint8,
+    )
+    data[:, 1:3] = np.asarray(x_steps, "<i2")[:, None].view(np.uint8)
+    data[:, 3:5] = np.asarray(stepper_intervals, "<u2")[:, None].view(np.uint8)
+    data[:, 5:7] = np.asarray(y_steps, "<i2")[:, None].view(np.uint8)
+    return encode_serial_packets(SerialControlBytes.TWO_AXIS_CONTROL, data)
+
+
+def velocity_profile(
+    length: float,
+    speed: float,
+    acceleration: float,
+    profile: VelocityProfile,
+    tick_s: float = TRAJECTORY_TICK_S,
+) -> np.ndarray:
+    if length <= 0:
+        return np.empty(0)
+
+    if profile == VelocityProfile.CONSTANT or acceleration <= 0:
+        count = max(1, int(np.ceil(length / speed / tick_s)))
+        return np.full(count, length / (count * tick_s))
+
+    # ramp_factor is ramp time * acceleration / peak speed, for the raised
+    # cosine ramp of the S-curve the peak acceleration is pi/2 times the mean
+    ramp_factor = 1.0 if profile == VelocityProfile.TRAPEZOIDAL else np.pi / 2
+    peak_speed = min(speed, np.sqrt(length * acceleration / ramp_factor))
+    ramp_s = ramp_factor * peak_speed / acceleration
+    cruise_s = max(0.0, (length - peak_speed * ramp_s) / peak_speed)
+    duration_s = 2 * ramp_s + cruise_s
+
+    count = max(1, int(np.ceil(duration_s / tick_s)))
+    t = (np.arange(count) + 0.5) * duration_s / count
+    ramp = np.clip(np.minimum(t, duration_s - t) / ramp_s, 0, 1)
+    if profile == VelocityProfile.S_CURVE:
+        ramp = (1 - np.cos(np.pi * ramp)) / 2
+    velocity = peak_speed * ramp
+    # the sampled profile is rescaled to cover the segment length exactly
+    return velocity * length / (velocity.sum() * tick_s)
+
+
+def plan_polyline(
+    points_cm: np.ndarray,
+    speed: float | np.ndarray,
+    acceleration: float,
+    profile: VelocityProfile,
+    tick_s: float = TRAJECTORY_TICK_S,
+    origin_cm: np.ndarray | None = None,
+) -> Trajectory:
+    points_cm = np.asarray(points_cm, np.float64).reshape(-1, 2)
+    speeds = np.broadcast_to(speed, (max(len(points_cm) - 1, 0),))
+    # consecutive polylines planned against the same origin join without
+    # losing the rounding remainder
+    origin_cm = points_cm[0] if origin_cm is None else np.asarray(origin_cm)
+
+    positions = [points_cm[:1]]
+    for start, end, segment_speed in zip(points_cm[:-1], points_cm[1:], speeds):
+        length = float(np.hypot(*(end - start)))
+        velocity = velocity_profile(
+            length, segment_speed, acceleration, profile, tick_s
+        )
+        if len(velocity) == 0:
+            continue
+        distance = np.cumsum(velocity) * tick_s
+        distance[-1] = length
+        positions.append(start + np.outer(distance / length, end - start))
+    positions_cm = np.concatenate(positions)
+
+    # rounding the cumulative position instead of each step carries the
+    # remainder forward, so the target is reached exactly
+    x = np.rint((positions_cm[:, 0] - origin_cm[0]) * X_ENCODER_TICKS_PER_CM)
+    y = np.rint((positions_cm[:, 1] - origin_cm[1]) * Y_HALF_STEPS_PER_CM)
+    x_steps = np.diff(x).astype(np.int64)
+    y_steps = np.diff(y).astype(np.int64)
+    if len(x_steps) and max(np.abs(x_steps).max(), np.abs(y_steps).max()) > 0x7FFF:
+        raise ValueError("Trajectory speed exceeds the per-tick step range")
+
+    with np.errstate(divide="ignore"):
+        stepper_intervals = np.where(
+            y_steps != 0,
+            tick_s * STEPPER_TIMER_FREQUENCY / np.abs(y_steps),
+            0xFFFF,
+        )
+    return Trajectory(
+        x_steps,
+        y_steps,
+        np.clip(stepper_intervals, 1, 0xFFFF).astype(np.int64),
+        tick_s,
+    )
+
+
+def plan_line(
+    x_cm: float,
+    y_cm: float,
+    speed: float,
+    acceleration: float,
+    profile: VelocityProfile,
+    tick_s: float = TRAJECTORY_TICK_S,
+) -> Trajectory:
+    return plan_polyline(
+        np.array([[0.0, 0.0], [x_cm, y_cm]]), speed, acceleration, profile, tick_s
+    )
@@ -0,0 +1,178 @@
+import time
+from collections.abc import Iterable, Iterator
+
+import numpy as np
+from loguru import logger
+from PySide6.QtCore import QObject, Qt, QTimer, Signal, Slot
+
+from ..instrumentation.lab3_metrics import metrics
+from ..serial_protocol.lab3_serial_protocol import SERIAL_PACKET_LENGTH
+from .lab3_trajectory_planner import Trajectory
+
+
+class TrajectoryStreamer(QObject):
+    signal_serial_write = Signal(bytearray, "qint64")
+    signal_progress = Signal(int, int)
+    signal_statistics = Signal(dict)
+
+    # packets planned ahead of the send position
+    LOOK_AHEAD_PACKETS = 256
+
+    def __init__(self, *args, metrics_scope: str = "", **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        scoped_metrics = metrics.scope(metrics_scope)
+
+        self.__timer = QTimer(self)
+        self.__timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.__timer.setSingleShot(True)
+        self.__timer.timeout.connect(self.__slot_on_timer_timeout)
+
+        self.__chunks: Iterator[Trajectory] | None = None
+        self.__source: Iterable[Trajectory] | None = None
+        self.__frames = np.empty((0, SERIAL_PACKET_LENGTH), np.uint8)
+        self.__cursor = 0
+        self.__tick_ns = 0
+        self.__start_ns = 0
+        self.__sent = 0
+        self.__underrun_count = 0
+        self.__statistics_ns = 0
+        # commands the MCU can take on top of the grid, -1 without flow control
+        self.__credit = -1
+
+        self.__tick_lateness_histogram = scoped_metrics.histogram(
+            "trajectory_tick_lateness_ns", "Lateness of a trajectory packet on its grid"
+        )
+        self.__underrun_counter = scoped_metrics.counter(
+            "trajectory_underruns", "Trajectory grid shifts while planning caught up"
+        )
+
+    @Slot(object)
+    def slot_start(self, trajectory: Trajectory):
+        self.slot_start_stream([trajectory])
+
+    @Slot(object)
+    def slot_start_stream(self, chunks: Iterable[Trajectory]):
+        self.__timer.stop()
+        self.__source = chunks
+        self.__chunks = iter(chunks)
+        self.__frames = np.empty((0, SERIAL_PACKET_LENGTH), np.uint8)
+        self.__cursor = 0
+        self.__tick_ns = 0
+        self.__sent = 0
+        self.__underrun_count = 0
+        self.__fill()
+        self.__start_ns = time.perf_counter_ns()
+        self.__slot_on_timer_timeout()
+
+    @Slot()
+    def slot_stop(self):
+        if self.__chunks is not None or self.__cursor < len(self.__frames):
+            self.__timer.stop()
+            self.__chunks = None
+            self.__frames = self.__frames[: self.__cursor]
+            self.signal_statistics.emit(self.statistics())
+            self.signal_progress.emit(self.__sent, self.__sent)
+
+    @Slot(int)
+    def slot_set_credit(self, credit: int):
+        if self.__credit == 0 and credit != 0:
+            # packets held back for credit continue from now, not as a burst
+            self.__start_ns = max(
+                self.__start_ns,
+                time.perf_counter_ns() - self.__sent * self.__tick_ns,
+            )
+        self.__credit = credit
+        if self.__chunks is not None or self.__cursor < len(self.__frames):
+            # credit can arrive while packets are being sent, send from the
+            # event loop instead
+            self.__timer.start(0)
+
+    def statistics(self) -> dict:
+        elapsed_s = max(time.perf_counter_ns() - self.__start_ns, 1) / 1e9
+        return {
+            "sent": self.__sent,
+            "buffered": len(self.__frames) - self.__cursor,
+            "packets_per_s": self.__sent / elapsed_s,
+            "underruns": self.__underrun_count,
+            "source_progress": getattr(self.__source, "progress", None),
+        }
+
+    def __fill(self):
+        pending = [self.__frames[self.__cursor :]]
+        buffered = len(pending[0])
+        while self.__chunks is not None and buffered < self.LOOK_AHEAD_PACKETS:
+            try:
+                chunk = next(self.__chunks, None)
+            except Exception as e:
+                # a toolpath that cannot be parsed or planned further stops
+                # here, progress reports the stream as finished
+                logger.error(f"trajectory stopped after {self.__sent} packets: {e}")
+                self.__chunks = None
+                self.__frames = self.__frames[: self.__cursor]
+                return
+            if chunk is None:
+                self.__chunks = None
+                break
+            self.__tick_ns = self.__tick_ns or int(chunk.tick_s * 1e9)
+            pending.append(chunk.frames)
+            buffered += len(chunk)
+        if len(pending) > 1:
+            self.__frames = np.concatenate(pending)
+            self.__cursor = 0
+
+    def __slot_on_timer_timeout(self):
+        self.__fill()
+        buffered = len(self.__frames) - self.__cursor
+        if self.__tick_ns == 0:
+            self.signal_progress.emit(0, 0)
+            return
+
+        # packets are due on a fixed grid from the start time, a late timeout
+        # sends everything that is due instead of shifting the rest
+        now_ns = time.perf_counter_ns()
+        due = (now_ns - self.__start_ns) // self.__tick_ns + 1
+        due -= self.__sent
+        if due > 0:
+            self.__tick_lateness_histogram.record(
+                now_ns - self.__start_ns - self.__sent * self.__tick_ns
+            )
+        if due > buffered and self.__chunks is not None:
+            # planning fell behind, shift the grid rather than burst later
+            self.__underrun_count += 1
+            self.__underrun_counter.add()
+            self.__start_ns += (due - buffered) * self.__tick_ns
+        due = min(due, buffered)
+        if 0 <= self.__credit < due:
+            # the MCU applies packets as they arrive, so flow control only
+            # holds packets back and the grid shifts with them
+            self.__start_ns += (due - self.__credit) * self.__tick_ns
+            due = self.__credit
+        if self.__credit >= 0:
+            self.__credit -= due
+
+        # one copy out of the contiguous frame block, then a slice per frame
+        block = self.__frames[self.__cursor : self.__cursor + due].tobytes()
+        issued_ns = time.perf_counter_ns()
+        for offset in range(0, len(block), SERIAL_PACKET_LENGTH):
+            self.signal_serial_write.emit(
+                bytearray(block[offset : offset + SERIAL_PACKET_LENGTH]), issued_ns
+            )
+        self.__cursor += due
+        self.__sent += due
+
+        # the total is only known once the source is exhausted
+        total = self.__sent + len(self.__frames) - self.__cursor
+        total = total if self.__chunks is None else -1
+        finished = self.__sent == total
+        if due > 0 or finished:
+            self.signal_progress.emit(self.__sent, total)
+        now_ns = time.perf_counter_ns()
+        if now_ns - self.__statistics_ns > 250_000_000 or finished:
+            self.__statistics_ns = now_ns
+            self.signal_statistics.emit(self.statistics())
+        if finished or self.__credit == 0:
+            # without credit, slot_set_credit starts the timer again
+            return
+
+        next_ns = self.__start_ns + self.__sent * self.__tick_ns
+        self.__timer.start(max(0, -((time.perf_counter_ns() - next_ns) // 1_000_000)))
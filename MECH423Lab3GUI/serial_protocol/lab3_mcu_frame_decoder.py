@@ -0,0 +1,216 @@
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from .lab3_serial_protocol import MCU_ECHO_PACKET_HEADER, MCUPacket
+
+MCU_PACKET_HEADER = 0xFF
+MCU_PACKET_LENGTH = 4
+
+
+@dataclass(frozen=True)
+class MCUPacketBatch:
+    counts: np.ndarray
+    valid: np.ndarray
+    timestamps_ns: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def valid_only(self) -> "MCUPacketBatch":
+        if self.valid.all():
+            return self
+        return MCUPacketBatch(
+            self.counts[self.valid],
+            self.valid[self.valid],
+            self.timestamps_ns[self.valid],
+        )
+
+
+def _frame_view(buffer, offset: int, size: int) -> np.ndarray:
+    return np.frombuffer(buffer, np.uint8, size, offset).reshape(-1, MCU_PACKET_LENGTH)
+
+
+def _validate_checksums(frames: np.ndarray) -> np.ndarray:
+    checksum = (frames[:, 0].astype(np.uint16) + frames[:, 1] + frames[:, 2]) & 0xFF
+    return checksum == frames[:, 3]
+
+
+def _validate_frames(frames: np.ndarray) -> np.ndarray:
+    return (frames[:, 0] == MCU_PACKET_HEADER) & _validate_checksums(frames)
+
+
+def _find_header(buffer: bytearray, start: int, end: int) -> int:
+    headers = [
+        index
+        for index in (
+            buffer.find(MCU_PACKET_HEADER, start, end),
+            buffer.find(MCU_ECHO_PACKET_HEADER, start, end),
+        )
+        if index >= 0
+    ]
+    return min(headers) if headers else end
+
+
+def _frame_counts(frames: np.ndarray) -> np.ndarray:
+    return (frames[:, 1].astype(np.uint16) << 8) | frames[:, 2]
+
+
+def interpolate_timestamps(count: int, start_ns: int | None, end_ns: int) -> np.ndarray:
+    if start_ns is None or count == 0:
+        return np.full(count, end_ns, np.int64)
+    steps = np.arange(1, count + 1, dtype=np.int64)
+    return start_ns + (end_ns - start_ns) * steps // count
+
+
+def decode_mcu_packet_batch(
+    data: bytes | bytearray | memoryview, end_ns: int, start_ns: int | None = None
+) -> MCUPacketBatch:
+    frames = _frame_view(data, 0, len(data) // MCU_PACKET_LENGTH * MCU_PACKET_LENGTH)
+    return MCUPacketBatch(
+        _frame_counts(frames),
+        _validate_frames(frames),
+        interpolate_timestamps(len(frames), start_ns, end_ns),
+    )
+
+
+class MCUFrameDecoder:
+    def __init__(self, capacity: int = 1 << 16) -> None:
+        if capacity < MCU_PACKET_LENGTH:
+            raise ValueError("Invalid buffer capacity")
+
+        self.__buffer = bytearray(capacity)
+        self.__view = memoryview(self.__buffer)
+        self.__start = 0
+        self.__end = 0
+
+        self.__resync_count = 0
+        self.__checksum_error_count = 0
+        self.__dropped_byte_count = 0
+        self.__timestamp_ns: int | None = None
+        self.__echo_packets: list[tuple[bytes, int]] = []
+
+    @property
+    def capacity(self) -> int:
+        return len(self.__buffer)
+
+    @property
+    def buffered_byte_count(self) -> int:
+        return self.__end - self.__start
+
+    @property
+    def resync_count(self) -> int:
+        return self.__resync_count
+
+    @property
+    def checksum_error_count(self) -> int:
+        return self.__checksum_error_count
+
+    @property
+    def dropped_byte_count(self) -> int:
+        return self.__dropped_byte_count
+
+    def reset(self) -> None:
+        self.__start = 0
+        self.__end = 0
+        self.__resync_count = 0
+        self.__checksum_error_count = 0
+        self.__dropped_byte_count = 0
+        self.__timestamp_ns = None
+        self.__echo_packets.clear()
+
+    def take_echo_packets(self) -> list[tuple[bytes, int]]:
+        echo_packets, self.__echo_packets = self.__echo_packets, []
+        return echo_packets
+
+    def feed(self, data: bytes | bytearray | memoryview) -> list[MCUPacket]:
+        return [
+            MCUPacket(bytearray(count.to_bytes(2, "big")))
+            for count in self.feed_batch(data).counts.tolist()
+        ]
+
+    def feed_batch(
+        self, data: bytes | bytearray | memoryview, timestamp_ns: int | None = None
+    ) -> MCUPacketBatch:
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        self.__append(data)
+
+        runs: list[np.ndarray] = []
+        buffer = self.__buffer
+        position, end = self.__start, self.__end
+
+        while end - position >= MCU_PACKET_LENGTH:
+            if buffer[position] not in (MCU_PACKET_HEADER, MCU_ECHO_PACKET_HEADER):
+                header = _find_header(buffer, position, end)
+                self.__resync_count += 1
+                self.__dropped_byte_count += header - position
+                position = header
+                continue
+
+            # validate every complete packet from here in one pass, accept the
+            # leading run of valid ones and resync at the first invalid one
+            frames = _frame_view(
+                buffer,
+                position,
+                (end - position) // MCU_PACKET_LENGTH * MCU_PACKET_LENGTH,
+            )
+            valid = (
+                (frames[:, 0] == MCU_PACKET_HEADER)
+                | (frames[:, 0] == MCU_ECHO_PACKET_HEADER)
+            ) & _validate_checksums(frames)
+            accepted = len(valid) if valid.all() else int(valid.argmin())
+            accepted_frames = frames[:accepted]
+            echo = accepted_frames[:, 0] == MCU_ECHO_PACKET_HEADER
+            if echo.any():
+                self.__echo_packets.extend(
+                    (bytes(frame[1:3]), timestamp_ns) for frame in accepted_frames[echo]
+                )
+                accepted_frames = accepted_frames[~echo]
+            runs.append(_frame_counts(accepted_frames))
+            position += accepted * MCU_PACKET_LENGTH
+
+            if accepted < len(valid) and buffer[position] in (
+                MCU_PACKET_HEADER,
+                MCU_ECHO_PACKET_HEADER,
+            ):
+                self.__checksum_error_count += 1
+                self.__dropped_byte_count += 1
+                position += 1
+
+        if position == end:
+            position = end = self.__end = 0
+        self.__start = position
+
+        counts = np.concatenate(runs) if runs else np.empty(0, np.uint16)
+        batch = MCUPacketBatch(
+            counts,
+            np.ones(len(counts), np.bool_),
+            interpolate_timestamps(len(counts), self.__timestamp_ns, timestamp_ns),
+        )
+        self.__timestamp_ns = timestamp_ns
+        return batch
+
+    def __append(self, data: bytes | bytearray | memoryview) -> None:
+        size = len(data)
+        capacity = len(self.__buffer)
+
+        if size > capacity:
+            self.__dropped_byte_count += self.__end - self.__start + size - capacity
+            data = memoryview(data)[size - capacity :]
+            size = capacity
+            self.__start = self.__end = 0
+
+        if self.__end + size > capacity:
+            pending = self.__end - self.__start
+            if pending + size > capacity:
+                overflow = pending + size - capacity
+                self.__dropped_byte_count += overflow
+                self.__start += overflow
+                pending -= overflow
+            self.__view[:pending] = self.__view[self.__start : self.__end]
+            self.__start, self.__end = 0, pending
+
+        self.__view[self.__end : self.__end + size] = data
+        self.__end += size
@@ -0,0 +1,59 @@
+import struct
+
+from .lab3_serial_protocol import (
+    SerialControlBytes,
+    SerialPacket,
+    encode_fixed_command,
+)
+
+# frames for the single motor commands, shared by the function blocks and the
+# headless controller
+
+MOTOR_COMMAND_SPEED_LIMIT = 0xFFFF
+DC_MOTOR_POSITION_LIMIT = 0x7FFF
+
+
+def _check_range(name: str, value: int, limit: int) -> None:
+    if not -limit <= value <= limit:
+        raise ValueError(f"{name} {value} is outside ±{limit}")
+
+
+def dc_motor_duty_command(duty: int) -> bytearray:
+    _check_range("DC motor duty", duty, MOTOR_COMMAND_SPEED_LIMIT)
+    return SerialPacket(
+        SerialControlBytes.DC_MOTOR_OPEN_LOOP_VOLTAGE,
+        bytearray([int(duty > 0), abs(duty) >> 8, abs(duty) & 0x00FF]),
+    ).to_bytearray()
+
+
+def dc_motor_absolute_position_command(position: int) -> bytearray:
+    _check_range("DC motor position", position, DC_MOTOR_POSITION_LIMIT)
+    return SerialPacket(
+        SerialControlBytes.DC_MOTOR_ABSOLUTE_POSITION, struct.pack("<xh", position)
+    ).to_bytearray()
+
+
+def dc_motor_relative_position_command(increment: int) -> bytearray:
+    _check_range("DC motor increment", increment, DC_MOTOR_POSITION_LIMIT)
+    return SerialPacket(
+        SerialControlBytes.DC_MOTOR_RELATIVE_POSITION, struct.pack("<xh", increment)
+    ).to_bytearray()
+
+
+def stepper_motor_single_step_command(clockwise: bool) -> bytearray:
+    return bytearray(
+        encode_fixed_command(
+            SerialControlBytes.STEPPER_MOTOR_SINGLE_STEP,
+            b"\x01" if clockwise else b"\x00",
+        )
+    )
+
+
+def stepper_motor_speed_command(speed: int) -> bytearray:
+    _check_range("stepper motor speed", speed, MOTOR_COMMAND_SPEED_LIMIT)
+    # the MCU takes the half step timer interval, shorter is faster
+    interval = -abs(speed) + 2**16 - 1
+    return SerialPacket(
+        SerialControlBytes.STEPPER_MOTOR_OPEN_LOOP_SPEED,
+        bytearray([int(speed > 0), abs(interval) >> 8, abs(interval) & 0x00FF]),
+    ).to_bytearray()
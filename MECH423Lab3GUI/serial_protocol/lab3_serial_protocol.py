@@ -1,5 +1,9 @@
+import struct
 from dataclasses import dataclass
 from enum import IntEnum
+from functools import cache
+
+import numpy as np
 
 
 class SerialControlBytes(IntEnum):
@@ -12,22 +16,157 @@ class SerialControlBytes(IntEnum):
     TWO_AXIS_CONTROL = (0x03 << 8) + 0x00
 
 
+SERIAL_CONTROL_PAYLOAD_LENGTH = {
+    SerialControlBytes.ECHO: 3,
+    SerialControlBytes.DC_MOTOR_OPEN_LOOP_VOLTAGE: 3,
+    SerialControlBytes.DC_MOTOR_ABSOLUTE_POSITION: 3,
+    SerialControlBytes.DC_MOTOR_RELATIVE_POSITION: 3,
+    SerialControlBytes.STEPPER_MOTOR_SINGLE_STEP: 1,
+    SerialControlBytes.STEPPER_MOTOR_OPEN_LOOP_SPEED: 3,
+    SerialControlBytes.TWO_AXIS_CONTROL: 7,
+}
+
+
+class SerialFraming(IntEnum):
+    FIXED = 0  # 0xFF, control, data zero padded to 15 bytes, additive checksum
+    COMPACT = 1  # 0xFE, length, control, data, CRC-16 big endian
+
+
+SERIAL_PACKET_HEADER = 0xFF
+SERIAL_PACKET_LENGTH = 16
+SERIAL_PACKET_DATA_LENGTH = 12
+# header, control and zero padded data, the checksum byte follows
+SERIAL_PACKET_BODY = struct.Struct(f">BH{SERIAL_PACKET_DATA_LENGTH}s")
+COMPACT_PACKET_HEADER = 0xFE
+COMPACT_PACKET_OVERHEAD = 4
+COMPACT_PACKET_PREFIX = struct.Struct(">BBH")
+
+# bits per byte on the wire with 8N1 framing
+SERIAL_BITS_PER_BYTE = 10
+
+# port names starting with this are a TCP host:port, e.g. a simulated MCU
+SERIAL_SOCKET_SCHEME = "socket://"
+
+# ECHO payload tag asking the MCU to switch framing, answered by an echo
+# MCUPacket carrying the same tag and the accepted framing version
+ECHO_TAG_FRAMING_REQUEST = 0xC0
+# ECHO payload tag carrying a sequence number, echoed back once the MCU has
+# consumed every command sent before it
+ECHO_TAG_ACK = 0xA0
+MCU_ECHO_PACKET_HEADER = 0xFE
+
+
+def _crc16_table() -> list[int]:
+    table = []
+    for byte in range(0x100):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+
+_CRC16_TABLE = _crc16_table()
+
+
+def crc16_ccitt(data: bytes | bytearray | memoryview, crc: int = 0xFFFF) -> int:
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ _CRC16_TABLE[(crc >> 8) ^ byte]
+    return crc
+
+
+def pack_serial_packet_into(
+    buffer: bytearray | memoryview,
+    offset: int,
+    control: int,
+    data: bytes | bytearray,
+) -> None:
+    if len(data) > SERIAL_PACKET_DATA_LENGTH:
+        raise ValueError("Serial packet data too long")
+    SERIAL_PACKET_BODY.pack_into(buffer, offset, SERIAL_PACKET_HEADER, control, data)
+    # padding adds nothing to the checksum
+    buffer[offset + SERIAL_PACKET_LENGTH - 1] = (
+        SERIAL_PACKET_HEADER + (control >> 8) + (control & 0x00FF) + sum(data)
+    ) & 0xFF
+
+
 @dataclass(frozen=True)
 class SerialPacket:
     control: SerialControlBytes
-    data: bytearray
+    data: bytes | bytearray
 
     @staticmethod
-    def from_bytes(bytes: bytes):
-        pass
+    def from_bytes(bytes: bytes | bytearray | memoryview):
+        if len(bytes) == 0:
+            raise ValueError("Invalid packet length")
+
+        if bytes[0] == SERIAL_PACKET_HEADER:
+            if len(bytes) != SERIAL_PACKET_LENGTH:
+                raise ValueError("Invalid packet length")
+            if bytes[-1] != sum(bytes[:-1]) % 0x100:
+                raise ValueError("Invalid checksum")
+            control_bytes, data = bytes[1:3], bytes[3:-1]
+        elif bytes[0] == COMPACT_PACKET_HEADER:
+            if len(bytes) < COMPACT_PACKET_OVERHEAD + 2 or (
+                len(bytes) != bytes[1] + COMPACT_PACKET_OVERHEAD
+            ):
+                raise ValueError("Invalid packet length")
+            if crc16_ccitt(bytes[1:-2]) != int.from_bytes(bytes[-2:], "big"):
+                raise ValueError("Invalid checksum")
+            control_bytes, data = bytes[2:4], bytes[4:-2]
+        else:
+            raise ValueError("Invalid packet header")
+
+        control = SerialControlBytes(int.from_bytes(control_bytes, "big"))
+        # padding is dropped so both framings decode to the same packet
+        return SerialPacket(
+            control, bytearray(data[: SERIAL_CONTROL_PAYLOAD_LENGTH[control]])
+        )
+
+    def pack_into(self, buffer: bytearray | memoryview, offset: int = 0) -> None:
+        pack_serial_packet_into(buffer, offset, self.control, self.data)
 
     def to_bytearray(self):
-        temp = bytearray([0xFF, self.control >> 8, self.control & 0x00FF, *self.data])
+        frame = bytearray(SERIAL_PACKET_LENGTH)
+        pack_serial_packet_into(frame, 0, self.control, self.data)
+        return frame
+
+    def to_compact_bytearray(self):
+        frame = bytearray(COMPACT_PACKET_PREFIX.size + len(self.data) + 2)
+        COMPACT_PACKET_PREFIX.pack_into(
+            frame, 0, COMPACT_PACKET_HEADER, len(self.data) + 2, self.control
+        )
+        frame[COMPACT_PACKET_PREFIX.size : -2] = self.data
+        frame[-2:] = crc16_ccitt(memoryview(frame)[1:-2]).to_bytes(2, "big")
+        return frame
+
+
+# frames of commands without variable data, e.g. single steps, are encoded once
+@cache
+def encode_fixed_command(control: SerialControlBytes, data: bytes = b"") -> bytes:
+    return bytes(SerialPacket(control, data).to_bytearray())
+
+
+def encode_serial_packets(control: SerialControlBytes, data: np.ndarray) -> np.ndarray:
+    # one contiguous (N, 16) block of frames for N rows of data bytes
+    data = np.asarray(data, np.uint8).reshape(len(data), -1)
+    if data.shape[1] > SERIAL_PACKET_DATA_LENGTH:
+        raise ValueError("Serial packet data too long")
+    frames = np.zeros((len(data), SERIAL_PACKET_LENGTH), np.uint8)
+    frames[:, 0] = SERIAL_PACKET_HEADER
+    frames[:, 1] = control >> 8
+    frames[:, 2] = control & 0x00FF
+    frames[:, 3 : 3 + data.shape[1]] = data
+    frames[:, -1] = frames[:, :-1].sum(axis=1, dtype=np.uint32) & 0xFF
+    return frames
 
-        if len(temp) < 15:
-            temp = temp + bytearray(15 - len(temp))
 
-        return temp + bytearray([sum(temp) % 0x100])  # checksum
+def encode_frame(frame: bytearray, framing: SerialFraming) -> bytearray:
+    if framing == SerialFraming.FIXED:
+        return frame
+    control = SerialControlBytes((frame[1] << 8) + frame[2])
+    length = SERIAL_CONTROL_PAYLOAD_LENGTH[control]
+    return SerialPacket(control, frame[3 : 3 + length]).to_compact_bytearray()
 
 
 @dataclass(frozen=True)
@@ -0,0 +1,439 @@
+import os
+import selectors
+import socket
+import threading
+import time
+from collections.abc import Callable
+
+from loguru import logger
+
+from ..serial_protocol.lab3_serial_protocol import (
+    COMPACT_PACKET_HEADER,
+    COMPACT_PACKET_OVERHEAD,
+    ECHO_TAG_ACK,
+    ECHO_TAG_FRAMING_REQUEST,
+    MCU_ECHO_PACKET_HEADER,
+    SERIAL_BITS_PER_BYTE,
+    SERIAL_PACKET_HEADER,
+    SERIAL_PACKET_LENGTH,
+    SERIAL_SOCKET_SCHEME,
+    SerialControlBytes,
+    SerialFraming,
+    SerialPacket,
+    crc16_ccitt,
+)
+
+STEPPER_TIMER_FREQUENCY = 8e6
+
+SIMULATOR_TX_BUFFER_SIZE = 1 << 16
+
+
+class MCUSimulator:
+    def __init__(
+        self,
+        max_encoder_speed: float = 6000.0,
+        time_constant: float = 0.05,
+        position_gain: float = 20.0,
+    ) -> None:
+        self.__max_encoder_speed = max_encoder_speed
+        self.__time_constant = time_constant
+        self.__position_gain = position_gain
+
+        self.__rx_buffer = bytearray()
+        self.__rx_packet_count = 0
+        self.__rx_checksum_error_count = 0
+        self.__tx_replies = bytearray()
+
+        self.dc_motor_position = 0.0
+        self.dc_motor_velocity = 0.0
+        self.dc_motor_duty = 0
+        self.dc_motor_target: float | None = None
+
+        self.stepper_motor_position = 0
+        self.stepper_motor_direction = 0
+        self.stepper_motor_interval = 0xFFFF
+        self.stepper_motor_target: int | None = None
+        self.__stepper_motor_phase = 0.0
+
+    @property
+    def rx_packet_count(self) -> int:
+        return self.__rx_packet_count
+
+    @property
+    def rx_checksum_error_count(self) -> int:
+        return self.__rx_checksum_error_count
+
+    @property
+    def encoder_count(self) -> int:
+        return (0x4000 + round(self.dc_motor_position)) & 0xFFFF
+
+    def take_replies(self) -> bytes:
+        replies = bytes(self.__tx_replies)
+        self.__tx_replies.clear()
+        return replies
+
+    def telemetry_packet(self) -> bytes:
+        count = self.encoder_count
+        packet = bytes([SERIAL_PACKET_HEADER, count >> 8, count & 0xFF])
+        return packet + bytes([sum(packet) % 0x100])
+
+    def receive(self, data: bytes) -> None:
+        self.__rx_buffer += data
+        while self.__rx_buffer:
+            if self.__rx_buffer[0] == SERIAL_PACKET_HEADER:
+                if len(self.__rx_buffer) < SERIAL_PACKET_LENGTH:
+                    return
+                packet = self.__rx_buffer[:SERIAL_PACKET_LENGTH]
+                valid = sum(packet[:-1]) % 0x100 == packet[-1]
+            elif self.__rx_buffer[0] == COMPACT_PACKET_HEADER:
+                if len(self.__rx_buffer) < 2:
+                    return
+                length = self.__rx_buffer[1] + COMPACT_PACKET_OVERHEAD
+                if len(self.__rx_buffer) < length:
+                    return
+                packet = self.__rx_buffer[:length]
+                valid = crc16_ccitt(packet[1:-2]) == int.from_bytes(packet[-2:], "big")
+            else:
+                del self.__rx_buffer[0]
+                continue
+
+            if not valid:
+                self.__rx_checksum_error_count += 1
+                del self.__rx_buffer[0]
+                continue
+            del self.__rx_buffer[: len(packet)]
+
+            try:
+                serial_packet = SerialPacket.from_bytes(packet)
+            except ValueError:
+                logger.warning(f"unknown control in packet {packet.hex().upper()}")
+                continue
+            self.__rx_packet_count += 1
+            # handlers index into the zero padded data of fixed frames
+            self.handle(
+                serial_packet.control, bytes(serial_packet.data).ljust(12, b"\x00")
+            )
+
+    def handle(self, control: SerialControlBytes, data: bytes) -> None:
+        match control:
+            case SerialControlBytes.ECHO:
+                if data[0] == ECHO_TAG_FRAMING_REQUEST and data[1] in [
+                    framing.value for framing in SerialFraming
+                ]:
+                    self.reply_echo(data[0], data[1])
+                elif data[0] == ECHO_TAG_ACK:
+                    self.reply_echo(data[0], data[1])
+            case SerialControlBytes.DC_MOTOR_OPEN_LOOP_VOLTAGE:
+                duty = (data[1] << 8) + data[2]
+                self.dc_motor_duty = duty if data[0] else -duty
+                self.dc_motor_target = None
+            case SerialControlBytes.DC_MOTOR_ABSOLUTE_POSITION:
+                self.dc_motor_target = int.from_bytes(data[1:3], "little", signed=True)
+            case SerialControlBytes.DC_MOTOR_RELATIVE_POSITION:
+                self.dc_motor_target = (
+                    self.dc_motor_target
+                    if self.dc_motor_target is not None
+                    else round(self.dc_motor_position)
+                ) + int.from_bytes(data[1:3], "little", signed=True)
+            case SerialControlBytes.STEPPER_MOTOR_SINGLE_STEP:
+                self.stepper_motor_position += 1 if data[0] else -1
+            case SerialControlBytes.STEPPER_MOTOR_OPEN_LOOP_SPEED:
+                self.stepper_motor_direction = 1 if data[0] else -1
+                self.stepper_motor_interval = (data[1] << 8) + data[2]
+                self.stepper_motor_target = None
+            case SerialControlBytes.TWO_AXIS_CONTROL:
+                self.handle(SerialControlBytes.DC_MOTOR_RELATIVE_POSITION, data[0:3])
+                steps = int.from_bytes(data[5:7], "little", signed=True)
+                self.stepper_motor_interval = int.from_bytes(data[3:5], "little")
+                self.stepper_motor_direction = 1 if steps >= 0 else -1
+                self.stepper_motor_target = (
+                    self.stepper_motor_target
+                    if self.stepper_motor_target is not None
+                    else self.stepper_motor_position
+                ) + steps
+
+    def reply_echo(self, high: int, low: int) -> None:
+        packet = bytes([MCU_ECHO_PACKET_HEADER, high, low])
+        self.__tx_replies += packet + bytes([sum(packet) % 0x100])
+
+    def step(self, dt: float) -> None:
+        if self.dc_motor_target is not None:
+            target_velocity = self.__position_gain * (
+                self.dc_motor_target - self.dc_motor_position
+            )
+        else:
+            target_velocity = self.dc_motor_duty / 0xFFFF * self.__max_encoder_speed
+        target_velocity = max(
+            -self.__max_encoder_speed, min(self.__max_encoder_speed, target_velocity)
+        )
+        self.dc_motor_velocity += (
+            (target_velocity - self.dc_motor_velocity)
+            * min(dt, self.__time_constant)
+            / self.__time_constant
+        )
+        self.dc_motor_position += self.dc_motor_velocity * dt
+
+        if self.stepper_motor_interval in (0, 0xFFFF):
+            return
+        if self.stepper_motor_target == self.stepper_motor_position:
+            return
+        self.__stepper_motor_phase += (
+            dt * STEPPER_TIMER_FREQUENCY / self.stepper_motor_interval
+        )
+        steps = int(self.__stepper_motor_phase)
+        self.__stepper_motor_phase -= steps
+        if self.stepper_motor_target is not None:
+            steps = min(
+                steps, abs(self.stepper_motor_target - self.stepper_motor_position)
+            )
+        self.stepper_motor_position += self.stepper_motor_direction * steps
+
+
+# runs a simulator against a host on its own thread, receive waits up to the
+# given time for bytes from the host and send writes what it can without
+# blocking
+class MCUSimulatorLink:
+    def __init__(
+        self,
+        receive: Callable[[float], bytes],
+        send: Callable[[bytes], int],
+        simulator: MCUSimulator | None = None,
+        telemetry_rate: float = 100.0,
+        baud_rate: int | None = None,
+    ) -> None:
+        self.__receive = receive
+        self.__send = send
+        self.__simulator = simulator if simulator is not None else MCUSimulator()
+        self.__telemetry_rate = telemetry_rate
+        if baud_rate is not None:
+            self.__telemetry_rate = min(
+                telemetry_rate, baud_rate / SERIAL_BITS_PER_BYTE / 4
+            )
+
+        self.__stop_event = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__tx_packet_count = 0
+        self.__tx_pending = bytearray()
+
+    @property
+    def simulator(self) -> MCUSimulator:
+        return self.__simulator
+
+    @property
+    def telemetry_rate(self) -> float:
+        return self.__telemetry_rate
+
+    @property
+    def tx_packet_count(self) -> int:
+        return self.__tx_packet_count
+
+    def start(self) -> None:
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop_event.set()
+        self.__thread.join()
+
+    def __run(self) -> None:
+        period = 1 / self.__telemetry_rate if self.__telemetry_rate > 0 else None
+        last_time = time.perf_counter()
+        next_telemetry_time = last_time
+
+        while not self.__stop_event.is_set():
+            timeout = 0.05 if period is None else next_telemetry_time - last_time
+            data = self.__receive(max(0.0, min(timeout, 0.05)))
+            if data:
+                self.__simulator.receive(data)
+
+            now = time.perf_counter()
+            self.__simulator.step(now - last_time)
+            last_time = now
+            self.__tx_pending += self.__simulator.take_replies()
+
+            if period is not None and now >= next_telemetry_time:
+                # catch up in one write if the loop fell behind
+                due = int((now - next_telemetry_time) / period) + 1
+                next_telemetry_time += due * period
+                self.__tx_pending += self.__simulator.telemetry_packet() * due
+                self.__tx_packet_count += due
+
+            if not self.__tx_pending:
+                continue
+            del self.__tx_pending[: self.__send(self.__tx_pending)]
+            if len(self.__tx_pending) > SIMULATOR_TX_BUFFER_SIZE:
+                # nobody is reading the port, drop whole packets
+                self.__tx_pending.clear()
+
+
+class MCUSimulatorPty(MCUSimulatorLink):
+    def __init__(
+        self,
+        simulator: MCUSimulator | None = None,
+        telemetry_rate: float = 100.0,
+        baud_rate: int | None = None,
+    ) -> None:
+        if os.name != "posix":
+            raise OSError("pseudo terminals need Linux or macOS")
+        import tty
+
+        self.__master_fd, self.__slave_fd = os.openpty()
+        tty.setraw(self.__master_fd)
+        tty.setraw(self.__slave_fd)
+        os.set_blocking(self.__master_fd, False)
+        self.__port_name = os.ttyname(self.__slave_fd)
+        self.__selector = selectors.DefaultSelector()
+        self.__selector.register(self.__master_fd, selectors.EVENT_READ)
+        super().__init__(
+            self.__receive, self.__send, simulator, telemetry_rate, baud_rate
+        )
+
+    @property
+    def port_name(self) -> str:
+        return self.__port_name
+
+    def stop(self) -> None:
+        super().stop()
+        self.__selector.close()
+        os.close(self.__master_fd)
+        os.close(self.__slave_fd)
+
+    def __receive(self, timeout: float) -> bytes:
+        if not self.__selector.select(timeout):
+            return b""
+        try:
+            return os.read(self.__master_fd, 4096)
+        except OSError:
+            return b""
+
+    def __send(self, data: bytes) -> int:
+        try:
+            return os.write(self.__master_fd, data)
+        except OSError:
+            return 0
+
+
+# a local TCP port instead of a pty, works on every platform and the serial
+# worker opens it as socket://127.0.0.1:<port>, one host at a time, a new
+# connection replaces the old one
+class MCUSimulatorSocket(MCUSimulatorLink):
+    def __init__(
+        self,
+        simulator: MCUSimulator | None = None,
+        telemetry_rate: float = 100.0,
+        baud_rate: int | None = None,
+        port: int = 0,
+    ) -> None:
+        self.__listener = socket.create_server(("127.0.0.1", port))
+        self.__listener.setblocking(False)
+        self.__connection: socket.socket | None = None
+        self.__selector = selectors.DefaultSelector()
+        self.__selector.register(self.__listener, selectors.EVENT_READ)
+        super().__init__(
+            self.__receive, self.__send, simulator, telemetry_rate, baud_rate
+        )
+
+    @property
+    def port_name(self) -> str:
+        host, port = self.__listener.getsockname()[:2]
+        return f"{SERIAL_SOCKET_SCHEME}{host}:{port}"
+
+    def stop(self) -> None:
+        super().stop()
+        self.__disconnect()
+        self.__selector.close()
+        self.__listener.close()
+
+    def __receive(self, timeout: float) -> bytes:
+        data = bytearray()
+        for key, _ in self.__selector.select(timeout):
+            if key.fileobj is self.__listener:
+                try:
+                    connection, _ = self.__listener.accept()
+                except OSError:
+                    continue
+                self.__disconnect()
+                connection.setblocking(False)
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.__selector.register(connection, selectors.EVENT_READ)
+                self.__connection = connection
+                continue
+            if key.fileobj is not self.__connection:
+                # replaced by a connection accepted just now
+                continue
+            try:
+                chunk = self.__connection.recv(4096)
+            except BlockingIOError:
+                continue
+            except OSError:
+                chunk = b""
+            if not chunk:
+                self.__disconnect()
+            data += chunk
+        return bytes(data)
+
+    def __send(self, data: bytes) -> int:
+        if self.__connection is None:
+            # like a UART with nothing attached
+            return len(data)
+        try:
+            return self.__connection.send(data)
+        except BlockingIOError:
+            return 0
+        except OSError:
+            self.__disconnect()
+            return len(data)
+
+    def __disconnect(self) -> None:
+        if self.__connection is None:
+            return
+        self.__selector.unregister(self.__connection)
+        self.__connection.close()
+        self.__connection = None
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Simulated MECH423 Lab3 MCU on a pty")
+    parser.add_argument("--rate", type=float, default=100, help="telemetry packets/s")
+    parser.add_argument("--baud", type=int, default=None, help="emulated link limit")
+    parser.add_argument(
+        "--socket",
+        type=int,
+        default=None,
+        metavar="PORT",
+        help="serve on a local TCP port instead, 0 picks a free one",
+    )
+    arguments = parser.parse_args()
+
+    logger.enable(__package__)
+    try:
+        if arguments.socket is not None:
+            simulator_link = MCUSimulatorSocket(
+                telemetry_rate=arguments.rate,
+                baud_rate=arguments.baud,
+                port=arguments.socket,
+            )
+        else:
+            simulator_link = MCUSimulatorPty(
+                telemetry_rate=arguments.rate, baud_rate=arguments.baud
+            )
+    except OSError as e:
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(1)
+    simulator_link.start()
+    print(
+        f"simulated MCU on {simulator_link.port_name} at {simulator_link.telemetry_rate:.0f} packets/s",
+        flush=True,
+    )
+    try:
+        while True:
+            time.sleep(1)
+            simulator = simulator_link.simulator
+            print(
+                f"rx {simulator.rx_packet_count} tx {simulator_link.tx_packet_count} encoder {simulator.encoder_count - 0x4000} stepper {simulator.stepper_motor_position}",
+                flush=True,
+            )
+    except KeyboardInterrupt:
+        simulator_link.stop()
@@ -0,0 +1,3 @@
+from loguru import logger
+
+logger.disable(__name__)
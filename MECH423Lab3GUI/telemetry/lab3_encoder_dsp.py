@@ -0,0 +1,476 @@
+import math
+from dataclasses import dataclass
+from enum import Enum
+
+import numpy as np
+
+from .ring_buffer import RingBuffer
+
+# the MCU reports the encoder as a 16 bit counter starting at 0x4000
+ENCODER_COUNT_OFFSET = 0x4000
+ENCODER_COUNT_MODULO = 0x10000
+ENCODER_COUNTS_PER_CYCLE = 20.4 * 48 / 4
+
+
+class EncoderUnwrapper:
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.__last_count: int | None = None
+        self.__position = 0
+
+    def unwrap(self, counts: np.ndarray) -> np.ndarray:
+        counts = np.asarray(counts, np.int64)
+        if len(counts) == 0:
+            return np.empty(0, np.int64)
+        if self.__last_count is None:
+            self.__last_count = int(counts[0])
+            self.__position = int(counts[0]) - ENCODER_COUNT_OFFSET
+        if len(counts) == 1:
+            count = int(counts[0])
+            self.__position += (
+                count - self.__last_count + ENCODER_COUNT_MODULO // 2
+            ) % ENCODER_COUNT_MODULO - ENCODER_COUNT_MODULO // 2
+            self.__last_count = count
+            return np.array([self.__position], np.int64)
+
+        # steps between samples are taken as the shortest way around the counter
+        steps = np.empty_like(counts)
+        steps[0] = counts[0] - self.__last_count
+        np.subtract(counts[1:], counts[:-1], out=steps[1:])
+        steps = (steps + ENCODER_COUNT_MODULO // 2) % ENCODER_COUNT_MODULO
+        positions = self.__position + np.cumsum(steps - ENCODER_COUNT_MODULO // 2)
+
+        self.__last_count = int(counts[-1])
+        self.__position = int(positions[-1])
+        return positions
+
+
+class RollingRegression:
+    # running sums drift and lose precision as x grows, they are recomputed
+    # around the newest sample this often
+    REBASE_INTERVAL = 4096
+
+    def __init__(self, window: int) -> None:
+        if window < 2:
+            raise ValueError("Invalid regression window")
+        self.__window = window
+        self.__x = RingBuffer(window)
+        self.__y = RingBuffer(window)
+        self.reset()
+
+    @property
+    def window(self) -> int:
+        return self.__window
+
+    def reset(self) -> None:
+        self.__x.clear()
+        self.__y.clear()
+        self.__x_reference = 0.0
+        self.__y_reference = 0.0
+        self.__sums = [0.0] * 4  # x, y, xx, xy relative to the references
+        self.__since_rebase = 0
+
+    # slope of y over x and the fitted y at every new sample, each over the
+    # last `window` samples, NaN while fewer than two samples are known
+    def update(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        count, window, buffered = len(x), self.__window, len(self.__x)
+        if count == 0:
+            return np.empty(0), np.empty(0)
+        if count == 1:
+            slope, fitted = self.update_one(float(x[0]), float(y[0]))
+            return np.array([slope]), np.array([fitted])
+        if buffered == 0:
+            self.__x_reference, self.__y_reference = float(x[0]), float(y[0])
+
+        x = np.asarray(x, np.float64) - self.__x_reference
+        y = np.asarray(y, np.float64) - self.__y_reference
+
+        # running sums of x, y, xx and xy, every new sample adds its terms
+        # and takes out those of the sample it pushes out of the window
+        sums = np.empty((4, count))
+        sums[0], sums[1] = x, y
+        np.multiply(x, x, out=sums[2])
+        np.multiply(x, y, out=sums[3])
+        leaving = max(0, buffered + count - window)
+        if leaving:
+            leaving_x, leaving_y = self.__x.view(), self.__y.view()
+            if leaving <= buffered:
+                leaving_x, leaving_y = leaving_x[:leaving], leaving_y[:leaving]
+            else:
+                leaving_x = np.concatenate((leaving_x, x[: leaving - buffered]))
+                leaving_y = np.concatenate((leaving_y, y[: leaving - buffered]))
+            tail = sums[:, count - leaving :]
+            tail[0] -= leaving_x
+            tail[1] -= leaving_y
+            tail[2] -= leaving_x * leaving_x
+            tail[3] -= leaving_x * leaving_y
+        np.cumsum(sums, axis=1, out=sums)
+        sums += np.array(self.__sums)[:, None]
+
+        sample_count = np.arange(buffered + 1, buffered + count + 1, dtype=np.float64)
+        np.minimum(sample_count, window, out=sample_count)
+        sum_x, sum_y, sum_xx, sum_xy = sums
+        denominator = sample_count * sum_xx - sum_x * sum_x
+        slope = np.full(count, np.nan)
+        np.divide(
+            sample_count * sum_xy - sum_x * sum_y,
+            denominator,
+            out=slope,
+            where=(sample_count > 1) & (denominator > 0),
+        )
+        fitted = (sum_y + slope * (x * sample_count - sum_x)) / sample_count
+        fitted += self.__y_reference
+
+        self.__x.extend(x)
+        self.__y.extend(y)
+        self.__sums = sums[:, -1].tolist()
+        self.__since_rebase += count
+        if self.__since_rebase >= self.REBASE_INTERVAL:
+            self.__rebase()
+        return slope, fitted
+
+    # the same for a single sample in plain floats, array setup would cost
+    # several times the arithmetic
+    def update_one(self, x: float, y: float) -> tuple[float, float]:
+        if len(self.__x) == 0:
+            self.__x_reference, self.__y_reference = x, y
+        x -= self.__x_reference
+        y -= self.__y_reference
+        sum_x, sum_y, sum_xx, sum_xy = self.__sums
+        sum_x += x
+        sum_y += y
+        sum_xx += x * x
+        sum_xy += x * y
+        sample_count = len(self.__x) + 1
+        if sample_count > self.__window:
+            leaving_x, leaving_y = float(self.__x.first()), float(self.__y.first())
+            sum_x -= leaving_x
+            sum_y -= leaving_y
+            sum_xx -= leaving_x * leaving_x
+            sum_xy -= leaving_x * leaving_y
+            sample_count = self.__window
+
+        denominator = sample_count * sum_xx - sum_x * sum_x
+        slope = (
+            (sample_count * sum_xy - sum_x * sum_y) / denominator
+            if sample_count > 1 and denominator > 0
+            else np.nan
+        )
+        fitted = (sum_y + slope * (x * sample_count - sum_x)) / sample_count
+        fitted += self.__y_reference
+
+        self.__x.append(x)
+        self.__y.append(y)
+        self.__sums = [sum_x, sum_y, sum_xx, sum_xy]
+        self.__since_rebase += 1
+        if self.__since_rebase >= self.REBASE_INTERVAL:
+            self.__rebase()
+        return slope, fitted
+
+    def __rebase(self) -> None:
+        x, y = self.__x.view().copy(), self.__y.view().copy()
+        x_shift, y_shift = x[-1], y[-1]
+        self.__x_reference += x_shift
+        self.__y_reference += y_shift
+        x -= x_shift
+        y -= y_shift
+        self.__x.clear()
+        self.__y.clear()
+        self.__x.extend(x)
+        self.__y.extend(y)
+        self.__sums = [
+            float(x.sum()),
+            float(y.sum()),
+            float((x * x).sum()),
+            float((x * y).sum()),
+        ]
+        self.__since_rebase = 0
+
+
+class TimestampDejitter:
+    # a jump this much off the fitted clock, e.g. after a pause, restarts it
+    RESET_GAP_S = 0.1
+
+    def __init__(self, window: int = 256) -> None:
+        self.__regression = RollingRegression(window)
+        self.reset()
+
+    def reset(self) -> None:
+        self.__regression.reset()
+        self.__index = 0
+        self.__reference_ns: int | None = None
+        self.__last_s = 0.0
+        self.__period_s = 0.0
+
+    @property
+    def period_s(self) -> float:
+        return self.__period_s
+
+    def dejitter(self, timestamps_ns: np.ndarray) -> np.ndarray:
+        timestamps_ns = np.asarray(timestamps_ns, np.int64)
+        if len(timestamps_ns) == 0:
+            return np.empty(0, np.int64)
+        if self.__reference_ns is not None:
+            first_s = (int(timestamps_ns[0]) - self.__reference_ns) / 1e9
+            if abs(first_s - self.__last_s - self.__period_s) > self.RESET_GAP_S:
+                self.reset()
+        if self.__reference_ns is None:
+            self.__reference_ns = int(timestamps_ns[0])
+
+        if len(timestamps_ns) == 1:
+            return np.array([self.__dejitter_one(int(timestamps_ns[0]))], np.int64)
+
+        # arrival times regressed over the sample index give the MCU clock
+        times_s = (timestamps_ns - self.__reference_ns) / 1e9
+        indices = np.arange(self.__index, self.__index + len(times_s))
+        period_s, fitted_s = self.__regression.update(indices, times_s)
+        np.copyto(fitted_s, times_s, where=np.isnan(fitted_s))
+        # the fit may only move forward in time
+        fitted_s[0] = max(fitted_s[0], self.__last_s)
+        np.maximum.accumulate(fitted_s, out=fitted_s)
+
+        self.__index += len(times_s)
+        self.__last_s = float(fitted_s[-1])
+        if not np.isnan(period_s[-1]):
+            self.__period_s = float(period_s[-1])
+        return self.__reference_ns + np.round(fitted_s * 1e9).astype(np.int64)
+
+    def __dejitter_one(self, timestamp_ns: int) -> int:
+        time_s = (timestamp_ns - self.__reference_ns) / 1e9
+        period_s, fitted_s = self.__regression.update_one(self.__index, time_s)
+        if math.isnan(fitted_s):
+            fitted_s = time_s
+        fitted_s = max(fitted_s, self.__last_s)
+
+        self.__index += 1
+        self.__last_s = fitted_s
+        if not math.isnan(period_s):
+            self.__period_s = period_s
+        return self.__reference_ns + round(fitted_s * 1e9)
+
+
+class FiniteDifferenceVelocity:
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.__last: tuple[float, float] | None = None
+
+    def estimate(self, times_s: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        if len(times_s) == 0:
+            return np.empty(0)
+        last_time, last_position = self.__last or (times_s[0], positions[0])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            velocities = np.diff(positions, prepend=last_position) / np.diff(
+                times_s, prepend=last_time
+            )
+        self.__last = (times_s[-1], positions[-1])
+        return np.nan_to_num(velocities, nan=0, posinf=0, neginf=0)
+
+
+class MovingRegressionVelocity:
+    def __init__(self, window: int = 32) -> None:
+        self.__regression = RollingRegression(window)
+
+    def reset(self) -> None:
+        self.__regression.reset()
+
+    def estimate(self, times_s: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        if len(times_s) == 1:
+            slope, _ = self.__regression.update_one(
+                float(times_s[0]), float(positions[0])
+            )
+            return np.array([slope if math.isfinite(slope) else 0.0])
+        slope, _ = self.__regression.update(times_s, positions)
+        return np.nan_to_num(slope, nan=0, posinf=0, neginf=0)
+
+
+class SavitzkyGolayVelocity:
+    def __init__(self, window: int = 31, order: int = 2) -> None:
+        if not 0 < order < window:
+            raise ValueError("Invalid Savitzky-Golay window or order")
+        # derivative of the polynomial fitted over the window at its newest
+        # sample, the filter stays causal at the cost of some noise
+        offsets = np.arange(-(window - 1), 1, dtype=np.float64)
+        self.__coefficients = np.linalg.pinv(
+            np.vander(offsets, order + 1, increasing=True)
+        )[1]
+        self.__window = window
+        self.reset()
+
+    def reset(self) -> None:
+        self.__times: np.ndarray | None = None
+        self.__positions: np.ndarray | None = None
+
+    def estimate(self, times_s: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        if len(times_s) == 0:
+            return np.empty(0)
+        if self.__times is None or self.__positions is None:
+            # start from rest at the first sample
+            self.__times = times_s[0] - np.arange(self.__window - 1, 0, -1) * 1e-3
+            self.__positions = np.full(self.__window - 1, positions[0], np.float64)
+
+        times = np.concatenate((self.__times, times_s))
+        positions = np.concatenate((self.__positions, positions))
+        # the same filter on the timestamps gives the local sample period
+        with np.errstate(divide="ignore", invalid="ignore"):
+            velocities = np.correlate(
+                positions, self.__coefficients, "valid"
+            ) / np.correlate(times, self.__coefficients, "valid")
+
+        self.__times = times[-(self.__window - 1) :]
+        self.__positions = positions[-(self.__window - 1) :]
+        return np.nan_to_num(velocities, nan=0, posinf=0, neginf=0)
+
+
+class AlphaBetaVelocity:
+    # modes decaying faster than this are run sample by sample
+    MIN_MODE_MAGNITUDE = 1e-3
+
+    def __init__(self, alpha: float = 0.5, beta: float = 0.05) -> None:
+        if not (0 < alpha < 1 and 0 < beta < 4 - 2 * alpha):
+            raise ValueError("Unstable alpha-beta gains")
+        self.__alpha = alpha
+        self.__beta = beta
+        self.reset()
+
+    def reset(self) -> None:
+        self.__state: np.ndarray | None = None  # position, velocity
+        self.__last_time = 0.0
+        self.__period_s = 1e-3
+
+    def estimate(self, times_s: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        count = len(times_s)
+        if count == 0:
+            return np.empty(0)
+        if self.__state is None:
+            self.__state = np.array([positions[0], 0.0])
+            self.__last_time = times_s[0] - self.__period_s
+
+        # the filter runs at the mean sample period of the block, the samples
+        # are evenly spaced once dejittered
+        period_s = (times_s[-1] - self.__last_time) / count
+        if period_s > 0:
+            self.__period_s = period_s
+        self.__last_time = times_s[-1]
+
+        alpha, beta, dt = self.__alpha, self.__beta, self.__period_s
+        # predict then correct, s[k] = F s[k - 1] + g y[k]
+        transition = np.array(
+            [[1 - alpha, (1 - alpha) * dt], [-beta / dt, 1 - beta]], np.float64
+        )
+        gain = np.array([alpha, beta / dt])
+        states = self.__run(transition, gain, np.asarray(positions, np.float64))
+        self.__state = states[-1]
+        return states[:, 1]
+
+    def __run(
+        self, transition: np.ndarray, gain: np.ndarray, positions: np.ndarray
+    ) -> np.ndarray:
+        eigenvalues, eigenvectors = np.linalg.eig(transition)
+        magnitude = np.abs(eigenvalues).min()
+        if (
+            magnitude < self.MIN_MODE_MAGNITUDE
+            or np.linalg.cond(eigenvectors) > 1e8
+            or abs(eigenvalues[0] - eigenvalues[1]) < 1e-9
+        ):
+            return self.__run_sequential(transition, gain, positions)
+
+        # in modal form every mode is a first order recursion, which has a
+        # closed form over a chunk as long as lambda ** -k stays representable
+        inverse = np.linalg.inv(eigenvectors)
+        modes = inverse @ self.__state
+        mode_gain = inverse @ gain
+        chunk = int(np.clip(np.log(1e6) / -np.log(magnitude), 1, 256))
+
+        states = np.empty((len(positions), 2))
+        for start in range(0, len(positions), chunk):
+            block = positions[start : start + chunk]
+            steps = np.arange(1, len(block) + 1)
+            powers = eigenvalues[:, None] ** steps
+            trajectory = powers * (
+                modes[:, None] + mode_gain[:, None] * np.cumsum(block / powers, axis=1)
+            )
+            modes = trajectory[:, -1]
+            states[start : start + len(block)] = (eigenvectors @ trajectory).real.T
+        return states
+
+    def __run_sequential(
+        self, transition: np.ndarray, gain: np.ndarray, positions: np.ndarray
+    ) -> np.ndarray:
+        states = np.empty((len(positions), 2))
+        state = self.__state
+        for index, position in enumerate(positions):
+            state = transition @ state + gain * position
+            states[index] = state
+        return states
+
+
+class VelocityEstimator(Enum):
+    FINITE_DIFFERENCE = "Finite Difference"
+    MOVING_REGRESSION = "Moving Regression"
+    SAVITZKY_GOLAY = "Savitzky-Golay"
+    ALPHA_BETA = "Alpha-Beta"
+
+
+def make_velocity_estimator(estimator: VelocityEstimator):
+    match estimator:
+        case VelocityEstimator.FINITE_DIFFERENCE:
+            return FiniteDifferenceVelocity()
+        case VelocityEstimator.MOVING_REGRESSION:
+            return MovingRegressionVelocity()
+        case VelocityEstimator.SAVITZKY_GOLAY:
+            return SavitzkyGolayVelocity()
+        case VelocityEstimator.ALPHA_BETA:
+            return AlphaBetaVelocity()
+
+
+@dataclass(frozen=True)
+class EncoderSamples:
+    timestamps_ns: np.ndarray  # dejittered
+    positions: np.ndarray  # counts from the 0x4000 start, unwrapped
+    velocities: np.ndarray  # counts per second
+
+
+class EncoderPipeline:
+    def __init__(
+        self,
+        estimator: VelocityEstimator = VelocityEstimator.MOVING_REGRESSION,
+        dejitter_window: int = 256,
+    ) -> None:
+        self.__unwrapper = EncoderUnwrapper()
+        self.__dejitter = TimestampDejitter(dejitter_window)
+        self.__reference_ns: int | None = None
+        self.set_estimator(estimator)
+
+    @property
+    def estimator(self) -> VelocityEstimator:
+        return self.__estimator
+
+    def set_estimator(self, estimator: VelocityEstimator) -> None:
+        self.__estimator = estimator
+        self.__velocity_estimator = make_velocity_estimator(estimator)
+
+    @property
+    def period_s(self) -> float:
+        return self.__dejitter.period_s
+
+    def reset(self) -> None:
+        self.__unwrapper.reset()
+        self.__dejitter.reset()
+        self.__velocity_estimator.reset()
+        self.__reference_ns = None
+
+    def process(self, counts: np.ndarray, timestamps_ns: np.ndarray) -> EncoderSamples:
+        positions = self.__unwrapper.unwrap(counts)
+        timestamps_ns = self.__dejitter.dejitter(timestamps_ns)
+        if len(timestamps_ns) and self.__reference_ns is None:
+            self.__reference_ns = int(timestamps_ns[0])
+        # estimators work in seconds from the first sample to keep precision
+        times_s = (timestamps_ns - (self.__reference_ns or 0)) / 1e9
+        velocities = self.__velocity_estimator.estimate(
+            times_s, positions.astype(np.float64)
+        )
+        return EncoderSamples(timestamps_ns, positions, velocities)
@@ -0,0 +1,256 @@
+import bisect
+import itertools
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+
+class ChunkedRows:
+    # rows are appended into fixed size chunks, full chunks never change again
+    # and may be moved to disk and memory mapped back
+    def __init__(self, columns: int, chunk_size: int) -> None:
+        self.__columns = columns
+        self.__chunk_size = chunk_size
+        self.__chunks: list[np.ndarray] = []
+        self.__chunk_keys: list[float] = []  # first key of every full chunk
+        self.__current = np.empty((chunk_size, columns))
+        self.__fill = 0
+        self.__spill_directory: Path | None = None
+
+    def __len__(self) -> int:
+        return len(self.__chunks) * self.__chunk_size + self.__fill
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.__current.nbytes + sum(
+            chunk.nbytes for chunk in self.__chunks if not isinstance(chunk, np.memmap)
+        )
+
+    @property
+    def disk_bytes(self) -> int:
+        return sum(
+            chunk.nbytes for chunk in self.__chunks if isinstance(chunk, np.memmap)
+        )
+
+    def spill_to(self, directory: Path | None) -> None:
+        self.__spill_directory = directory
+        if directory is not None:
+            self.__chunks = [self.__spill(chunk) for chunk in self.__chunks]
+
+    def append(self, rows: np.ndarray) -> None:
+        while len(rows):
+            count = min(len(rows), self.__chunk_size - self.__fill)
+            self.__current[self.__fill : self.__fill + count] = rows[:count]
+            self.__fill += count
+            rows = rows[count:]
+            if self.__fill == self.__chunk_size:
+                self.__chunks.append(self.__spill(self.__current))
+                self.__chunk_keys.append(float(self.__current[0, 0]))
+                self.__current = np.empty((self.__chunk_size, self.__columns))
+                self.__fill = 0
+
+    def rows(self, start: int, stop: int) -> np.ndarray:
+        stop = min(stop, len(self))
+        if start >= stop:
+            return np.empty((0, self.__columns))
+        parts = []
+        first, last = start // self.__chunk_size, (stop - 1) // self.__chunk_size
+        for index in range(first, last + 1):
+            chunk = self.__chunk(index)
+            offset = index * self.__chunk_size
+            parts.append(chunk[max(start - offset, 0) : stop - offset])
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    # index of the first row whose key, the first column, is at or after the
+    # value, or after it on the right side, keys must not decrease
+    def search(self, value: float, side: str = "left") -> int:
+        keys = self.__chunk_keys
+        if self.__fill:
+            keys = keys + [float(self.__current[0, 0])]
+        if side == "left":
+            index = bisect.bisect_left(keys, value) - 1
+        else:
+            index = bisect.bisect_right(keys, value) - 1
+        if index < 0:
+            return 0
+        chunk = self.__chunk(index)
+        return index * self.__chunk_size + int(
+            np.searchsorted(chunk[:, 0], value, side)  # type: ignore
+        )
+
+    def clear(self) -> None:
+        self.__chunks.clear()
+        self.__chunk_keys.clear()
+        self.__fill = 0
+
+    def __chunk(self, index: int) -> np.ndarray:
+        if index < len(self.__chunks):
+            return self.__chunks[index]
+        return self.__current[: self.__fill]
+
+    def __spill(self, chunk: np.ndarray) -> np.ndarray:
+        if self.__spill_directory is None or isinstance(chunk, np.memmap):
+            return chunk
+        path = self.__spill_directory / f"{id(self):x}_{next(_spill_numbers)}.npy"
+        np.save(path, chunk)
+        return np.load(path, mmap_mode="r")
+
+
+_spill_numbers = itertools.count()
+
+
+class LodStore:
+    # level 0 holds the raw rows (x, values...), every level above holds one
+    # row (x first, x last, minima..., maxima...) per `factor` rows below, a
+    # query picks the finest level that fits in the requested point budget
+    def __init__(
+        self, channels: int, factor: int = 8, chunk_size: int = 1 << 16
+    ) -> None:
+        if factor < 2:
+            raise ValueError("Invalid level of detail factor")
+        self.__channels = channels
+        self.__factor = factor
+        self.__chunk_size = chunk_size
+        self.__levels = [ChunkedRows(1 + channels, chunk_size)]
+        self.__spill_directory: tempfile.TemporaryDirectory | None = None
+        self.__spill_path: Path | None = None
+        self.__x_last = -np.inf
+
+    def __len__(self) -> int:
+        return len(self.__levels[0])
+
+    @property
+    def level_count(self) -> int:
+        return len(self.__levels)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(level.memory_bytes for level in self.__levels)
+
+    @property
+    def disk_bytes(self) -> int:
+        return sum(level.disk_bytes for level in self.__levels)
+
+    @property
+    def spill_to_disk(self) -> bool:
+        return self.__spill_path is not None
+
+    # full chunks move to a temporary directory, removed with the store
+    def set_spill_to_disk(self, enabled: bool) -> None:
+        if enabled and self.__spill_directory is None:
+            self.__spill_directory = tempfile.TemporaryDirectory(prefix="mech423_lod_")
+        self.__spill_path = (
+            Path(self.__spill_directory.name) if enabled else None  # type: ignore
+        )
+        for level in self.__levels:
+            level.spill_to(self.__spill_path)
+
+    # the newest x, -inf while empty
+    @property
+    def x_last(self) -> float:
+        return self.__x_last
+
+    def clear(self) -> None:
+        for level in self.__levels:
+            level.clear()
+        del self.__levels[1:]
+        self.__x_last = -np.inf
+        if self.__spill_directory is not None:
+            self.__spill_directory.cleanup()
+            self.__spill_directory = None
+            self.set_spill_to_disk(self.spill_to_disk)
+
+    def x_at(self, index: int) -> float:
+        return float(self.__levels[0].rows(index, index + 1)[0, 0])
+
+    def append(self, x: np.ndarray, *values: np.ndarray) -> None:
+        if len(values) != self.__channels:
+            raise ValueError(f"Expected {self.__channels} channels")
+        if len(x) == 0:
+            return
+        # queries search x, it must not decrease
+        if x[0] < self.__x_last:
+            raise ValueError(f"x {x[0]} is before the last stored x {self.__x_last}")
+        self.__levels[0].append(np.column_stack((x, *values)))
+        self.__x_last = float(x[-1])
+
+        level = 1
+        while level <= len(self.__levels):
+            lower = self.__levels[level - 1]
+            if level == len(self.__levels):
+                if len(lower) < self.__factor:
+                    break
+                # coarser levels fill more slowly and get smaller chunks
+                self.__levels.append(
+                    ChunkedRows(
+                        2 + 2 * self.__channels,
+                        max(self.__chunk_size // self.__factor**level, 1024),
+                    )
+                )
+                self.__levels[-1].spill_to(self.__spill_path)
+            upper = self.__levels[level]
+            groups = len(lower) // self.__factor
+            if groups == len(upper):
+                break
+            upper.append(
+                self.__aggregate(
+                    level,
+                    lower.rows(len(upper) * self.__factor, groups * self.__factor),
+                )
+            )
+            level += 1
+
+    # at most about `max_points` points covering [x_start, x_stop] and their
+    # values, one row per channel, the minima and maxima of every bucket keep
+    # the envelope of the data
+    def query(
+        self, x_start: float, x_stop: float, max_points: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        for level, rows in enumerate(self.__levels):
+            start = max(rows.search(x_start) - 1, 0)
+            stop = rows.search(x_stop, "right")
+            points_per_row = 1 if level == 0 else 2
+            if (stop - start) * points_per_row <= max_points:
+                break
+
+        parts: list[tuple[np.ndarray, np.ndarray]] = []
+        self.__collect(level, start, x_stop, parts)
+        if not parts:
+            return np.empty(0), np.empty((self.__channels, 0))
+        return (
+            np.concatenate([x for x, _ in parts]),
+            np.ascontiguousarray(np.concatenate([values for _, values in parts]).T),
+        )
+
+    def __collect(self, level: int, start: int, x_stop: float, parts: list) -> None:
+        rows = self.__levels[level]
+        stop = rows.search(x_stop, "right")
+        if stop > start:
+            parts.append(self.__points(level, rows.rows(start, stop)))
+        # rows not yet gathered into this level come from the level below
+        if level > 0 and stop == len(rows):
+            self.__collect(level - 1, len(rows) * self.__factor, x_stop, parts)
+
+    def __points(self, level: int, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if level == 0:
+            return rows[:, 0], rows[:, 1:]
+        channels = self.__channels
+        x = rows[:, :2].ravel()
+        values = np.stack(
+            (rows[:, 2 : 2 + channels], rows[:, 2 + channels :]), axis=1
+        ).reshape(-1, channels)
+        return x, values
+
+    def __aggregate(self, level: int, rows: np.ndarray) -> np.ndarray:
+        channels = self.__channels
+        groups = rows.reshape(-1, self.__factor, rows.shape[1])
+        if level == 1:
+            x_last = groups[:, -1, 0]
+            minima = groups[:, :, 1:].min(axis=1)
+            maxima = groups[:, :, 1:].max(axis=1)
+        else:
+            x_last = groups[:, -1, 1]
+            minima = groups[:, :, 2 : 2 + channels].min(axis=1)
+            maxima = groups[:, :, 2 + channels :].max(axis=1)
+        return np.column_stack((groups[:, 0, 0], x_last, minima, maxima))
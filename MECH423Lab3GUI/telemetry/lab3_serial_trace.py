@@ -0,0 +1,126 @@
+import argparse
+import struct
+import threading
+from collections.abc import Iterator
+from enum import IntEnum
+from pathlib import Path
+
+SERIAL_TRACE_FILE_MAGIC = b"L3ST"
+SERIAL_TRACE_FILE_VERSION = 2
+SERIAL_TRACE_FILE_HEADER = struct.Struct("<4sH10x")
+# timestamp, direction and length, followed by the raw bytes, a single read
+# can exceed 64 KiB
+SERIAL_TRACE_RECORD_HEADER = struct.Struct("<qBxI")
+# version 1 stored a 16-bit length
+SERIAL_TRACE_RECORD_HEADERS = {
+    1: struct.Struct("<qBxH"),
+    SERIAL_TRACE_FILE_VERSION: SERIAL_TRACE_RECORD_HEADER,
+}
+
+
+class SerialTraceDirection(IntEnum):
+    RX = 0
+    TX = 1
+
+
+class SerialTraceWriter:
+    def __init__(self, path: str | Path, batch_size: int = 1 << 16) -> None:
+        self.__path = Path(path)
+        self.__file = open(self.__path, "wb")
+        self.__file.write(
+            SERIAL_TRACE_FILE_HEADER.pack(
+                SERIAL_TRACE_FILE_MAGIC, SERIAL_TRACE_FILE_VERSION
+            )
+        )
+
+        self.__lock = threading.Lock()
+        self.__batch_size = batch_size
+        self.__buffer = bytearray()
+        self.__record_count = 0
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    @property
+    def record_count(self) -> int:
+        return self.__record_count
+
+    def write(
+        self,
+        direction: SerialTraceDirection,
+        data: bytes | bytearray | memoryview,
+        timestamp_ns: int,
+    ) -> None:
+        with self.__lock:
+            # raw bytes only, nothing is formatted until the trace is read
+            self.__buffer += SERIAL_TRACE_RECORD_HEADER.pack(
+                timestamp_ns, direction, len(data)
+            )
+            self.__buffer += data
+            self.__record_count += 1
+            if len(self.__buffer) >= self.__batch_size:
+                self.__flush()
+
+    def flush(self) -> None:
+        with self.__lock:
+            self.__flush()
+            self.__file.flush()
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__file.closed:
+                return
+            self.__flush()
+            self.__file.close()
+
+    def __enter__(self) -> "SerialTraceWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __flush(self) -> None:
+        if self.__file.closed:
+            return
+        self.__file.write(self.__buffer)
+        self.__buffer.clear()
+
+
+def read_serial_trace(
+    path: str | Path,
+) -> Iterator[tuple[int, SerialTraceDirection, bytes]]:
+    data = Path(path).read_bytes()
+    if len(data) < SERIAL_TRACE_FILE_HEADER.size:
+        raise ValueError(f"{path} is not a serial trace")
+    magic, version = SERIAL_TRACE_FILE_HEADER.unpack_from(data)
+    if magic != SERIAL_TRACE_FILE_MAGIC:
+        raise ValueError(f"{path} is not a serial trace")
+    record_header = SERIAL_TRACE_RECORD_HEADERS.get(version)
+    if record_header is None:
+        raise ValueError(f"Unsupported serial trace version {version}")
+
+    position = SERIAL_TRACE_FILE_HEADER.size
+    # a truncated last record, e.g. after a crash, is ignored
+    while position + record_header.size <= len(data):
+        timestamp_ns, direction, length = record_header.unpack_from(data, position)
+        position += record_header.size
+        if position + length > len(data):
+            return
+        yield timestamp_ns, SerialTraceDirection(direction), data[
+            position : position + length
+        ]
+        position += length
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print a binary serial trace")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    start_ns = None
+    for timestamp_ns, direction, data in read_serial_trace(args.path):
+        start_ns = timestamp_ns if start_ns is None else start_ns
+        print(
+            f"{(timestamp_ns - start_ns) / 1e6:12.3f} ms {direction.name} {data.hex(' ').upper()}"
+        )
@@ -0,0 +1,341 @@
+import os
+import struct
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+from loguru import logger
+
+from .lab3_encoder_dsp import EncoderUnwrapper
+
+SHARED_TELEMETRY_MAGIC = b"L3SM"
+SHARED_TELEMETRY_VERSION = 2
+# magic, version, record size and capacity, followed by the 8-byte words
+# below, records start on their own cache line
+SHARED_TELEMETRY_HEADER = struct.Struct("<4sHHQ")
+SHARED_TELEMETRY_HEADER_SIZE = 64
+SHARED_TELEMETRY_WORDS = 4
+SHARED_TELEMETRY_SEQUENCE = 0  # odd while the publisher writes
+SHARED_TELEMETRY_WRITTEN = 1  # records written in total
+SHARED_TELEMETRY_STATE = 2
+SHARED_TELEMETRY_PID = 3  # of the publishing process
+
+SHARED_TELEMETRY_CLOSED = 0
+SHARED_TELEMETRY_OPEN = 1
+
+# timestamps are time.monotonic_ns() of the publishing process, positions are
+# unwrapped encoder counts
+SHARED_TELEMETRY_DTYPE = np.dtype(
+    {
+        "names": ["timestamp_ns", "position", "count"],
+        "formats": ["<i8", "<i8", "<u2"],
+        "offsets": [0, 8, 16],
+        "itemsize": 24,
+    }
+)
+
+
+def shared_telemetry_name(device_index: int) -> str:
+    return f"mech423_lab3_device{device_index}"
+
+
+# a process that is still running, or whose pid is taken by another one
+def _pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    if os.name == "nt":
+        # os.kill would terminate the process on windows
+        import ctypes
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(0x100000, False, pid)  # SYNCHRONIZE
+        if not handle:
+            # access denied means the process exists
+            return ctypes.get_last_error() == 5
+        try:
+            return kernel32.WaitForSingleObject(handle, 0) == 0x102  # WAIT_TIMEOUT
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# the resource tracker would unlink another process's memory when this
+# process exits
+def _untrack(memory: shared_memory.SharedMemory) -> None:
+    if os.name == "posix":
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(memory._name, "shared_memory")  # type: ignore
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    memory = shared_memory.SharedMemory(name)
+    _untrack(memory)
+    return memory
+
+
+def _map(memory: shared_memory.SharedMemory) -> tuple[int, memoryview, np.ndarray]:
+    magic, version, record_size, capacity = SHARED_TELEMETRY_HEADER.unpack_from(
+        memory.buf
+    )
+    if magic != SHARED_TELEMETRY_MAGIC or version != SHARED_TELEMETRY_VERSION:
+        raise ValueError(f"{memory.name} is not shared telemetry")
+    if record_size != SHARED_TELEMETRY_DTYPE.itemsize:
+        raise ValueError(f"Unsupported record size {record_size}")
+    # a memoryview rather than an array, numpy scalar access costs
+    # microseconds per word
+    words = memory.buf[
+        SHARED_TELEMETRY_HEADER.size : SHARED_TELEMETRY_HEADER.size
+        + SHARED_TELEMETRY_WORDS * 8
+    ].cast("Q")
+    records = np.ndarray(
+        capacity, SHARED_TELEMETRY_DTYPE, memory.buf, SHARED_TELEMETRY_HEADER_SIZE
+    )
+    return capacity, words, records
+
+
+# decoded encoder samples in a shared memory ring, other local processes map
+# it with SharedTelemetryReader, a seqlock around every batch lets them copy
+# consistent records without ever blocking the publisher
+class SharedTelemetryPublisher:
+    def __init__(self, name: str, capacity: int = 1 << 20) -> None:
+        if capacity <= 0:
+            raise ValueError("Invalid shared telemetry capacity")
+        size = SHARED_TELEMETRY_HEADER_SIZE + capacity * SHARED_TELEMETRY_DTYPE.itemsize
+        try:
+            self.__memory = shared_memory.SharedMemory(name, True, size)
+        except FileExistsError:
+            self.__unlink_stale(name)
+            self.__memory = shared_memory.SharedMemory(name, True, size)
+
+        SHARED_TELEMETRY_HEADER.pack_into(
+            self.__memory.buf,
+            0,
+            SHARED_TELEMETRY_MAGIC,
+            SHARED_TELEMETRY_VERSION,
+            SHARED_TELEMETRY_DTYPE.itemsize,
+            capacity,
+        )
+        self.__capacity, self.__words, self.__records = _map(self.__memory)
+        self.__words[SHARED_TELEMETRY_SEQUENCE] = 0
+        self.__words[SHARED_TELEMETRY_WRITTEN] = 0
+        self.__words[SHARED_TELEMETRY_STATE] = SHARED_TELEMETRY_OPEN
+        self.__words[SHARED_TELEMETRY_PID] = os.getpid()
+        # the only writer, so the count is kept here as well
+        self.__written = 0
+        self.__unwrapper = EncoderUnwrapper()
+
+    @property
+    def name(self) -> str:
+        return self.__memory.name
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    @property
+    def record_count(self) -> int:
+        return self.__written
+
+    # a segment is only taken over once its publisher closed it or exited,
+    # readers keep following a running one
+    @staticmethod
+    def __unlink_stale(name: str) -> None:
+        # tracked until it is unlinked here
+        stale = shared_memory.SharedMemory(name)
+        try:
+            try:
+                _, words, records = _map(stale)
+            except ValueError as e:
+                raise FileExistsError(f"{name} exists: {e}")
+            state = words[SHARED_TELEMETRY_STATE]
+            pid = words[SHARED_TELEMETRY_PID]
+            # the views must go before the mapping
+            del records
+            words.release()
+            if state != SHARED_TELEMETRY_CLOSED and _pid_alive(pid):
+                raise FileExistsError(f"{name} is published by running process {pid}")
+            logger.warning(f"replacing shared memory {name} left by process {pid}")
+            stale.unlink()
+        except FileExistsError:
+            _untrack(stale)
+            raise
+        finally:
+            stale.close()
+
+    def publish(self, counts: np.ndarray, timestamps_ns: np.ndarray) -> None:
+        total = len(counts)
+        if total == 0:
+            return
+        positions = self.__unwrapper.unwrap(counts)
+        # only the newest records fit if a batch is larger than the ring
+        size = min(total, self.__capacity)
+        words = self.__words
+        written = self.__written
+        start = (written + total - size) % self.__capacity
+        head = min(size, self.__capacity - start)
+
+        offset = total - size
+        words[SHARED_TELEMETRY_SEQUENCE] += 1
+        self.__fill(
+            start, slice(offset, offset + head), counts, positions, timestamps_ns
+        )
+        if head < size:
+            self.__fill(
+                0, slice(offset + head, total), counts, positions, timestamps_ns
+            )
+        self.__written = words[SHARED_TELEMETRY_WRITTEN] = written + total
+        words[SHARED_TELEMETRY_SEQUENCE] += 1
+
+    def __fill(
+        self,
+        slot: int,
+        source: slice,
+        counts: np.ndarray,
+        positions: np.ndarray,
+        timestamps_ns: np.ndarray,
+    ) -> None:
+        records = self.__records[slot : slot + source.stop - source.start]
+        records["timestamp_ns"] = timestamps_ns[source]
+        records["position"] = positions[source]
+        records["count"] = counts[source]
+
+    def close(self) -> None:
+        if self.__records is None:
+            return
+        self.__words[SHARED_TELEMETRY_STATE] = SHARED_TELEMETRY_CLOSED
+        # the views must go before the mapping, readers keep their own
+        self.__words = self.__records = None
+        self.__memory.close()
+        try:
+            self.__memory.unlink()
+        except FileNotFoundError:
+            # already replaced by another publisher
+            pass
+
+    def __enter__(self) -> "SharedTelemetryPublisher":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class SharedTelemetryReader:
+    def __init__(self, name: str) -> None:
+        self.__memory = _attach(name)
+        self.__capacity, self.__words, self.__records = _map(self.__memory)
+        # reading starts with the records published from now on
+        self.__read_index = self.record_count
+        self.__dropped_count = 0
+
+    @property
+    def name(self) -> str:
+        return self.__memory.name
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    @property
+    def is_open(self) -> bool:
+        return self.__words[SHARED_TELEMETRY_STATE] == SHARED_TELEMETRY_OPEN
+
+    @property
+    def record_count(self) -> int:
+        return self.__words[SHARED_TELEMETRY_WRITTEN]
+
+    # records a slow reader missed because the ring had moved on
+    @property
+    def dropped_count(self) -> int:
+        return self.__dropped_count
+
+    # the ring itself without copying, record i is at i % capacity and stays
+    # valid while fewer than capacity records have been written after it,
+    # views of it have to be dropped before close
+    @property
+    def records(self) -> np.ndarray:
+        return self.__records
+
+    # records published since the last read, oldest first
+    def read(self, max_records: int | None = None) -> np.ndarray:
+        stop = None if max_records is None else self.__read_index + max_records
+        records, start = self.__copy(self.__read_index, stop)
+        self.__dropped_count += start - self.__read_index
+        self.__read_index = start + len(records)
+        return records
+
+    # the newest records, regardless of what was read
+    def latest(self, count: int) -> np.ndarray:
+        records, _ = self.__copy(self.record_count - count, None)
+        return records
+
+    def close(self) -> None:
+        if self.__records is None:
+            return
+        self.__words = self.__records = None
+        self.__memory.close()
+
+    def __enter__(self) -> "SharedTelemetryReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    # copies records [start, stop) that are still in the ring, retried until
+    # no batch was published in between
+    def __copy(self, start: int, stop: int | None) -> tuple[np.ndarray, int]:
+        words = self.__words
+        while True:
+            sequence = words[SHARED_TELEMETRY_SEQUENCE]
+            if sequence & 1:
+                continue
+            written = words[SHARED_TELEMETRY_WRITTEN]
+            first = max(start, written - self.__capacity, 0)
+            last = written if stop is None else max(min(stop, written), first)
+            slot = first % self.__capacity
+            head = min(last - first, self.__capacity - slot)
+            records = np.concatenate(
+                (
+                    self.__records[slot : slot + head],
+                    self.__records[: last - first - head],
+                )
+            )
+            if words[SHARED_TELEMETRY_SEQUENCE] == sequence:
+                return records, first
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Follow shared MECH423 telemetry")
+    parser.add_argument("name", nargs="?", default=shared_telemetry_name(1))
+    arguments = parser.parse_args()
+
+    try:
+        reader = SharedTelemetryReader(arguments.name)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    with reader:
+        print(f"following {reader.name}, {reader.capacity} records", flush=True)
+        try:
+            while reader.is_open:
+                time.sleep(1)
+                records = reader.read()
+                position = records["position"][-1] if len(records) else None
+                print(
+                    f"{len(records)} records/s, position {position}, dropped {reader.dropped_count}",
+                    flush=True,
+                )
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,190 @@
+import struct
+import threading
+import time
+from enum import IntEnum
+from pathlib import Path
+
+import numpy as np
+
+TELEMETRY_FILE_MAGIC = b"L3TR"
+TELEMETRY_FILE_VERSION = 1
+TELEMETRY_FILE_HEADER = struct.Struct("<4sHH8x")
+
+TELEMETRY_RECORD_DTYPE = np.dtype(
+    [
+        ("timestamp_ns", "<i8"),
+        ("kind", "u1"),
+        ("length", "u1"),
+        ("count", "<u2"),
+        ("payload", "u1", (20,)),
+    ]
+)
+TELEMETRY_PAYLOAD_SIZE = TELEMETRY_RECORD_DTYPE["payload"].shape[0]
+
+
+class TelemetryRecordKind(IntEnum):
+    MCU_PACKET = 0
+    SERIAL_PACKET = 1
+
+
+class TelemetryRecorder:
+    def __init__(self, path: str | Path, batch_size: int = 4096) -> None:
+        self.__path = Path(path)
+        self.__file = open(self.__path, "wb")
+        self.__file.write(
+            TELEMETRY_FILE_HEADER.pack(
+                TELEMETRY_FILE_MAGIC,
+                TELEMETRY_FILE_VERSION,
+                TELEMETRY_RECORD_DTYPE.itemsize,
+            )
+        )
+
+        self.__lock = threading.Lock()
+        self.__records = np.zeros(batch_size, TELEMETRY_RECORD_DTYPE)
+        self.__size = 0
+        self.__record_count = 0
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    @property
+    def record_count(self) -> int:
+        return self.__record_count + self.__size
+
+    def record_mcu_packets(self, counts: np.ndarray, timestamps_ns: np.ndarray):
+        with self.__lock:
+            start = 0
+            while start < len(counts):
+                stop = min(len(counts), start + len(self.__records) - self.__size)
+                records = self.__records[self.__size : self.__size + stop - start]
+                records["timestamp_ns"] = timestamps_ns[start:stop]
+                records["kind"] = TelemetryRecordKind.MCU_PACKET
+                records["length"] = 2
+                records["count"] = counts[start:stop]
+                self.__size += stop - start
+                start = stop
+                if self.__size == len(self.__records):
+                    self.__flush()
+
+    def record_serial_packet(self, frame: bytes, timestamp_ns: int | None = None):
+        if len(frame) > TELEMETRY_PAYLOAD_SIZE:
+            raise ValueError("Serial packet too long to record")
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+
+        with self.__lock:
+            record = self.__records[self.__size]
+            record["timestamp_ns"] = timestamp_ns
+            record["kind"] = TelemetryRecordKind.SERIAL_PACKET
+            record["length"] = len(frame)
+            record["count"] = 0
+            record["payload"] = 0
+            record["payload"][: len(frame)] = np.frombuffer(frame, np.uint8)
+            self.__size += 1
+            if self.__size == len(self.__records):
+                self.__flush()
+
+    def flush(self) -> None:
+        with self.__lock:
+            self.__flush()
+            self.__file.flush()
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__file.closed:
+                return
+            self.__flush()
+            self.__file.close()
+
+    def __enter__(self) -> "TelemetryRecorder":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __flush(self) -> None:
+        if self.__size == 0:
+            return
+        self.__file.write(self.__records[: self.__size].tobytes())
+        self.__record_count += self.__size
+        self.__size = 0
+
+
+class TelemetryReader:
+    def __init__(self, path: str | Path) -> None:
+        self.__path = Path(path)
+
+        with open(self.__path, "rb") as file:
+            header = file.read(TELEMETRY_FILE_HEADER.size)
+        if len(header) != TELEMETRY_FILE_HEADER.size:
+            raise ValueError("Invalid telemetry file header")
+        magic, version, record_size = TELEMETRY_FILE_HEADER.unpack(header)
+        if magic != TELEMETRY_FILE_MAGIC:
+            raise ValueError("Invalid telemetry file magic")
+        if version != TELEMETRY_FILE_VERSION:
+            raise ValueError(f"Unsupported telemetry file version {version}")
+        if record_size != TELEMETRY_RECORD_DTYPE.itemsize:
+            raise ValueError("Invalid telemetry record size")
+
+        # a trailing partial record from an interrupted write is ignored
+        record_count = (
+            self.__path.stat().st_size - TELEMETRY_FILE_HEADER.size
+        ) // record_size
+        if record_count > 0:
+            self.__records = np.memmap(
+                self.__path,
+                TELEMETRY_RECORD_DTYPE,
+                mode="r",
+                offset=TELEMETRY_FILE_HEADER.size,
+                shape=(record_count,),
+            )
+        else:
+            self.__records = np.zeros(0, TELEMETRY_RECORD_DTYPE)
+
+        self.__mcu_packet_mask: np.ndarray | None = None
+        self.__serial_packet_mask: np.ndarray | None = None
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    @property
+    def records(self) -> np.ndarray:
+        return self.__records
+
+    def __len__(self) -> int:
+        return len(self.__records)
+
+    @property
+    def mcu_packet_mask(self) -> np.ndarray:
+        if self.__mcu_packet_mask is None:
+            self.__mcu_packet_mask = (
+                self.__records["kind"] == TelemetryRecordKind.MCU_PACKET
+            )
+        return self.__mcu_packet_mask
+
+    @property
+    def serial_packet_mask(self) -> np.ndarray:
+        if self.__serial_packet_mask is None:
+            self.__serial_packet_mask = (
+                self.__records["kind"] == TelemetryRecordKind.SERIAL_PACKET
+            )
+        return self.__serial_packet_mask
+
+    @property
+    def mcu_timestamps_ns(self) -> np.ndarray:
+        return self.__records["timestamp_ns"][self.mcu_packet_mask]
+
+    @property
+    def mcu_counts(self) -> np.ndarray:
+        return self.__records["count"][self.mcu_packet_mask]
+
+    @property
+    def serial_timestamps_ns(self) -> np.ndarray:
+        return self.__records["timestamp_ns"][self.serial_packet_mask]
+
+    @property
+    def serial_packets(self) -> list[bytes]:
+        records = self.__records[self.serial_packet_mask]
+        return [record["payload"][: record["length"]].tobytes() for record in records]
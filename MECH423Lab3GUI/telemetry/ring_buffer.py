@@ -0,0 +1,73 @@
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, capacity: int, dtype: np.dtype | type = np.float64) -> None:
+        if capacity <= 0:
+            raise ValueError("Invalid ring buffer capacity")
+
+        # every sample is stored twice, capacity apart, so that the newest
+        # `size` samples are always a contiguous slice of the storage
+        self.__data = np.zeros(2 * capacity, dtype)
+        self.__capacity = capacity
+        self.__head = 0
+        self.__size = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.__data.dtype
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def clear(self) -> None:
+        self.__head = 0
+        self.__size = 0
+
+    def extend(self, values: np.ndarray) -> None:
+        values = np.asarray(values, self.__data.dtype)[-self.__capacity :]
+        count = len(values)
+        if count == 0:
+            return
+
+        capacity, head = self.__capacity, self.__head
+        first = min(count, capacity - head)
+        self.__data[head : head + first] = values[:first]
+        self.__data[head + capacity : head + capacity + first] = values[:first]
+        rest = count - first
+        self.__data[:rest] = values[first:]
+        self.__data[capacity : capacity + rest] = values[first:]
+
+        self.__head = (head + count) % capacity
+        self.__size = min(self.__size + count, capacity)
+
+    def append(self, value) -> None:
+        capacity, head = self.__capacity, self.__head
+        self.__data[head] = self.__data[head + capacity] = value
+        self.__head = (head + 1) % capacity
+        self.__size = min(self.__size + 1, capacity)
+
+    def first(self):
+        if self.__size == 0:
+            raise IndexError("Ring buffer is empty")
+        return self.__data[(self.__head - self.__size) % self.__capacity]
+
+    def last(self):
+        if self.__size == 0:
+            raise IndexError("Ring buffer is empty")
+        return self.__data[self.__head - 1 + self.__capacity]
+
+    def view(self) -> np.ndarray:
+        start = (self.__head - self.__size) % self.__capacity
+        view = self.__data[start : start + self.__size]
+        view.flags.writeable = False
+        return view
+
+    def resized(self, capacity: int) -> "RingBuffer":
+        buffer = RingBuffer(capacity, self.__data.dtype)
+        buffer.extend(self.view())
+        return buffer
@@ -0,0 +1,36 @@
+from collections.abc import Callable
+
+from PySide6.QtCore import QTimer, Signal
+from PySide6.QtGui import QPaintEvent
+from PySide6.QtWidgets import QVBoxLayout, QWidget
+
+
+class LazyWidget(QWidget):
+    signal_created = Signal(QWidget)
+
+    def __init__(self, factory: Callable[[], QWidget], *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.__factory = factory
+        self.__widget: QWidget | None = None
+
+        self.setLayout(QVBoxLayout())
+        self.layout().setContentsMargins(0, 0, 0, 0)
+
+    @property
+    def widget(self) -> QWidget | None:
+        return self.__widget
+
+    def ensure_created(self) -> QWidget:
+        if self.__widget is None:
+            self.__widget = self.__factory()
+            self.layout().addWidget(self.__widget)
+            self.signal_created.emit(self.__widget)
+        return self.__widget
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        super().paintEvent(event)
+        # built once the window around it has been painted, so it appears
+        # before the expensive part is loaded
+        if self.__widget is None:
+            QTimer.singleShot(0, self.ensure_created)
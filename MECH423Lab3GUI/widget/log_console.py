@@ -0,0 +1,150 @@
+import threading
+from collections import deque
+
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import (
+    QComboBox,
+    QHBoxLayout,
+    QLabel,
+    QPlainTextEdit,
+    QPushButton,
+    QVBoxLayout,
+    QWidget,
+)
+
+LOG_LEVELS = {
+    "TRACE": 5,
+    "DEBUG": 10,
+    "INFO": 20,
+    "SUCCESS": 25,
+    "WARNING": 30,
+    "ERROR": 40,
+    "CRITICAL": 50,
+}
+
+
+class LogConsole(QWidget):
+    # lines written between two frames, anything beyond is dropped
+    PENDING_CAPACITY = 10_000
+
+    def __init__(
+        self, *args, max_block_count: int = 5000, frame_rate: float = 30, **kwargs
+    ) -> None:
+        super().__init__(*args, **kwargs)
+
+        # written from any thread, drained by the GUI thread on the frame timer
+        self.__lock = threading.Lock()
+        self.__pending: deque[tuple[int, str]] = deque()
+        self.__partial_line = ""
+        self.__drop_count = 0
+        # lines kept for refiltering, as many as the view can show
+        self.__history: deque[tuple[int, str]] = deque(maxlen=max_block_count)
+        self.__level = LOG_LEVELS["INFO"]
+
+        self.__text_edit = QPlainTextEdit()
+        self.__text_edit.setReadOnly(True)
+        self.__text_edit.setUndoRedoEnabled(False)
+        self.__text_edit.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.__text_edit.setMaximumBlockCount(max_block_count)
+
+        self.__level_combobox = QComboBox()
+        for name, level in LOG_LEVELS.items():
+            self.__level_combobox.addItem(name, level)
+        self.__level_combobox.setCurrentIndex(
+            self.__level_combobox.findData(self.__level)
+        )
+        self.__level_combobox.currentIndexChanged.connect(self.__slot_on_level_changed)
+
+        self.__drop_label = QLabel()
+        self.__clear_button = QPushButton("Clear")
+        self.__clear_button.clicked.connect(self.clear)
+
+        toolbar_layout = QHBoxLayout()
+        toolbar_layout.addWidget(self.__level_combobox)
+        toolbar_layout.addWidget(self.__drop_label)
+        toolbar_layout.addStretch()
+        toolbar_layout.addWidget(self.__clear_button)
+
+        self.setLayout(QVBoxLayout())
+        self.layout().addLayout(toolbar_layout)  # type: ignore
+        self.layout().addWidget(self.__text_edit)
+
+        self.__frame_timer = QTimer(self)
+        self.__frame_timer.timeout.connect(self.__slot_on_frame_timer_timeout)
+        self.__frame_timer.start(max(1, int(1000 / frame_rate)))
+        self.__update_drop_label()
+
+    @property
+    def drop_count(self) -> int:
+        return self.__drop_count
+
+    @property
+    def level(self) -> int:
+        return self.__level
+
+    def set_level(self, level: int) -> None:
+        self.__level_combobox.setCurrentIndex(self.__level_combobox.findData(level))
+
+    # file-like, for redirected stdout/stderr, unleveled text is always shown
+    def write(self, text: str) -> None:
+        with self.__lock:
+            lines = (self.__partial_line + text).split("\n")
+            self.__partial_line = lines.pop()
+            for line in lines:
+                self.__append(LOG_LEVELS["CRITICAL"], line)
+
+    def flush(self) -> None:
+        pass
+
+    # loguru sink
+    def sink(self, message) -> None:
+        level = message.record["level"].no
+        with self.__lock:
+            for line in str(message).rstrip("\n").split("\n"):
+                self.__append(level, line)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__pending.clear()
+            self.__drop_count = 0
+        self.__history.clear()
+        self.__text_edit.clear()
+        self.__update_drop_label()
+
+    def __append(self, level: int, line: str) -> None:
+        if len(self.__pending) >= self.PENDING_CAPACITY:
+            self.__pending.popleft()
+            self.__drop_count += 1
+        self.__pending.append((level, line))
+
+    def __slot_on_frame_timer_timeout(self):
+        with self.__lock:
+            if not self.__pending:
+                return
+            pending, self.__pending = self.__pending, deque()
+            drop_count = self.__drop_count
+
+        self.__history.extend(pending)
+        lines = [line for level, line in pending if level >= self.__level]
+        if lines:
+            # only the newest lines survive the block limit anyway
+            self.__append_lines(lines[-self.__text_edit.maximumBlockCount() :])
+        self.__update_drop_label(drop_count)
+
+    def __slot_on_level_changed(self, index: int):
+        self.__level = self.__level_combobox.itemData(index)
+        self.__text_edit.clear()
+        lines = [line for level, line in self.__history if level >= self.__level]
+        if lines:
+            self.__append_lines(lines)
+
+    def __append_lines(self, lines: list[str]) -> None:
+        scroll_bar = self.__text_edit.verticalScrollBar()
+        follow = scroll_bar.value() == scroll_bar.maximum()
+        # a single append per frame keeps the layout work bounded
+        self.__text_edit.appendPlainText("\n".join(lines))
+        if follow:
+            scroll_bar.setValue(scroll_bar.maximum())
+
+    def __update_drop_label(self, drop_count: int = 0) -> None:
+        self.__drop_label.setText(f"Dropped: {drop_count}")
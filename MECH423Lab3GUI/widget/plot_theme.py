@@ -0,0 +1,15 @@
+from functools import cache
+from types import ModuleType
+
+
+# pyqtgraph takes longer to import than the rest of the window, it is only
+# loaded once the first plot is built, matching the system light or dark theme
+@cache
+def load_pyqtgraph() -> ModuleType:
+    import darkdetect
+    import pyqtgraph
+
+    if darkdetect.isLight():
+        pyqtgraph.setConfigOption("background", "w")
+        pyqtgraph.setConfigOption("foreground", "k")
+    return pyqtgraph
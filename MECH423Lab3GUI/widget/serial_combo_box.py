@@ -1,15 +1,55 @@
-from PySide6.QtSerialPort import QSerialPortInfo
+from PySide6.QtCore import Qt
 from PySide6.QtWidgets import QComboBox
 
+from ..worker.lab3_port_discovery import (
+    PortDiscovery,
+    SerialPortDescription,
+    shared_port_discovery,
+)
+
 
 class SerialComboBox(QComboBox):
-    def __init__(self, *args, **kwargs) -> None:
+    def __init__(self, *args, discovery: PortDiscovery | None = None, **kwargs) -> None:
         super().__init__(*args, **kwargs)
-        for port in QSerialPortInfo.availablePorts():
-            self.addItem(port.portName())
+        # editable so that e.g. a simulator pty path can be typed in
+        self.setEditable(True)
+
+        # ports are discovered in the background and added or removed one by
+        # one, so the list never blocks and the selection is kept
+        self.__discovery = discovery or shared_port_discovery()
+        self.__discovery.signal_port_added.connect(self.__slot_on_port_added)
+        self.__discovery.signal_port_removed.connect(self.__slot_on_port_removed)
+        for port in self.__discovery.ports:
+            self.__slot_on_port_added(port)
+
+    @property
+    def discovery(self) -> PortDiscovery:
+        return self.__discovery
+
+    # metadata of the selected port, if it was discovered
+    def current_port(self) -> SerialPortDescription | None:
+        return self.__discovery.port(self.currentText())
 
     def showPopup(self) -> None:
         super().showPopup()
-        self.clear()
-        for port in QSerialPortInfo.availablePorts():
-            self.addItem(port.portName())
+        self.__discovery.refresh()
+
+    def __slot_on_port_added(self, port: SerialPortDescription):
+        index = self.findText(port.port_name, Qt.MatchFlag.MatchExactly)
+        if index < 0:
+            # kept in name order
+            index = sum(self.itemText(i) < port.port_name for i in range(self.count()))
+            current_text = self.currentText()
+            self.insertItem(index, port.port_name)
+            if current_text:
+                self.setCurrentText(current_text)
+        self.setItemData(index, port.summary, Qt.ItemDataRole.ToolTipRole)
+
+    def __slot_on_port_removed(self, port: SerialPortDescription):
+        index = self.findText(port.port_name, Qt.MatchFlag.MatchExactly)
+        if index < 0:
+            return
+        current_text = self.currentText()
+        self.removeItem(index)
+        # a typed or selected port stays in the edit field
+        self.setCurrentText(current_text)
@@ -0,0 +1,418 @@
+from loguru import logger
+from PySide6.QtCore import Qt, QTimer, Signal
+from PySide6.QtWidgets import (
+    QCheckBox,
+    QComboBox,
+    QDoubleSpinBox,
+    QFileDialog,
+    QHBoxLayout,
+    QLabel,
+    QMessageBox,
+    QPushButton,
+    QSpinBox,
+    QSplitter,
+    QVBoxLayout,
+    QWidget,
+)
+
+from ..function_block.lab3_2axis_control_widget import TwoAxisControlWidget
+from ..function_block.lab3_dc_motor_widget import DCMotorWidget
+from ..function_block.lab3_stepper_motor_widget import StepperMotorWidget
+from ..serial_protocol.lab3_mcu_frame_decoder import MCUPacketBatch
+from ..serial_protocol.lab3_serial_protocol import SerialFraming
+from ..telemetry.lab3_shared_telemetry import shared_telemetry_name
+from ..widget.serial_combo_box import SerialComboBox
+from ..worker.lab3_port_discovery import SerialPortDescription
+from ..worker.lab3_serial_hub import SerialDevice, SerialHub
+
+SERIAL_BAUD_RATES = (9600, 19200, 38400, 57600, 115200, 230400, 460800, 921600, 1000000)
+FLOW_CONTROL_WINDOWS = (8, 16, 32, 64)
+# reconnect attempts while the port is listed, e.g. if it came back between
+# two scans or was not ready on the first try
+RECONNECT_INTERVAL_MS = 1000
+
+
+class Lab3DeviceWidget(QWidget):
+    signal_start_recording = Signal(str)
+    signal_stop_recording = Signal()
+    signal_start_publishing = Signal(str)
+    signal_stop_publishing = Signal()
+    signal_start_trace = Signal(str)
+    signal_stop_trace = Signal()
+    signal_log_sample_interval = Signal(int)
+    signal_replay_open = Signal(str, float)
+    signal_replay_close = Signal()
+
+    def __init__(self, hub: SerialHub, device: SerialDevice, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        # the device's workers live in its own thread
+        self.__hub = hub
+        self.__device = device
+        self.__serial_worker = device.serial_worker
+        self.signal_start_recording.connect(self.__serial_worker.slot_start_recording)
+        self.signal_stop_recording.connect(self.__serial_worker.slot_stop_recording)
+        self.signal_start_publishing.connect(self.__serial_worker.slot_start_publishing)
+        self.signal_stop_publishing.connect(self.__serial_worker.slot_stop_publishing)
+        self.signal_start_trace.connect(self.__serial_worker.slot_start_trace)
+        self.signal_stop_trace.connect(self.__serial_worker.slot_stop_trace)
+        self.signal_log_sample_interval.connect(
+            self.__serial_worker.slot_set_log_sample_interval
+        )
+        self.__serial_worker.signal_opened.connect(self.__slot_on_serial_opened)
+        self.__serial_worker.signal_recording_started.connect(
+            self.__slot_on_recording_started
+        )
+        self.__serial_worker.signal_trace_started.connect(self.__slot_on_trace_started)
+        self.__serial_worker.signal_publishing_started.connect(
+            self.__slot_on_publishing_started
+        )
+        self.__serial_worker.signal_connection_lost.connect(
+            self.__slot_on_connection_lost
+        )
+        self.__serial_worker.signal_framing_changed.connect(
+            self.__slot_on_framing_changed
+        )
+        self.__serial_worker.signal_packets_received.connect(
+            self.__slot_on_packets_received
+        )
+        self.__serial_worker.signal_tx_statistics.connect(self.__slot_on_tx_statistics)
+
+        self.__replay_worker = device.replay_worker
+        self.signal_replay_open.connect(self.__replay_worker.slot_open)
+        self.signal_replay_close.connect(self.__replay_worker.slot_close)
+        self.__replay_worker.signal_opened.connect(self.__slot_on_replay_opened)
+        self.__replay_worker.signal_finished.connect(self.__slot_on_replay_finished)
+        self.__replay_worker.signal_packets_received.connect(
+            self.__slot_on_packets_received
+        )
+
+        serial_port_layout = QHBoxLayout()
+        self.__serial_port_combobox = SerialComboBox()
+
+        self.__baud_rate_combobox = QComboBox()
+        for baud_rate in SERIAL_BAUD_RATES:
+            self.__baud_rate_combobox.addItem(f"{baud_rate} baud", baud_rate)
+
+        self.__framing_combobox = QComboBox()
+        self.__framing_combobox.addItem("Fixed 16-byte Frames", SerialFraming.FIXED)
+        self.__framing_combobox.addItem("Compact Frames", SerialFraming.COMPACT)
+
+        self.__flow_control_combobox = QComboBox()
+        self.__flow_control_combobox.addItem("No Flow Control", 0)
+        for window in FLOW_CONTROL_WINDOWS:
+            self.__flow_control_combobox.addItem(f"ACK Window: {window}", window)
+
+        self.__serial_connect_button = QPushButton("Connect")
+        self.__serial_connect_button.setCheckable(True)
+        self.__serial_connect_button.clicked.connect(self.__slot_on_serial_connect)
+
+        # an unplugged adapter is opened again once it is back, found by its
+        # serial number even under another port name
+        self.__auto_reconnect_checkbox = QCheckBox("Auto Reconnect")
+        self.__port_identity: tuple | None = None
+        self.__open_settings: tuple[int, int, int] | None = None
+        self.__reconnecting = False
+        self.__reconnect_timer = QTimer(self)
+        self.__reconnect_timer.setInterval(RECONNECT_INTERVAL_MS)
+        self.__reconnect_timer.timeout.connect(self.__slot_on_reconnect_timeout)
+        self.__serial_port_combobox.discovery.signal_port_added.connect(
+            self.__slot_on_port_added
+        )
+
+        self.__record_button = QPushButton("Record")
+        self.__record_button.setCheckable(True)
+        self.__record_button.clicked.connect(self.__slot_on_record)
+
+        # decoded samples for analysis in other processes, see
+        # SharedTelemetryReader
+        self.__share_button = QPushButton("Share")
+        self.__share_button.setCheckable(True)
+        self.__share_button.setToolTip(
+            f"Publish telemetry to shared memory {shared_telemetry_name(device.index)}"
+        )
+        self.__share_button.clicked.connect(self.__slot_on_share)
+
+        self.__trace_button = QPushButton("Trace")
+        self.__trace_button.setCheckable(True)
+        self.__trace_button.clicked.connect(self.__slot_on_trace)
+
+        # text logging of raw serial traffic, every n-th read and write
+        self.__log_sample_spinbox = QSpinBox()
+        self.__log_sample_spinbox.setRange(0, 10000)
+        self.__log_sample_spinbox.setValue(1)
+        self.__log_sample_spinbox.setPrefix("Serial Log: 1/")
+        self.__log_sample_spinbox.setSpecialValueText("Serial Log: Off")
+        self.__log_sample_spinbox.valueChanged.connect(self.signal_log_sample_interval)
+
+        serial_port_layout.addWidget(self.__serial_port_combobox)
+        serial_port_layout.addWidget(self.__baud_rate_combobox)
+        serial_port_layout.addWidget(self.__framing_combobox)
+        serial_port_layout.addWidget(self.__flow_control_combobox)
+        serial_port_layout.addWidget(self.__serial_connect_button)
+        serial_port_layout.addWidget(self.__auto_reconnect_checkbox)
+        serial_port_layout.addWidget(self.__record_button)
+        serial_port_layout.addWidget(self.__share_button)
+        serial_port_layout.addWidget(self.__trace_button)
+        serial_port_layout.addWidget(self.__log_sample_spinbox)
+
+        self.__replay_speed_spinbox = QDoubleSpinBox()
+        self.__replay_speed_spinbox.setRange(0, 1000)
+        self.__replay_speed_spinbox.setValue(1)
+        self.__replay_speed_spinbox.setPrefix("Replay Speed: ")
+        self.__replay_speed_spinbox.setSuffix("x")
+        self.__replay_speed_spinbox.setSpecialValueText("Replay Speed: Max")
+
+        self.__replay_button = QPushButton("Replay")
+        self.__replay_button.setCheckable(True)
+        self.__replay_button.clicked.connect(self.__slot_on_replay)
+
+        serial_port_layout.addWidget(self.__replay_speed_spinbox)
+        serial_port_layout.addWidget(self.__replay_button)
+
+        self.__dc_motor_widget = DCMotorWidget()
+        self.__dc_motor_widget.signal_serial_write.connect(
+            self.__serial_worker.slot_write
+        )
+        self.__stepper_motor_widget = StepperMotorWidget()
+        self.__stepper_motor_widget.signal_serial_write.connect(
+            self.__serial_worker.slot_write
+        )
+        self.__2_axis_control_widget = TwoAxisControlWidget()
+        self.__2_axis_control_widget.signal_serial_write.connect(
+            self.__serial_worker.slot_write
+        )
+        self.__2_axis_control_widget.signal_start_trajectory.connect(
+            self.__serial_worker.slot_start_trajectory
+        )
+        self.__2_axis_control_widget.signal_start_trajectory_stream.connect(
+            self.__serial_worker.slot_start_trajectory_stream
+        )
+        self.__2_axis_control_widget.signal_stop_trajectory.connect(
+            self.__serial_worker.slot_stop_trajectory
+        )
+        self.__serial_worker.signal_trajectory_progress.connect(
+            self.__2_axis_control_widget.update_trajectory_progress
+        )
+        self.__serial_worker.signal_trajectory_statistics.connect(
+            self.__2_axis_control_widget.update_trajectory_statistics
+        )
+
+        self.__splitter = QSplitter(Qt.Orientation.Horizontal)
+        self.__splitter.setDisabled(True)
+        self.__splitter.addWidget(self.__dc_motor_widget)
+        self.__splitter.addWidget(self.__stepper_motor_widget)
+        self.__splitter.addWidget(self.__2_axis_control_widget)
+
+        self.__tx_statistics_label = QLabel()
+
+        self.setLayout(QVBoxLayout())
+        self.layout().addLayout(serial_port_layout)  # type: ignore
+        self.layout().addWidget(self.__splitter)
+        self.layout().addWidget(self.__tx_statistics_label)
+
+    @property
+    def device(self) -> SerialDevice:
+        return self.__device
+
+    def __slot_on_serial_connect(self):
+        self.__serial_connect_button.setEnabled(False)
+        if self.__serial_connect_button.isChecked():
+            port_name = self.__serial_port_combobox.currentText()
+            owner = self.__hub.port_owner(port_name)
+            if owner is not None:
+                QMessageBox.critical(
+                    self, "Error", f"{port_name} is already open on {owner.name}"
+                )
+                self.__serial_connect_button.setChecked(False)
+                self.__serial_connect_button.setEnabled(True)
+                return
+            self.__open_settings = (
+                self.__baud_rate_combobox.currentData(),
+                self.__framing_combobox.currentData(),
+                self.__flow_control_combobox.currentData(),
+            )
+            self.__device.open(port_name, *self.__open_settings)
+        else:
+            self.__reconnecting = False
+            self.__reconnect_timer.stop()
+            self.__device.close()
+            self.__set_disconnected()
+
+    def __set_disconnected(self):
+        self.__splitter.setDisabled(True)
+        self.__serial_port_combobox.setEnabled(True)
+        self.__baud_rate_combobox.setEnabled(True)
+        self.__framing_combobox.setEnabled(True)
+        self.__flow_control_combobox.setEnabled(True)
+        self.__serial_connect_button.setChecked(False)
+        self.__serial_connect_button.setText("Connect")
+        self.__serial_connect_button.setEnabled(True)
+
+    def __slot_on_connection_lost(self):
+        if not self.__auto_reconnect_checkbox.isChecked():
+            QMessageBox.warning(self, "Warning", "Serial port disconnected")
+            self.__set_disconnected()
+            return
+        # the button stays checked, unchecking it stops waiting
+        self.__reconnecting = True
+        self.__splitter.setDisabled(True)
+        self.__serial_connect_button.setText("Reconnecting...")
+        self.__serial_port_combobox.discovery.refresh()
+        self.__reconnect_timer.start()
+
+    def __slot_on_port_added(self, port: SerialPortDescription):
+        if self.__reconnecting and port.identity == self.__port_identity:
+            self.__reconnect(port)
+
+    def __slot_on_reconnect_timeout(self):
+        if not self.__reconnecting:
+            self.__reconnect_timer.stop()
+            return
+        discovery = self.__serial_port_combobox.discovery
+        port = discovery.find(self.__port_identity)  # type: ignore
+        if port is not None:
+            self.__reconnect(port)
+        discovery.refresh()
+
+    def __reconnect(self, port: SerialPortDescription):
+        # an attempt is still running while the button is disabled
+        if not self.__serial_connect_button.isEnabled():
+            return
+        if self.__hub.port_owner(port.port_name) is not None:
+            return
+        logger.info(f"{self.__device.name} reconnecting to {port.port_name}")
+        self.__serial_port_combobox.setCurrentText(port.port_name)
+        self.__serial_connect_button.setEnabled(False)
+        self.__device.open(port.port_name, *self.__open_settings)  # type: ignore
+
+    def __slot_on_record(self):
+        if self.__record_button.isChecked():
+            path, _ = QFileDialog.getSaveFileName(
+                self, "Record Telemetry", "", "Telemetry Recording (*.l3tr)"
+            )
+            if not path:
+                self.__record_button.setChecked(False)
+                return
+            # stays checked until the worker reports whether the file opened
+            self.signal_start_recording.emit(path)
+        else:
+            self.signal_stop_recording.emit()
+            self.__record_button.setText("Record")
+
+    def __slot_on_recording_started(self, started: bool):
+        if started:
+            self.__record_button.setText("Stop Recording")
+        else:
+            self.__record_button.setChecked(False)
+            self.__record_button.setText("Record")
+            QMessageBox.critical(self, "Error", "Cannot record telemetry")
+
+    def __slot_on_share(self):
+        if self.__share_button.isChecked():
+            self.signal_start_publishing.emit(
+                shared_telemetry_name(self.__device.index)
+            )
+        else:
+            self.signal_stop_publishing.emit()
+            self.__share_button.setText("Share")
+
+    def __slot_on_publishing_started(self, started: bool):
+        if started:
+            self.__share_button.setText("Stop Sharing")
+        else:
+            self.__share_button.setChecked(False)
+            self.__share_button.setText("Share")
+            QMessageBox.critical(self, "Error", "Cannot share telemetry")
+
+    def __slot_on_trace(self):
+        if self.__trace_button.isChecked():
+            path, _ = QFileDialog.getSaveFileName(
+                self, "Trace Serial Traffic", "", "Serial Trace (*.l3st)"
+            )
+            if not path:
+                self.__trace_button.setChecked(False)
+                return
+            self.signal_start_trace.emit(path)
+        else:
+            self.signal_stop_trace.emit()
+            self.__trace_button.setText("Trace")
+
+    def __slot_on_trace_started(self, started: bool):
+        if started:
+            self.__trace_button.setText("Stop Trace")
+        else:
+            self.__trace_button.setChecked(False)
+            self.__trace_button.setText("Trace")
+            QMessageBox.critical(self, "Error", "Cannot trace serial traffic")
+
+    def __slot_on_replay(self):
+        if self.__replay_button.isChecked():
+            path, _ = QFileDialog.getOpenFileName(
+                self, "Replay Telemetry", "", "Telemetry Recording (*.l3tr)"
+            )
+            if not path:
+                self.__replay_button.setChecked(False)
+                return
+            self.__serial_connect_button.setEnabled(False)
+            self.__replay_speed_spinbox.setEnabled(False)
+            self.__replay_button.setText("Stop Replay")
+            self.signal_replay_open.emit(path, self.__replay_speed_spinbox.value())
+        else:
+            self.signal_replay_close.emit()
+
+    def __slot_on_replay_opened(self, opened: bool):
+        if opened:
+            # recorded timestamps are older than anything plotted live
+            self.__dc_motor_widget.clear()
+        else:
+            QMessageBox.critical(self, "Error", "Cannot replay telemetry recording")
+            self.__slot_on_replay_finished({})
+
+    def __slot_on_replay_finished(self, statistics: dict):
+        self.__replay_button.setChecked(False)
+        self.__replay_button.setText("Replay")
+        self.__replay_speed_spinbox.setEnabled(True)
+        self.__serial_connect_button.setEnabled(True)
+
+    def __slot_on_serial_opened(self, opened: bool):
+        self.__serial_connect_button.setEnabled(True)
+        if self.__reconnecting:
+            if not opened:
+                # the port may not be ready right after it appears, the
+                # reconnect timer tries again
+                logger.warning(f"{self.__device.name} failed to reconnect")
+                return
+            self.__reconnecting = False
+            self.__reconnect_timer.stop()
+        if not opened:
+            QMessageBox.critical(self, "Error", "Cannot open serial port")
+            self.__serial_connect_button.setChecked(False)
+            return
+        self.__serial_port_combobox.setEnabled(False)
+        self.__baud_rate_combobox.setEnabled(False)
+        self.__framing_combobox.setEnabled(False)
+        self.__flow_control_combobox.setEnabled(False)
+        self.__serial_connect_button.setText("Disconnect")
+        self.__splitter.setEnabled(True)
+
+        port = self.__serial_port_combobox.current_port()
+        self.__port_identity = (
+            port.identity
+            if port is not None
+            else (self.__serial_port_combobox.currentText(),)
+        )
+
+    def __slot_on_framing_changed(self, framing: int):
+        self.__framing_combobox.setCurrentIndex(
+            self.__framing_combobox.findData(framing)
+        )
+
+    def __slot_on_packets_received(self, batch: MCUPacketBatch):
+        self.__dc_motor_widget.update_plot_batch(batch.counts, batch.timestamps_ns)
+
+    def __slot_on_tx_statistics(self, statistics: dict):
+        text = f"TX queue: {statistics['queue_depth']}, sent: {statistics['sent']}, coalesced: {statistics['coalesced']}, latency p50/p99: {statistics['latency_p50_ms']:.1f}/{statistics['latency_p99_ms']:.1f} ms"
+        if statistics["flow_window"] > 0:
+            text += f", in flight: {statistics['in_flight']}/{statistics['flow_window']}, acked: {statistics['acked']}, ACK timeouts: {statistics['ack_timeouts']}, RTT p50/p90/p99: {statistics['rtt_p50_ms']:.1f}/{statistics['rtt_p90_ms']:.1f}/{statistics['rtt_p99_ms']:.1f} ms"
+        self.__tx_statistics_label.setText(text)
@@ -1,137 +1,121 @@
-from datetime import datetime
-from itertools import batched
-
-from loguru import logger
-from PySide6.QtCore import Qt, Signal
-from PySide6.QtGui import QTextCursor
-from PySide6.QtSerialPort import QSerialPort
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QCloseEvent
 from PySide6.QtWidgets import (
     QDockWidget,
-    QHBoxLayout,
     QMainWindow,
-    QMessageBox,
     QPushButton,
-    QSplitter,
-    QTextBrowser,
+    QTabWidget,
     QVBoxLayout,
     QWidget,
 )
 
-from ..function_block.lab3_2axis_control_widget import TwoAxisControlWidget
-from ..function_block.lab3_dc_motor_widget import DCMotorWidget
-from ..function_block.lab3_stepper_motor_widget import StepperMotorWidget
-from ..serial_protocol.lab3_serial_protocol import MCUPacket
-from ..widget.serial_combo_box import SerialComboBox
+from ..widget.lazy_widget import LazyWidget
+from ..widget.log_console import LogConsole
+from ..worker.lab3_serial_hub import SerialDevice, SerialHub
+from .lab3_device_widget import Lab3DeviceWidget
 
 
-class Lab3MainWindow(QMainWindow):
-    signal_write = Signal(str)
+def create_metrics_panel() -> QWidget:
+    # starts behind the log, QtNetwork is only loaded once it is shown
+    from ..instrumentation.lab3_metrics_panel import MetricsPanel
+
+    return MetricsPanel()
 
+
+class Lab3MainWindow(QMainWindow):
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.__central_widget = Lab3MainWindowCentralWidget()
         self.setCentralWidget(self.__central_widget)
 
-        self.__text_browser = QTextBrowser()
-        self.signal_write.connect(self.__slot_write)
+        self.__log_console = LogConsole()
 
-        dock_widget = QDockWidget()
-        dock_widget.setWidget(self.__text_browser)
+        dock_widget = QDockWidget("Log")
+        dock_widget.setWidget(self.__log_console)
         self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, dock_widget)
 
+        metrics_dock_widget = QDockWidget("Metrics")
+        metrics_dock_widget.setWidget(LazyWidget(create_metrics_panel))
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, metrics_dock_widget)
+        self.tabifyDockWidget(dock_widget, metrics_dock_widget)
+        dock_widget.raise_()
+
         self.setWindowTitle("MECH423Lab3GUI")
 
+    def closeEvent(self, event: QCloseEvent) -> None:
+        self.__central_widget.shutdown()
+        super().closeEvent(event)
+
+    @property
+    def log_console(self) -> LogConsole:
+        return self.__log_console
+
     def write(self, text: str) -> None:
-        self.signal_write.emit(text)
+        self.__log_console.write(text)
 
     def flush(self) -> None:
         pass
 
-    def __slot_write(self, text: str) -> None:
-        self.__text_browser.moveCursor(QTextCursor.MoveOperation.End)
-        self.__text_browser.insertPlainText(text)
-        self.__text_browser.ensureCursorVisible()
-
 
 class Lab3MainWindowCentralWidget(QWidget):
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
 
-        # serial port
-        self.__serial_port = QSerialPort()
-        self.__serial_rx_buffer = bytearray()
-        self.__serial_port.readyRead.connect(self.__slot_on_serial_ready)
+        # one tab per serial device, each with its own port, thread and widgets
+        self.__serial_hub = SerialHub(self)
+        self.__serial_hub.signal_device_added.connect(self.__slot_on_device_added)
 
-        serial_port_layout = QHBoxLayout()
-        self.__serial_port_combobox = SerialComboBox()
+        self.__add_device_button = QPushButton("Add Device")
+        self.__add_device_button.clicked.connect(self.__serial_hub.add_device)
 
-        self.__serial_connect_button = QPushButton("Connect")
-        self.__serial_connect_button.setCheckable(True)
-        self.__serial_connect_button.clicked.connect(self.__slot_on_serial_connect)
+        self.__tab_widget = QTabWidget()
+        self.__tab_widget.setTabsClosable(True)
+        self.__tab_widget.setCornerWidget(self.__add_device_button)
+        self.__tab_widget.tabCloseRequested.connect(self.__slot_on_tab_close_requested)
 
-        serial_port_layout.addWidget(self.__serial_port_combobox)
-        serial_port_layout.addWidget(self.__serial_connect_button)
+        self.setLayout(QVBoxLayout())
+        self.layout().setContentsMargins(0, 0, 0, 0)
+        self.layout().addWidget(self.__tab_widget)
 
-        self.__dc_motor_widget = DCMotorWidget()
-        self.__dc_motor_widget.signal_serial_write.connect(self.__slot_on_serial_write)
-        self.__stepper_motor_widget = StepperMotorWidget()
-        self.__stepper_motor_widget.signal_serial_write.connect(
-            self.__slot_on_serial_write
-        )
-        self.__2_axis_control_widget = TwoAxisControlWidget()
-        self.__2_axis_control_widget.signal_serial_write.connect(
-            self.__slot_on_serial_write
-        )
+        self.__serial_hub.add_device()
 
-        self.__splitter = QSplitter(Qt.Orientation.Horizontal)
-        self.__splitter.setDisabled(True)
-        self.__splitter.addWidget(self.__dc_motor_widget)
-        self.__splitter.addWidget(self.__stepper_motor_widget)
-        self.__splitter.addWidget(self.__2_axis_control_widget)
+    @property
+    def serial_hub(self) -> SerialHub:
+        return self.__serial_hub
 
-        self.setLayout(QVBoxLayout())
-        self.layout().addLayout(serial_port_layout)  # type: ignore
-        self.layout().addWidget(self.__splitter)
-
-    def __slot_on_serial_connect(self):
-        if self.__serial_connect_button.isChecked():
-            self.__serial_port.setPortName(self.__serial_port_combobox.currentText())
-            self.__serial_port.setBaudRate(QSerialPort.BaudRate.Baud9600)
-            self.__serial_port.setDataBits(QSerialPort.DataBits.Data8)
-            self.__serial_port.setParity(QSerialPort.Parity.NoParity)
-            self.__serial_port.setStopBits(QSerialPort.StopBits.OneStop)
-            self.__serial_port.setFlowControl(QSerialPort.FlowControl.NoFlowControl)
-
-            if not self.__serial_port.open(QSerialPort.OpenModeFlag.ReadWrite):
-                QMessageBox.critical(self, "Error", "Cannot open serial port")
-                self.__serial_connect_button.setChecked(False)
-                return
-            self.__serial_port_combobox.setEnabled(False)
-            self.__serial_connect_button.setText("Disconnect")
-            self.__splitter.setEnabled(True)
-        else:
-            self.__serial_port.close()
-            self.__serial_port_combobox.setEnabled(True)
-            self.__serial_connect_button.setText("Connect")
-            self.__splitter.setDisabled(True)
-
-    def __slot_on_serial_ready(self):
-        data = self.__serial_port.readAll().data()
-        logger.debug(f"{data.hex().upper()}")
-
-        self.__serial_rx_buffer += data
-        while len(self.__serial_rx_buffer) >= 4:
-            try:
-                packet = MCUPacket.from_bytes(self.__serial_rx_buffer[:4])
-                self.__serial_rx_buffer = self.__serial_rx_buffer[4:]
-                self.__dc_motor_widget.update_plot(
-                    ((packet.data[0] << 8) + packet.data[1], datetime.now())
-                )
-            except Exception:
-                self.__serial_rx_buffer.pop(0)
-
-    def __slot_on_serial_write(self, message: bytearray):
-        self.__serial_port.write(message)
-        logger.debug(
-            f"serial_bytes: {", ".join([x+y for (x,y) in (batched(message.hex().upper(),2))])}"
+    def shutdown(self) -> None:
+        self.__serial_hub.shutdown()
+
+    def __slot_on_device_added(self, device: SerialDevice):
+        device_widget = Lab3DeviceWidget(self.__serial_hub, device)
+        device.signal_port_changed.connect(
+            lambda port_name, device_widget=device_widget: self.__update_tab_text(
+                device_widget
+            )
+        )
+        # tabs stay in device order when a freed number is reused
+        position = sum(
+            self.__tab_widget.widget(index).device.index < device.index  # type: ignore
+            for index in range(self.__tab_widget.count())
         )
+        self.__tab_widget.insertTab(position, device_widget, device.name)
+        self.__tab_widget.setCurrentWidget(device_widget)
+        self.__update_tabs_closable()
+
+    def __slot_on_tab_close_requested(self, index: int):
+        device_widget: Lab3DeviceWidget = self.__tab_widget.widget(index)  # type: ignore
+        self.__tab_widget.removeTab(index)
+        self.__serial_hub.remove_device(device_widget.device)
+        device_widget.deleteLater()
+        self.__update_tabs_closable()
+
+    def __update_tab_text(self, device_widget: Lab3DeviceWidget):
+        device = device_widget.device
+        self.__tab_widget.setTabText(
+            self.__tab_widget.indexOf(device_widget),
+            f"{device.name}: {device.port_name}" if device.port_name else device.name,
+        )
+
+    def __update_tabs_closable(self):
+        # the last device stays
+        self.__tab_widget.setTabsClosable(self.__tab_widget.count() > 1)
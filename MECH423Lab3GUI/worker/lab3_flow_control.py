@@ -0,0 +1,158 @@
+from collections import deque
+
+import numpy as np
+
+from ..serial_protocol.lab3_serial_protocol import (
+    ECHO_TAG_ACK,
+    SerialControlBytes,
+    encode_fixed_command,
+)
+
+SEQUENCE_MODULO = 0x100
+
+
+def ack_marker(sequence: int) -> bytearray:
+    return bytearray(
+        encode_fixed_command(
+            SerialControlBytes.ECHO, bytes([ECHO_TAG_ACK, sequence, 0])
+        )
+    )
+
+
+# credit window over commands the MCU has not acknowledged yet, an ECHO marker
+# with a sequence number follows every few commands and, since the MCU handles
+# commands in order, its echo releases every command sent before it
+class AckFlowControl:
+    ACK_TIMEOUT_NS = 250_000_000
+    MAX_CONSECUTIVE_TIMEOUTS = 3
+
+    def __init__(self, window: int = 0) -> None:
+        # markers are [sequence, send time, commands covered]
+        self.__markers: deque[list[int]] = deque()
+        self.__round_trips_ns: deque[int] = deque(maxlen=1024)
+        self.set_window(window)
+
+    @property
+    def enabled(self) -> bool:
+        return self.__window > 0
+
+    @property
+    def window(self) -> int:
+        return self.__window
+
+    @property
+    def in_flight(self) -> int:
+        return self.__in_flight
+
+    # commands sent since the last marker
+    @property
+    def unmarked(self) -> int:
+        return self.__unmarked
+
+    @property
+    def credit(self) -> int:
+        # -1 without flow control
+        if not self.enabled:
+            return -1
+        return max(0, self.__window - self.__in_flight)
+
+    def set_window(self, window: int) -> None:
+        if not 0 <= window < SEQUENCE_MODULO // 2:
+            raise ValueError(f"Invalid flow control window {window}")
+        self.__window = window
+        # acknowledge twice per window so the pipe never drains completely
+        self.__ack_interval = max(1, window // 2)
+        self.reset()
+
+    def reset(self) -> None:
+        self.__markers.clear()
+        self.__round_trips_ns.clear()
+        self.__sequence = 0
+        self.__in_flight = 0
+        self.__unmarked = 0
+        self.__acked_count = 0
+        self.__timeout_count = 0
+        self.__consecutive_timeout_count = 0
+
+    def can_send(self) -> bool:
+        return not self.enabled or self.__in_flight < self.__window
+
+    # returns a marker to send right after the command, if one is due
+    def on_sent(self, now_ns: int) -> bytearray | None:
+        if not self.enabled:
+            return None
+        self.__in_flight += 1
+        self.__unmarked += 1
+        if self.__unmarked < self.__ack_interval and self.__in_flight < self.__window:
+            return None
+        return self.__mark(now_ns)
+
+    # a marker for the commands short of a full interval, once no more follow
+    # them, otherwise they would stay in flight
+    def flush(self, now_ns: int) -> bytearray | None:
+        if not self.enabled or self.__unmarked == 0:
+            return None
+        return self.__mark(now_ns)
+
+    def __mark(self, now_ns: int) -> bytearray:
+        sequence = self.__sequence
+        self.__sequence = (sequence + 1) % SEQUENCE_MODULO
+        # the marker occupies the MCU receive buffer like any other command
+        self.__in_flight += 1
+        self.__markers.append([sequence, now_ns, self.__unmarked + 1])
+        self.__unmarked = 0
+        return ack_marker(sequence)
+
+    def acknowledge(self, sequence: int, timestamp_ns: int) -> bool:
+        for index, marker in enumerate(self.__markers):
+            if marker[0] == sequence:
+                break
+        else:
+            # late answer to a marker that already timed out
+            return False
+
+        for _ in range(index + 1):
+            _, sent_ns, covered = self.__markers.popleft()
+            self.__in_flight -= covered
+            self.__acked_count += covered
+        self.__round_trips_ns.append(timestamp_ns - sent_ns)
+        self.__consecutive_timeout_count = 0
+        return True
+
+    def next_deadline_ns(self) -> int | None:
+        if not self.__markers:
+            return None
+        return self.__markers[0][1] + self.ACK_TIMEOUT_NS
+
+    # releases markers that were never answered, returns how many
+    def expire(self, now_ns: int) -> int:
+        expired = 0
+        while self.__markers and self.__markers[0][1] + self.ACK_TIMEOUT_NS <= now_ns:
+            _, _, covered = self.__markers.popleft()
+            self.__in_flight -= covered
+            expired += 1
+        self.__timeout_count += expired
+        self.__consecutive_timeout_count += expired
+        if self.__consecutive_timeout_count >= self.MAX_CONSECUTIVE_TIMEOUTS:
+            # the MCU does not answer markers, fall back to open loop
+            self.__window = 0
+            self.__markers.clear()
+            self.__in_flight = 0
+            self.__unmarked = 0
+        return expired
+
+    def statistics(self) -> dict:
+        round_trips_ms = np.array(self.__round_trips_ns) / 1e6
+        statistics = {
+            "flow_window": self.__window,
+            "in_flight": self.__in_flight,
+            "acked": self.__acked_count,
+            "ack_timeouts": self.__timeout_count,
+        }
+        for percentile in (50, 90, 99):
+            statistics[f"rtt_p{percentile}_ms"] = (
+                float(np.percentile(round_trips_ms, percentile))
+                if len(round_trips_ms)
+                else 0.0
+            )
+        return statistics
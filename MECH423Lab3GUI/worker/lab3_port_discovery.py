@@ -0,0 +1,182 @@
+import sys
+from dataclasses import dataclass
+from functools import cache
+
+from loguru import logger
+from PySide6.QtCore import QObject, QThreadPool, QTimer, Signal
+
+
+@dataclass(frozen=True)
+class SerialPortDescription:
+    port_name: str
+    system_location: str = ""
+    description: str = ""
+    manufacturer: str = ""
+    serial_number: str = ""
+    vendor_id: int | None = None
+    product_id: int | None = None
+
+    # the same adapter keeps its identity when it comes back under another
+    # port name, as long as it reports a serial number
+    @property
+    def identity(self) -> tuple:
+        if self.serial_number:
+            return (self.vendor_id, self.product_id, self.serial_number)
+        return (self.port_name,)
+
+    @property
+    def summary(self) -> str:
+        parts = [self.description or self.port_name]
+        if self.vendor_id is not None and self.product_id is not None:
+            parts.append(f"{self.vendor_id:04X}:{self.product_id:04X}")
+        if self.serial_number:
+            parts.append(f"S/N {self.serial_number}")
+        return ", ".join(parts)
+
+
+def scan_serial_ports() -> list[SerialPortDescription]:
+    from PySide6.QtSerialPort import QSerialPortInfo
+
+    return [
+        SerialPortDescription(
+            port.portName(),
+            port.systemLocation(),
+            port.description(),
+            port.manufacturer(),
+            port.serialNumber(),
+            port.vendorIdentifier() if port.hasVendorIdentifier() else None,
+            port.productIdentifier() if port.hasProductIdentifier() else None,
+        )
+        for port in QSerialPortInfo.availablePorts()
+    ]
+
+
+class PortDiscovery(QObject):
+    signal_port_added = Signal(object)
+    signal_port_removed = Signal(object)
+    signal_ports_changed = Signal(list)
+
+    __signal_scanned = Signal(list)
+    __signal_hotplug = Signal()
+
+    POLL_INTERVAL_MS = 1000
+    # udev reports hotplug events, polling only catches anything it missed
+    UDEV_POLL_INTERVAL_MS = 5000
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.__ports: dict[str, SerialPortDescription] = {}
+        self.__scanning = False
+        self.__rescan = False
+        self.__udev_observer = None
+        self.__signal_scanned.connect(self.__slot_on_scanned)
+        self.__signal_hotplug.connect(self.refresh)
+
+        self.__poll_timer = QTimer(self)
+        self.__poll_timer.timeout.connect(self.refresh)
+
+    @property
+    def ports(self) -> list[SerialPortDescription]:
+        return list(self.__ports.values())
+
+    @property
+    def is_running(self) -> bool:
+        return self.__poll_timer.isActive()
+
+    def port(self, port_name: str) -> SerialPortDescription | None:
+        return self.__ports.get(port_name)
+
+    def find(self, identity: tuple) -> SerialPortDescription | None:
+        for port in self.__ports.values():
+            if port.identity == identity:
+                return port
+        return None
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        interval_ms = self.POLL_INTERVAL_MS
+        if self.__start_udev_observer():
+            interval_ms = self.UDEV_POLL_INTERVAL_MS
+        self.__poll_timer.start(interval_ms)
+        self.refresh()
+
+    def stop(self) -> None:
+        self.__poll_timer.stop()
+        if self.__udev_observer is not None:
+            self.__udev_observer.stop()
+            self.__udev_observer = None
+
+    # scans on the thread pool, a request during a scan scans once more after
+    def refresh(self) -> None:
+        if self.__scanning:
+            self.__rescan = True
+            return
+        self.__scanning = True
+        QThreadPool.globalInstance().start(self.__scan)
+
+    def __scan(self):
+        try:
+            ports = scan_serial_ports()
+        except Exception as e:
+            logger.error(f"cannot enumerate serial ports: {e}")
+            ports = None
+        try:
+            self.__signal_scanned.emit(ports)
+        except RuntimeError:
+            # deleted in the meantime
+            pass
+
+    def __slot_on_scanned(self, ports: list[SerialPortDescription] | None):
+        self.__scanning = False
+        if ports is not None:
+            self.__update(ports)
+        if self.__rescan:
+            self.__rescan = False
+            self.refresh()
+
+    def __update(self, ports: list[SerialPortDescription]):
+        scanned = {port.port_name: port for port in ports}
+        removed = [
+            port for name, port in self.__ports.items() if scanned.get(name) != port
+        ]
+        added = [
+            port for name, port in scanned.items() if self.__ports.get(name) != port
+        ]
+        if not added and not removed:
+            return
+        self.__ports = scanned
+        for port in removed:
+            logger.info(f"serial port {port.port_name} removed ({port.summary})")
+            self.signal_port_removed.emit(port)
+        for port in added:
+            logger.info(f"serial port {port.port_name} added ({port.summary})")
+            self.signal_port_added.emit(port)
+        self.signal_ports_changed.emit(self.ports)
+
+    def __start_udev_observer(self) -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            import pyudev
+        except ImportError:
+            return False
+
+        # callbacks arrive on the observer thread, the signal hands them over
+        monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+        monitor.filter_by("tty")
+        self.__udev_observer = pyudev.MonitorObserver(
+            monitor, callback=lambda device: self.__signal_hotplug.emit()
+        )
+        self.__udev_observer.start()
+        logger.info("watching udev for serial port hotplug")
+        return True
+
+
+# one discovery service shared by every port selector
+@cache
+def shared_port_discovery() -> PortDiscovery:
+    discovery = PortDiscovery()
+    discovery.start()
+    return discovery
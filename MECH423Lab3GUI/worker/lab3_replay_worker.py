@@ -0,0 +1,179 @@
+import time
+
+import numpy as np
+from loguru import logger
+from PySide6.QtCore import QObject, Qt, QTimer, Signal, Slot
+
+from ..serial_protocol.lab3_mcu_frame_decoder import MCU_PACKET_HEADER, MCUFrameDecoder
+from ..telemetry.lab3_telemetry_recorder import TelemetryReader
+
+
+def encode_mcu_packets(counts: np.ndarray) -> bytes:
+    frames = np.empty((len(counts), 4), np.uint8)
+    frames[:, 0] = MCU_PACKET_HEADER
+    frames[:, 1] = counts >> 8
+    frames[:, 2] = counts & 0xFF
+    frames[:, 3] = (frames[:, :3].astype(np.uint16).sum(axis=1)) & 0xFF
+    return frames.tobytes()
+
+
+class ReplayWorker(QObject):
+    signal_opened = Signal(bool)
+    signal_closed = Signal()
+    signal_packets_received = Signal(object)
+    signal_finished = Signal(dict)
+
+    # packets handed to the decoder per tick when replaying as fast as possible
+    FAST_CHUNK_SIZE = 4096
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.__timer = QTimer(self)
+        self.__timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.__timer.timeout.connect(self.__slot_on_timer_timeout)
+        self.__mcu_frame_decoder = MCUFrameDecoder(
+            max(1 << 16, self.FAST_CHUNK_SIZE * 4)
+        )
+
+        self.__wire_bytes = memoryview(b"")
+        self.__timestamps_ns = np.empty(0, np.int64)
+        self.__speed = 1.0
+        self.__cursor = 0
+        self.__start_ns = 0
+        self.__tick_count = 0
+        self.__tick_time_ns = 0
+        self.__max_tick_time_ns = 0
+
+    @Slot(str, float)
+    def slot_open(self, path: str, speed: float):
+        self.slot_close()
+        try:
+            reader = TelemetryReader(path)
+        except (OSError, ValueError) as e:
+            logger.error(f"cannot replay {path}: {e}")
+            self.signal_opened.emit(False)
+            return
+
+        self.__wire_bytes = memoryview(encode_mcu_packets(reader.mcu_counts))
+        self.__timestamps_ns = np.ascontiguousarray(reader.mcu_timestamps_ns)
+        self.__speed = speed
+        self.__cursor = 0
+        self.__tick_count = 0
+        self.__tick_time_ns = 0
+        self.__max_tick_time_ns = 0
+        self.__mcu_frame_decoder.reset()
+        logger.info(
+            f"replaying {len(self.__timestamps_ns)} packets from {path} at {'max' if speed <= 0 else f'{speed}x'} speed"
+        )
+
+        self.signal_opened.emit(True)
+        self.__start_ns = time.perf_counter_ns()
+        self.__timer.start(0 if speed <= 0 else 5)
+
+    @Slot()
+    def slot_close(self):
+        if self.__timer.isActive():
+            self.__timer.stop()
+            self.__finish()
+        self.signal_closed.emit()
+
+    @Slot(bytearray, "qint64")
+    def slot_write(self, message: bytearray, issued_ns: int):
+        pass
+
+    def statistics(self) -> dict:
+        elapsed_s = max(time.perf_counter_ns() - self.__start_ns, 1) / 1e9
+        return {
+            "packets": self.__cursor,
+            "elapsed_s": elapsed_s,
+            "packets_per_s": self.__cursor / elapsed_s,
+            "ticks": self.__tick_count,
+            "mean_tick_ms": self.__tick_time_ns / max(self.__tick_count, 1) / 1e6,
+            "max_tick_ms": self.__max_tick_time_ns / 1e6,
+            "resyncs": self.__mcu_frame_decoder.resync_count,
+            "checksum_errors": self.__mcu_frame_decoder.checksum_error_count,
+        }
+
+    def __slot_on_timer_timeout(self):
+        tick_start_ns = time.perf_counter_ns()
+        total = len(self.__timestamps_ns)
+
+        if self.__speed <= 0 or total == 0:
+            stop = min(total, self.__cursor + self.FAST_CHUNK_SIZE)
+        else:
+            elapsed_ns = (tick_start_ns - self.__start_ns) * self.__speed
+            stop = int(
+                np.searchsorted(
+                    self.__timestamps_ns,
+                    self.__timestamps_ns[0] + elapsed_ns,
+                    side="right",
+                )
+            )
+
+        if stop > self.__cursor:
+            batch = self.__mcu_frame_decoder.feed_batch(
+                self.__wire_bytes[self.__cursor * 4 : stop * 4],
+                int(self.__timestamps_ns[stop - 1]),
+            )
+            self.__cursor = stop
+            self.signal_packets_received.emit(batch)
+
+        tick_time_ns = time.perf_counter_ns() - tick_start_ns
+        self.__tick_count += 1
+        self.__tick_time_ns += tick_time_ns
+        self.__max_tick_time_ns = max(self.__max_tick_time_ns, tick_time_ns)
+
+        if self.__cursor >= total:
+            self.__timer.stop()
+            self.__finish()
+
+    def __finish(self):
+        statistics = self.statistics()
+        logger.info(
+            f"replay finished, {statistics['packets']} packets in {statistics['elapsed_s']:.3f}s ({statistics['packets_per_s']:.0f} packets/s)"
+        )
+        self.signal_finished.emit(statistics)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from PySide6.QtWidgets import QApplication
+
+    from ..function_block.lab3_dc_motor_widget import DCMotorWidget
+
+    parser = argparse.ArgumentParser(
+        description="Replay a telemetry recording through the receive-to-plot pipeline"
+    )
+    parser.add_argument("path")
+    parser.add_argument("--speed", type=float, default=0, help="0 replays at max speed")
+    arguments = parser.parse_args()
+
+    app = QApplication([])
+    dc_motor_widget = DCMotorWidget()
+    dc_motor_widget.show()
+    replay_worker = ReplayWorker()
+
+    plot_time_ns = []
+
+    def on_packets_received(batch):
+        start_ns = time.perf_counter_ns()
+        dc_motor_widget.update_plot_batch(batch.counts, batch.timestamps_ns)
+        dc_motor_widget.redraw()
+        plot_time_ns.append(time.perf_counter_ns() - start_ns)
+
+    def on_finished(statistics: dict):
+        frame_times_ms = np.array(plot_time_ns) / 1e6
+        for key, value in statistics.items():
+            print(f"{key}: {value:.6g}")
+        if len(frame_times_ms) > 0:
+            print(f"mean_plot_frame_ms: {frame_times_ms.mean():.6g}")
+            print(f"p99_plot_frame_ms: {np.percentile(frame_times_ms, 99):.6g}")
+        app.quit()
+
+    replay_worker.signal_packets_received.connect(on_packets_received)
+    replay_worker.signal_finished.connect(on_finished)
+    replay_worker.slot_open(arguments.path, arguments.speed)
+    sys.exit(app.exec())
@@ -0,0 +1,139 @@
+from loguru import logger
+from PySide6.QtCore import QMetaObject, QObject, Qt, QThread, Signal
+
+from .lab3_replay_worker import ReplayWorker
+from .lab3_serial_worker import SerialWorker
+
+
+class SerialDevice(QObject):
+    signal_port_changed = Signal(str)
+
+    __signal_open = Signal(str, int, int, int)
+    __signal_close = Signal()
+
+    def __init__(self, index: int, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.__index = index
+        self.__port_name = ""
+        self.__requested_port_name = ""
+
+        # every device reads, schedules and decodes in its own thread, so a
+        # slow or stalled port never holds up the others, the first device
+        # keeps the unprefixed metric names
+        self.__thread = QThread()
+        self.__thread.setObjectName(f"serial-device-{index}")
+        self.__serial_worker = SerialWorker(
+            metrics_scope="" if index == 1 else f"device{index}"
+        )
+        self.__serial_worker.moveToThread(self.__thread)
+        self.__thread.finished.connect(self.__serial_worker.deleteLater)
+        self.__signal_open.connect(self.__serial_worker.slot_open)
+        self.__signal_close.connect(self.__serial_worker.slot_close)
+        self.__serial_worker.signal_opened.connect(self.__slot_on_opened)
+        self.__serial_worker.signal_closed.connect(self.__slot_on_closed)
+
+        # recorded sessions are replayed from the same thread
+        self.__replay_worker = ReplayWorker()
+        self.__replay_worker.moveToThread(self.__thread)
+        self.__thread.finished.connect(self.__replay_worker.deleteLater)
+        self.__thread.start()
+
+    @property
+    def index(self) -> int:
+        return self.__index
+
+    @property
+    def name(self) -> str:
+        return f"Device {self.__index}"
+
+    # the port while it is open, empty otherwise
+    @property
+    def port_name(self) -> str:
+        return self.__port_name
+
+    @property
+    def serial_worker(self) -> SerialWorker:
+        return self.__serial_worker
+
+    @property
+    def replay_worker(self) -> ReplayWorker:
+        return self.__replay_worker
+
+    def open(
+        self, port_name: str, baud_rate: int, framing: int, flow_control_window: int
+    ) -> None:
+        self.__requested_port_name = port_name
+        self.__signal_open.emit(port_name, baud_rate, framing, flow_control_window)
+
+    def close(self) -> None:
+        self.__signal_close.emit()
+
+    def shutdown(self) -> None:
+        if not self.__thread.isRunning():
+            return
+        for worker, slot in (
+            (self.__replay_worker, "slot_close"),
+            (self.__serial_worker, "slot_stop_recording"),
+            (self.__serial_worker, "slot_stop_publishing"),
+            (self.__serial_worker, "slot_stop_trace"),
+            (self.__serial_worker, "slot_close"),
+        ):
+            QMetaObject.invokeMethod(
+                worker, slot, Qt.ConnectionType.BlockingQueuedConnection
+            )
+        self.__thread.quit()
+        self.__thread.wait()
+
+    def __slot_on_opened(self, opened: bool):
+        if opened:
+            self.__port_name = self.__requested_port_name
+            self.signal_port_changed.emit(self.__port_name)
+
+    def __slot_on_closed(self):
+        if self.__port_name:
+            self.__port_name = ""
+            self.signal_port_changed.emit("")
+
+
+class SerialHub(QObject):
+    signal_device_added = Signal(object)
+    signal_device_removed = Signal(object)
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.__devices: list[SerialDevice] = []
+
+    @property
+    def devices(self) -> list[SerialDevice]:
+        return list(self.__devices)
+
+    def add_device(self) -> SerialDevice:
+        # reuse the lowest free number so metric names stay stable
+        used = {device.index for device in self.__devices}
+        index = next(index for index in range(1, len(used) + 2) if index not in used)
+        device = SerialDevice(index, self)
+        self.__devices.append(device)
+        logger.info(f"added {device.name}")
+        self.signal_device_added.emit(device)
+        return device
+
+    def remove_device(self, device: SerialDevice) -> None:
+        if device not in self.__devices:
+            raise ValueError(f"{device.name} is not part of this hub")
+        device.shutdown()
+        self.__devices.remove(device)
+        logger.info(f"removed {device.name}")
+        self.signal_device_removed.emit(device)
+        device.deleteLater()
+
+    # the device that has the port open, if any
+    def port_owner(self, port_name: str) -> SerialDevice | None:
+        for device in self.__devices:
+            if port_name and device.port_name == port_name:
+                return device
+        return None
+
+    def shutdown(self) -> None:
+        for device in self.__devices:
+            device.shutdown()
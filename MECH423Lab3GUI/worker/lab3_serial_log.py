@@ -0,0 +1,72 @@
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from ..telemetry.lab3_serial_trace import SerialTraceDirection, SerialTraceWriter
+
+# bound once, opt() builds a new logger on every call, depth attributes the
+# message to the caller of SerialLog
+_lazy_logger = logger.opt(lazy=True, depth=1)
+
+
+def format_hex(data: bytes | bytearray | memoryview) -> str:
+    return bytes(data).hex(" ").upper()
+
+
+class SerialLog:
+    def __init__(self, sample_interval: int = 1) -> None:
+        self.__trace: SerialTraceWriter | None = None
+        self.__rx_count = 0
+        self.__tx_count = 0
+        self.set_sample_interval(sample_interval)
+
+    @property
+    def sample_interval(self) -> int:
+        return self.__sample_interval
+
+    # log every n-th read and write as text, 0 turns text logging off
+    def set_sample_interval(self, sample_interval: int) -> None:
+        if sample_interval < 0:
+            raise ValueError(f"Invalid sample interval {sample_interval}")
+        self.__sample_interval = sample_interval
+        self.__rx_count = self.__tx_count = 0
+
+    @property
+    def trace(self) -> SerialTraceWriter | None:
+        return self.__trace
+
+    def start_trace(self, path: str | Path) -> SerialTraceWriter:
+        self.stop_trace()
+        self.__trace = SerialTraceWriter(path)
+        return self.__trace
+
+    def stop_trace(self) -> SerialTraceWriter | None:
+        trace, self.__trace = self.__trace, None
+        if trace is not None:
+            trace.close()
+        return trace
+
+    def rx(self, data: bytes | bytearray | memoryview, timestamp_ns: int) -> None:
+        if self.__trace is not None:
+            self.__trace.write(SerialTraceDirection.RX, data, timestamp_ns)
+        if self.__sample_interval:
+            self.__rx_count += 1
+            if self.__rx_count >= self.__sample_interval:
+                self.__rx_count = 0
+                _lazy_logger.debug("serial rx: {}", lambda: format_hex(data))
+
+    def tx(
+        self, data: bytes | bytearray | memoryview, timestamp_ns: int | None = None
+    ) -> None:
+        if self.__trace is not None:
+            self.__trace.write(
+                SerialTraceDirection.TX,
+                data,
+                time.monotonic_ns() if timestamp_ns is None else timestamp_ns,
+            )
+        if self.__sample_interval:
+            self.__tx_count += 1
+            if self.__tx_count >= self.__sample_interval:
+                self.__tx_count = 0
+                _lazy_logger.debug("serial tx: {}", lambda: format_hex(data))
@@ -0,0 +1,387 @@
+import time
+from collections import deque
+from collections.abc import Iterable
+
+from loguru import logger
+from PySide6.QtCore import QIODevice, QObject, QTimer, Signal, Slot
+from PySide6.QtNetwork import QAbstractSocket, QTcpSocket
+from PySide6.QtSerialPort import QSerialPort
+
+from ..instrumentation.lab3_metrics import metrics
+from ..motion.lab3_trajectory_planner import Trajectory
+from ..motion.lab3_trajectory_streamer import TrajectoryStreamer
+from ..serial_protocol.lab3_mcu_frame_decoder import MCUFrameDecoder
+from ..serial_protocol.lab3_serial_protocol import (
+    ECHO_TAG_ACK,
+    ECHO_TAG_FRAMING_REQUEST,
+    SERIAL_SOCKET_SCHEME,
+    SerialControlBytes,
+    SerialFraming,
+    SerialPacket,
+)
+from ..telemetry.lab3_shared_telemetry import SharedTelemetryPublisher
+from ..telemetry.lab3_telemetry_recorder import TelemetryRecorder
+from .lab3_serial_log import SerialLog
+from .lab3_tx_scheduler import TxScheduler
+
+
+class SerialWorker(QObject):
+    signal_opened = Signal(bool)
+    signal_closed = Signal()
+    signal_connection_lost = Signal()
+    signal_packets_received = Signal(object)
+    signal_tx_statistics = Signal(dict)
+    signal_framing_changed = Signal(int)
+    signal_trajectory_progress = Signal(int, int)
+    signal_trajectory_statistics = Signal(dict)
+    signal_recording_started = Signal(bool)
+    signal_trace_started = Signal(bool)
+    signal_publishing_started = Signal(bool)
+
+    FRAMING_NEGOTIATION_TIMEOUT_MS = 500
+    SOCKET_CONNECT_TIMEOUT_MS = 1000
+
+    def __init__(self, *args, metrics_scope: str = "", **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        scoped_metrics = metrics.scope(metrics_scope)
+
+        self.__serial_port = QSerialPort(self)
+        self.__serial_port.readyRead.connect(self.__slot_on_serial_ready)
+        self.__serial_port.bytesWritten.connect(self.__slot_on_bytes_written)
+        self.__serial_port.errorOccurred.connect(self.__slot_on_serial_error)
+        # socket:// ports, e.g. the simulated MCU
+        self.__socket = QTcpSocket(self)
+        self.__socket.readyRead.connect(self.__slot_on_serial_ready)
+        self.__socket.bytesWritten.connect(self.__slot_on_bytes_written)
+        self.__socket.errorOccurred.connect(self.__slot_on_socket_error)
+        # whichever of the two the open port is
+        self.__port: QIODevice = self.__serial_port
+        self.__port_name = ""
+        self.__mcu_frame_decoder = MCUFrameDecoder()
+        self.__telemetry_recorder: TelemetryRecorder | None = None
+        self.__telemetry_publisher: SharedTelemetryPublisher | None = None
+        self.__serial_log = SerialLog()
+
+        # writes waiting for bytesWritten, as [end offset, write time, issue time]
+        self.__pending_writes: deque[tuple[int, int, int]] = deque()
+        self.__queued_byte_count = 0
+        self.__written_byte_count = 0
+        self.__decoder_statistics = (0, 0, 0)
+
+        self.__tx_byte_counter = scoped_metrics.counter("tx_bytes", "Bytes written")
+        self.__tx_drain_histogram = scoped_metrics.histogram(
+            "tx_drain_latency_ns", "Serial port write until handed to the OS"
+        )
+        self.__tx_end_to_end_histogram = scoped_metrics.histogram(
+            "tx_end_to_end_latency_ns", "Command issued until handed to the OS"
+        )
+        self.__rx_byte_counter = scoped_metrics.counter("rx_bytes", "Bytes read")
+        self.__rx_packet_counter = scoped_metrics.counter(
+            "rx_packets", "MCU packets decoded"
+        )
+        self.__rx_dropped_byte_counter = scoped_metrics.counter(
+            "rx_dropped_bytes", "Bytes skipped while resynchronizing"
+        )
+        self.__rx_resync_counter = scoped_metrics.counter(
+            "rx_resyncs", "Resynchronizations"
+        )
+        self.__rx_checksum_error_counter = scoped_metrics.counter(
+            "rx_checksum_errors", "MCU packets with a bad checksum"
+        )
+        self.__rx_decode_histogram = scoped_metrics.histogram(
+            "rx_decode_time_ns", "Time to decode one serial read"
+        )
+
+        self.__tx_scheduler = TxScheduler(self, metrics_scope=metrics_scope)
+        self.__tx_scheduler.signal_dispatch.connect(self.__slot_on_tx_dispatch)
+        self.__tx_scheduler.signal_statistics.connect(self.signal_tx_statistics)
+        self.__tx_scheduler.signal_flow_control_lost.connect(
+            self.__slot_on_flow_control_lost
+        )
+
+        self.__trajectory_streamer = TrajectoryStreamer(
+            self, metrics_scope=metrics_scope
+        )
+        self.__trajectory_streamer.signal_serial_write.connect(self.slot_write)
+        self.__trajectory_streamer.signal_progress.connect(
+            self.signal_trajectory_progress
+        )
+        self.__trajectory_streamer.signal_statistics.connect(
+            self.signal_trajectory_statistics
+        )
+        self.__tx_scheduler.signal_credit.connect(
+            self.__trajectory_streamer.slot_set_credit
+        )
+
+        self.__requested_framing = SerialFraming.FIXED
+        self.__framing_timer = QTimer(self)
+        self.__framing_timer.setSingleShot(True)
+        self.__framing_timer.timeout.connect(self.__slot_on_framing_timeout)
+
+    @Slot(str, int, int, int)
+    def slot_open(
+        self, port_name: str, baud_rate: int, framing: int, flow_control_window: int
+    ):
+        self.__port_name = port_name
+        self.__mcu_frame_decoder.reset()
+        self.__decoder_statistics = (0, 0, 0)
+        self.__pending_writes.clear()
+        self.__queued_byte_count = self.__written_byte_count = 0
+        self.__tx_scheduler.clear()
+        self.__tx_scheduler.set_baud_rate(baud_rate)
+        self.__tx_scheduler.set_framing(SerialFraming.FIXED)
+        self.__tx_scheduler.set_flow_control_window(flow_control_window)
+
+        if port_name.startswith(SERIAL_SOCKET_SCHEME):
+            opened = self.__open_socket(port_name.removeprefix(SERIAL_SOCKET_SCHEME))
+        else:
+            opened = self.__open_serial_port(port_name, baud_rate)
+        if not opened:
+            logger.error(f"cannot open {port_name}: {self.__port.errorString()}")
+        self.signal_opened.emit(opened)
+
+        if opened and framing != SerialFraming.FIXED:
+            # ask the MCU to switch framing, it stays fixed unless acknowledged
+            self.__requested_framing = SerialFraming(framing)
+            self.__tx_scheduler.submit(
+                SerialPacket(
+                    SerialControlBytes.ECHO,
+                    bytearray([ECHO_TAG_FRAMING_REQUEST, framing, 0x00]),
+                ).to_bytearray()
+            )
+            self.__framing_timer.start(self.FRAMING_NEGOTIATION_TIMEOUT_MS)
+
+    def __open_serial_port(self, port_name: str, baud_rate: int) -> bool:
+        self.__port = self.__serial_port
+        self.__serial_port.setPortName(port_name)
+        self.__serial_port.setBaudRate(baud_rate)
+        self.__serial_port.setDataBits(QSerialPort.DataBits.Data8)
+        self.__serial_port.setParity(QSerialPort.Parity.NoParity)
+        self.__serial_port.setStopBits(QSerialPort.StopBits.OneStop)
+        self.__serial_port.setFlowControl(QSerialPort.FlowControl.NoFlowControl)
+        return self.__serial_port.open(QSerialPort.OpenModeFlag.ReadWrite)
+
+    # address is host:port, the tx scheduler still paces at the baud rate
+    def __open_socket(self, address: str) -> bool:
+        self.__port = self.__socket
+        host, _, port = address.rpartition(":")
+        if not port.isdigit() or int(port) > 0xFFFF:
+            self.__socket.setErrorString(f"invalid address {address}")
+            return False
+        self.__socket.connectToHost(host, int(port))
+        if not self.__socket.waitForConnected(self.SOCKET_CONNECT_TIMEOUT_MS):
+            self.__socket.abort()
+            return False
+        self.__socket.setSocketOption(QAbstractSocket.SocketOption.LowDelayOption, 1)
+        return True
+
+    @Slot()
+    def slot_close(self):
+        self.__trajectory_streamer.slot_stop()
+        self.__framing_timer.stop()
+        self.__tx_scheduler.clear()
+        if self.__port.isOpen():
+            self.__port.close()
+            logger.info(
+                f"serial port closed, {self.__mcu_frame_decoder.resync_count} resyncs, {self.__mcu_frame_decoder.checksum_error_count} checksum errors"
+            )
+        self.signal_closed.emit()
+
+    @Slot(str)
+    def slot_start_recording(self, path: str):
+        self.slot_stop_recording()
+        try:
+            self.__telemetry_recorder = TelemetryRecorder(path)
+        except OSError as e:
+            logger.error(f"cannot record telemetry to {path}: {e}")
+            self.signal_recording_started.emit(False)
+            return
+        logger.info(f"recording telemetry to {path}")
+        self.signal_recording_started.emit(True)
+
+    @Slot()
+    def slot_stop_recording(self):
+        if self.__telemetry_recorder is None:
+            return
+        self.__telemetry_recorder.close()
+        logger.info(
+            f"recorded {self.__telemetry_recorder.record_count} records to {self.__telemetry_recorder.path}"
+        )
+        self.__telemetry_recorder = None
+
+    @Slot(str)
+    def slot_start_publishing(self, name: str):
+        self.slot_stop_publishing()
+        try:
+            self.__telemetry_publisher = SharedTelemetryPublisher(name)
+        except OSError as e:
+            logger.error(f"cannot publish telemetry to shared memory {name}: {e}")
+            self.signal_publishing_started.emit(False)
+            return
+        logger.info(f"publishing telemetry to shared memory {name}")
+        self.signal_publishing_started.emit(True)
+
+    @Slot()
+    def slot_stop_publishing(self):
+        if self.__telemetry_publisher is None:
+            return
+        self.__telemetry_publisher.close()
+        logger.info(
+            f"published {self.__telemetry_publisher.record_count} records to {self.__telemetry_publisher.name}"
+        )
+        self.__telemetry_publisher = None
+
+    @Slot(str)
+    def slot_start_trace(self, path: str):
+        try:
+            self.__serial_log.start_trace(path)
+        except OSError as e:
+            logger.error(f"cannot trace serial traffic to {path}: {e}")
+            self.signal_trace_started.emit(False)
+            return
+        logger.info(f"tracing serial traffic to {path}")
+        self.signal_trace_started.emit(True)
+
+    @Slot()
+    def slot_stop_trace(self):
+        trace = self.__serial_log.stop_trace()
+        if trace is not None:
+            logger.info(f"traced {trace.record_count} records to {trace.path}")
+
+    @Slot(int)
+    def slot_set_log_sample_interval(self, sample_interval: int):
+        self.__serial_log.set_sample_interval(sample_interval)
+
+    @Slot(object)
+    def slot_start_trajectory(self, trajectory: Trajectory):
+        self.slot_start_trajectory_stream([trajectory])
+
+    @Slot(object)
+    def slot_start_trajectory_stream(self, chunks: Iterable[Trajectory]):
+        # the streamer only counts down its credit between updates, a stopped
+        # stream may have left it stale
+        self.__trajectory_streamer.slot_set_credit(self.__tx_scheduler.credit)
+        self.__trajectory_streamer.slot_start_stream(chunks)
+
+    @Slot()
+    def slot_stop_trajectory(self):
+        self.__trajectory_streamer.slot_stop()
+
+    # issued_ns is the perf_counter_ns time a widget emitted the command, so the
+    # latency includes the queued signal to this thread
+    @Slot(bytearray, "qint64")
+    def slot_write(self, message: bytearray, issued_ns: int):
+        if self.__port.isOpen():
+            self.__tx_scheduler.submit(message, issued_ns)
+
+    def __slot_on_tx_dispatch(self, message: bytearray, issued_ns: int):
+        self.__port.write(message)
+        self.__queued_byte_count += len(message)
+        self.__pending_writes.append(
+            (self.__queued_byte_count, time.perf_counter_ns(), issued_ns)
+        )
+        self.__tx_byte_counter.add(len(message))
+        if self.__telemetry_recorder is not None:
+            self.__telemetry_recorder.record_serial_packet(message)
+        self.__serial_log.tx(message)
+
+    def __slot_on_serial_ready(self):
+        data = self.__port.readAll().data()
+        timestamp_ns = time.monotonic_ns()
+        self.__serial_log.rx(data, timestamp_ns)
+
+        decode_start_ns = time.perf_counter_ns()
+        batch = self.__mcu_frame_decoder.feed_batch(data, timestamp_ns)
+        self.__rx_decode_histogram.record(time.perf_counter_ns() - decode_start_ns)
+        self.__update_rx_metrics(len(data), len(batch))
+        for echo, timestamp_ns in self.__mcu_frame_decoder.take_echo_packets():
+            self.__handle_echo(echo, timestamp_ns)
+        if len(batch) > 0:
+            if self.__telemetry_recorder is not None:
+                self.__telemetry_recorder.record_mcu_packets(
+                    batch.counts, batch.timestamps_ns
+                )
+            if self.__telemetry_publisher is not None:
+                self.__telemetry_publisher.publish(batch.counts, batch.timestamps_ns)
+            self.signal_packets_received.emit(batch)
+
+    def __slot_on_bytes_written(self, count: int):
+        self.__written_byte_count += count
+        now_ns = time.perf_counter_ns()
+        while (
+            self.__pending_writes
+            and self.__pending_writes[0][0] <= self.__written_byte_count
+        ):
+            _, write_ns, issued_ns = self.__pending_writes.popleft()
+            self.__tx_drain_histogram.record(now_ns - write_ns)
+            # acknowledgement markers are not issued by anyone
+            if issued_ns >= 0:
+                self.__tx_end_to_end_histogram.record(now_ns - issued_ns)
+
+    def __slot_on_serial_error(self, error: QSerialPort.SerialPortError):
+        # the adapter was unplugged or otherwise went away, depending on the
+        # driver reads then keep failing or the port reports a resource error
+        if error not in (
+            QSerialPort.SerialPortError.ResourceError,
+            QSerialPort.SerialPortError.ReadError,
+        ):
+            return
+        if self.__port is not self.__serial_port or not self.__serial_port.isOpen():
+            return
+        self.__lose_connection()
+
+    def __slot_on_socket_error(self, error: QAbstractSocket.SocketError):
+        if self.__port is not self.__socket or error not in (
+            QAbstractSocket.SocketError.RemoteHostClosedError,
+            QAbstractSocket.SocketError.NetworkError,
+        ):
+            return
+        self.__lose_connection()
+
+    def __lose_connection(self):
+        logger.error(f"lost {self.__port_name}: {self.__port.errorString()}")
+        self.slot_close()
+        self.signal_connection_lost.emit()
+
+    def __update_rx_metrics(self, byte_count: int, packet_count: int):
+        self.__rx_byte_counter.add(byte_count)
+        self.__rx_packet_counter.add(packet_count)
+        decoder = self.__mcu_frame_decoder
+        statistics = (
+            decoder.dropped_byte_count,
+            decoder.resync_count,
+            decoder.checksum_error_count,
+        )
+        if statistics != self.__decoder_statistics:
+            dropped, resyncs, checksum_errors = self.__decoder_statistics
+            self.__rx_dropped_byte_counter.add(statistics[0] - dropped)
+            self.__rx_resync_counter.add(statistics[1] - resyncs)
+            self.__rx_checksum_error_counter.add(statistics[2] - checksum_errors)
+            self.__decoder_statistics = statistics
+
+    def __handle_echo(self, echo: bytes, timestamp_ns: int):
+        if echo[0] == ECHO_TAG_ACK:
+            self.__tx_scheduler.acknowledge(echo[1], timestamp_ns)
+        elif echo[0] == ECHO_TAG_FRAMING_REQUEST and self.__framing_timer.isActive():
+            self.__framing_timer.stop()
+            if echo[1] != self.__requested_framing:
+                logger.warning(
+                    f"MCU answered framing request with {echo[1]}, staying with FIXED framing"
+                )
+                # the framing selector still shows the requested framing
+                self.signal_framing_changed.emit(SerialFraming.FIXED)
+                return
+            self.__tx_scheduler.set_framing(self.__requested_framing)
+            logger.info(f"switched to {self.__requested_framing.name} framing")
+            self.signal_framing_changed.emit(self.__requested_framing)
+
+    def __slot_on_flow_control_lost(self):
+        logger.warning(
+            "MCU stopped acknowledging commands, flow control is off until reconnect"
+        )
+
+    def __slot_on_framing_timeout(self):
+        logger.warning(
+            f"MCU did not accept {self.__requested_framing.name} framing, staying with FIXED framing"
+        )
+        self.signal_framing_changed.emit(SerialFraming.FIXED)
@@ -0,0 +1,312 @@
+import time
+from collections import deque
+
+import numpy as np
+from PySide6.QtCore import QObject, Qt, QTimer, Signal
+
+from ..instrumentation.lab3_metrics import metrics
+from ..serial_protocol.lab3_serial_protocol import (
+    SERIAL_BITS_PER_BYTE,
+    SerialControlBytes,
+    SerialFraming,
+    encode_frame,
+)
+from .lab3_flow_control import AckFlowControl
+
+# commands where only the latest value matters
+COALESCED_CONTROLS = frozenset(
+    {
+        SerialControlBytes.DC_MOTOR_OPEN_LOOP_VOLTAGE,
+        SerialControlBytes.DC_MOTOR_ABSOLUTE_POSITION,
+        SerialControlBytes.STEPPER_MOTOR_OPEN_LOOP_SPEED,
+    }
+)
+
+POSITION_CONTROLS = frozenset(
+    {
+        SerialControlBytes.DC_MOTOR_ABSOLUTE_POSITION,
+        SerialControlBytes.DC_MOTOR_RELATIVE_POSITION,
+    }
+)
+
+# motors each command acts on, an urgent command makes queued ones for the
+# same motor stale
+CONTROL_MOTORS = {
+    SerialControlBytes.DC_MOTOR_OPEN_LOOP_VOLTAGE: frozenset({"dc_motor"}),
+    SerialControlBytes.DC_MOTOR_ABSOLUTE_POSITION: frozenset({"dc_motor"}),
+    SerialControlBytes.DC_MOTOR_RELATIVE_POSITION: frozenset({"dc_motor"}),
+    SerialControlBytes.STEPPER_MOTOR_SINGLE_STEP: frozenset({"stepper_motor"}),
+    SerialControlBytes.STEPPER_MOTOR_OPEN_LOOP_SPEED: frozenset({"stepper_motor"}),
+    SerialControlBytes.TWO_AXIS_CONTROL: frozenset({"dc_motor", "stepper_motor"}),
+}
+
+
+def is_stop_command(control: int, frame: bytearray) -> bool:
+    match control:
+        case SerialControlBytes.DC_MOTOR_OPEN_LOOP_VOLTAGE:
+            return frame[4] == 0 and frame[5] == 0
+        case SerialControlBytes.STEPPER_MOTOR_OPEN_LOOP_SPEED:
+            return frame[4] == 0xFF and frame[5] == 0xFF
+    return False
+
+
+class TxScheduler(QObject):
+    # frames with the time they were issued at, -1 for acknowledgement markers
+    signal_dispatch = Signal(bytearray, "qint64")
+    signal_statistics = Signal(dict)
+    signal_credit = Signal(int)
+    signal_flow_control_lost = Signal()
+
+    URGENT, NORMAL = 0, 1
+    # the link counts as idle after this long without commands
+    ACK_IDLE_MS = 20
+
+    def __init__(self, *args, metrics_scope: str = "", **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        scoped_metrics = metrics.scope(metrics_scope)
+
+        # entries are [frame, enqueue time, control, priority, issue time], frame is
+        # None once superseded
+        self.__queues: tuple[deque[list], deque[list]] = (deque(), deque())
+        self.__coalesced: dict[int, list] = {}
+
+        self.__framing = SerialFraming.FIXED
+        self.__byte_rate = 9600 / SERIAL_BITS_PER_BYTE
+        self.__burst_bytes = 32.0
+        self.__tokens = self.__burst_bytes
+        self.__token_time_ns = time.perf_counter_ns()
+
+        self.__latencies_ns: deque[int] = deque(maxlen=1024)
+        self.__sent_count = 0
+        self.__sent_byte_count = 0
+        self.__coalesced_count = 0
+
+        self.__flow_control = AckFlowControl()
+
+        self.__queue_latency_histogram = scoped_metrics.histogram(
+            "tx_queue_latency_ns", "Command submit until written to the serial port"
+        )
+        self.__event_loop_lateness_histogram = scoped_metrics.histogram(
+            "worker_event_loop_lateness_ns", "Lateness of a 1 s timer in the worker"
+        )
+
+        self.__timer = QTimer(self)
+        self.__timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.__timer.setSingleShot(True)
+        self.__timer.timeout.connect(self.__dispatch)
+
+        self.__idle_timer = QTimer(self)
+        self.__idle_timer.setSingleShot(True)
+        self.__idle_timer.setInterval(self.ACK_IDLE_MS)
+        self.__idle_timer.timeout.connect(self.__slot_on_idle_timeout)
+
+        self.__statistics_timer = QTimer(self)
+        self.__statistics_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.__statistics_timer.timeout.connect(self.__slot_on_statistics_timeout)
+        self.__statistics_timer.start(1000)
+        self.__statistics_time_ns = time.perf_counter_ns()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(
+            1 for queue in self.__queues for entry in queue if entry[0] is not None
+        )
+
+    def set_baud_rate(self, baud_rate: int) -> None:
+        self.__byte_rate = baud_rate / SERIAL_BITS_PER_BYTE
+        # allow roughly 2 ms worth of bytes, but at least two fixed frames
+        self.__burst_bytes = max(32.0, self.__byte_rate * 2e-3)
+        self.__tokens = min(self.__tokens, self.__burst_bytes)
+
+    @property
+    def framing(self) -> SerialFraming:
+        return self.__framing
+
+    def set_framing(self, framing: SerialFraming) -> None:
+        self.__framing = framing
+
+    @property
+    def flow_control_window(self) -> int:
+        return self.__flow_control.window
+
+    def set_flow_control_window(self, window: int) -> None:
+        self.__flow_control.set_window(window)
+        self.signal_credit.emit(self.credit)
+
+    @property
+    def credit(self) -> int:
+        # commands that can be submitted without queueing, -1 without flow control
+        if not self.__flow_control.enabled:
+            return -1
+        return max(0, self.__flow_control.credit - self.queue_depth)
+
+    def acknowledge(self, sequence: int, timestamp_ns: int) -> None:
+        if self.__flow_control.acknowledge(sequence, timestamp_ns):
+            self.__dispatch()
+            self.signal_credit.emit(self.credit)
+
+    def clear(self) -> None:
+        for queue in self.__queues:
+            queue.clear()
+        self.__coalesced.clear()
+        self.__timer.stop()
+        self.__idle_timer.stop()
+        self.__flow_control.reset()
+
+    # issued_ns defaults to now, for commands that originate in this thread
+    def submit(self, frame: bytearray, issued_ns: int | None = None) -> None:
+        control = (frame[1] << 8) + frame[2]
+        priority = (
+            self.URGENT
+            if control in POSITION_CONTROLS or is_stop_command(control, frame)
+            else self.NORMAL
+        )
+        now_ns = time.perf_counter_ns()
+        issued_ns = now_ns if issued_ns is None else issued_ns
+
+        if priority == self.URGENT:
+            # an older command for the same motor must not be sent after this one
+            self.__drop_normal(CONTROL_MOTORS.get(control, frozenset()))
+
+        entry = [frame, now_ns, control, priority, issued_ns]
+        if control in COALESCED_CONTROLS:
+            queued = self.__coalesced.get(control)
+            if queued is not None and queued[3] == priority:
+                self.__coalesced_count += 1
+                if priority == self.NORMAL:
+                    queued[0], queued[1], queued[4] = frame, now_ns, issued_ns
+                    self.__dispatch()
+                    return
+                queued[0] = None
+            # a queued urgent command still goes out before a normal one
+            self.__coalesced[control] = entry
+
+        self.__queues[priority].append(entry)
+        self.__dispatch()
+
+    def statistics(self) -> dict:
+        latencies_ms = np.array(self.__latencies_ns) / 1e6
+        return {
+            "queue_depth": self.queue_depth,
+            "sent": self.__sent_count,
+            "sent_bytes": self.__sent_byte_count,
+            "coalesced": self.__coalesced_count,
+            "latency_p50_ms": (
+                float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else 0.0
+            ),
+            "latency_p99_ms": (
+                float(np.percentile(latencies_ms, 99)) if len(latencies_ms) else 0.0
+            ),
+        } | self.__flow_control.statistics()
+
+    def __dispatch(self) -> None:
+        now_ns = time.perf_counter_ns()
+        self.__tokens = min(
+            self.__burst_bytes,
+            self.__tokens + (now_ns - self.__token_time_ns) / 1e9 * self.__byte_rate,
+        )
+        self.__token_time_ns = now_ns
+
+        if self.__flow_control.enabled and self.__flow_control.expire(
+            time.monotonic_ns()
+        ):
+            if not self.__flow_control.enabled:
+                self.signal_flow_control_lost.emit()
+            self.signal_credit.emit(self.credit)
+
+        for queue in self.__queues:
+            while queue:
+                entry = queue[0]
+                frame, enqueue_time_ns, control, _, issued_ns = entry
+                if frame is None:
+                    queue.popleft()
+                    continue
+                if not self.__flow_control.can_send():
+                    # wait for an acknowledgement, or its timeout
+                    self.__timer.start(
+                        max(
+                            1,
+                            -(
+                                (
+                                    time.monotonic_ns()
+                                    - self.__flow_control.next_deadline_ns()
+                                )
+                                // 1_000_000
+                            ),
+                        )
+                    )
+                    return
+                wire_frame = encode_frame(frame, self.__framing)
+                if self.__tokens < len(wire_frame):
+                    # wait until the link has room for the next frame
+                    self.__timer.start(
+                        max(
+                            1,
+                            int(
+                                (len(wire_frame) - self.__tokens)
+                                / self.__byte_rate
+                                * 1e3
+                            ),
+                        )
+                    )
+                    return
+                queue.popleft()
+                if self.__coalesced.get(control) is entry:
+                    del self.__coalesced[control]
+
+                self.__tokens -= len(wire_frame)
+                self.__sent_count += 1
+                self.__sent_byte_count += len(wire_frame)
+                self.__latencies_ns.append(now_ns - enqueue_time_ns)
+                self.__queue_latency_histogram.record(now_ns - enqueue_time_ns)
+                self.signal_dispatch.emit(wire_frame, issued_ns)
+
+                marker = self.__flow_control.on_sent(time.monotonic_ns())
+                if marker is not None:
+                    self.__send_marker(marker)
+
+        if self.__flow_control.unmarked > 0:
+            self.__idle_timer.start()
+        deadline_ns = self.__flow_control.next_deadline_ns()
+        if deadline_ns is not None:
+            # nothing left to send, expire unanswered markers on time
+            self.__timer.start(
+                max(1, -((time.monotonic_ns() - deadline_ns) // 1_000_000))
+            )
+
+    def __drop_normal(self, motors: frozenset[str]) -> None:
+        for entry in self.__queues[self.NORMAL]:
+            if entry[0] is None or not motors & CONTROL_MOTORS.get(
+                entry[2], frozenset()
+            ):
+                continue
+            entry[0] = None
+            self.__coalesced_count += 1
+            if self.__coalesced.get(entry[2]) is entry:
+                del self.__coalesced[entry[2]]
+
+    def __send_marker(self, marker: bytearray) -> None:
+        # markers follow their commands directly and may overdraw the bucket
+        # by one frame
+        wire_marker = encode_frame(marker, self.__framing)
+        self.__tokens -= len(wire_marker)
+        self.__sent_byte_count += len(wire_marker)
+        self.signal_dispatch.emit(wire_marker, -1)
+
+    def __slot_on_idle_timeout(self) -> None:
+        if self.queue_depth > 0:
+            return
+        marker = self.__flow_control.flush(time.monotonic_ns())
+        if marker is not None:
+            self.__send_marker(marker)
+            # schedules the marker's timeout
+            self.__dispatch()
+
+    def __slot_on_statistics_timeout(self) -> None:
+        # queued signals from the GUI wait just as long as this timer
+        now_ns = time.perf_counter_ns()
+        self.__event_loop_lateness_histogram.record(
+            now_ns - self.__statistics_time_ns - 1_000_000_000
+        )
+        self.__statistics_time_ns = now_ns
+        self.signal_statistics.emit(self.statistics())
@@ -0,0 +1,27 @@
+import os
+import time
+
+import pytest
+
+# widgets and timers run without a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+@pytest.fixture(scope="session")
+def qt_app():
+    from PySide6.QtWidgets import QApplication
+
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def process_events(qt_app):
+    # runs the event loop until `done` holds or `timeout_s` passes
+    def process_events(timeout_s: float, done=lambda: False) -> bool:
+        deadline = time.monotonic() + timeout_s
+        while not done() and time.monotonic() < deadline:
+            qt_app.processEvents()
+            time.sleep(5e-4)
+        return done()
+
+    return process_events
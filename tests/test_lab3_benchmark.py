@@ -0,0 +1,19 @@
+from MECH423Lab3GUI.benchmark.lab3_benchmark import (
+    BENCHMARKS,
+    load_baseline,
+    run_benchmark,
+)
+
+
+def test_baseline_covers_every_case():
+    baseline = load_baseline()
+
+    assert set(baseline["relative"]) == set(BENCHMARKS)
+    assert all(value > 0 for value in baseline["relative"].values())
+
+
+def test_run_benchmark_relative_to_reference():
+    ns_per_item, relative = run_benchmark(BENCHMARKS["mcu_packet_from_bytes"], 2)
+
+    assert ns_per_item > 0
+    assert 0 < relative < ns_per_item
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from MECH423Lab3GUI.telemetry.lab3_encoder_dsp import (
+    ENCODER_COUNT_MODULO,
+    ENCODER_COUNT_OFFSET,
+    EncoderPipeline,
+    EncoderUnwrapper,
+    RollingRegression,
+    VelocityEstimator,
+)
+
+PERIOD_NS = 1_000_000
+
+
+def _counts(positions: np.ndarray) -> np.ndarray:
+    return ((ENCODER_COUNT_OFFSET + positions) % ENCODER_COUNT_MODULO).astype(np.uint16)
+
+
+def _ramp(velocity: float, count: int, jitter_ns: float = 0.0):
+    rng = np.random.default_rng(423)
+    times_ns = np.arange(count) * PERIOD_NS
+    positions = np.rint(velocity * times_ns / 1e9).astype(np.int64)
+    arrivals_ns = times_ns + rng.uniform(0, jitter_ns, count).astype(np.int64)
+    return _counts(positions), arrivals_ns, positions
+
+
+@pytest.mark.parametrize("step", [7, -7, 1000, -1000])
+def test_unwrap_across_counter_wrap(step):
+    # from the 0x4000 start the counter wraps 0xC000 ahead or 0x4000 back
+    start = 0xC000 - 500 if step > 0 else 500 - 0x4000
+    positions = start + np.arange(0, 200) * step
+    counts = _counts(positions)
+    assert (np.diff(counts.astype(np.int64)) != step).any()
+
+    np.testing.assert_array_equal(EncoderUnwrapper().unwrap(counts), positions)
+
+    unwrapper = EncoderUnwrapper()
+    single = [unwrapper.unwrap(counts[index : index + 1])[0] for index in range(200)]
+    np.testing.assert_array_equal(single, positions)
+
+
+def test_unwrap_starts_at_first_count():
+    unwrapper = EncoderUnwrapper()
+
+    np.testing.assert_array_equal(unwrapper.unwrap(_counts(np.array([5, 3]))), [5, 3])
+    np.testing.assert_array_equal(unwrapper.unwrap(_counts(np.array([-2]))), [-2])
+    unwrapper.reset()
+    np.testing.assert_array_equal(unwrapper.unwrap(_counts(np.array([9]))), [9])
+
+
+def test_rolling_regression_fits_line():
+    regression = RollingRegression(16)
+    x = np.arange(100, dtype=np.float64)
+    slopes, fitted = regression.update(x[:60], 3.0 * x[:60] + 1e6)
+    slope, value = regression.update_one(60.0, 3.0 * 60 + 1e6)
+
+    assert np.isnan(slopes[0])
+    np.testing.assert_allclose(slopes[1:], 3.0)
+    np.testing.assert_allclose(fitted[1:], 3.0 * x[1:60] + 1e6)
+    assert slope == pytest.approx(3.0)
+    assert value == pytest.approx(3.0 * 60 + 1e6)
+
+
+@pytest.mark.parametrize("estimator", list(VelocityEstimator))
+@pytest.mark.parametrize("velocity", [2000.0, -3000.0])
+def test_estimators_follow_constant_velocity(estimator, velocity):
+    pipeline = EncoderPipeline(estimator)
+    counts, arrivals_ns, positions = _ramp(velocity, 3000)
+
+    samples = pipeline.process(counts, arrivals_ns)
+
+    np.testing.assert_array_equal(samples.positions, positions)
+    np.testing.assert_array_equal(samples.timestamps_ns, arrivals_ns)
+    assert pipeline.period_s == pytest.approx(PERIOD_NS / 1e9)
+    # once the filters have settled
+    np.testing.assert_allclose(samples.velocities[200:], velocity, rtol=0.01)
+
+
+def test_dejitter_recovers_sample_clock():
+    pipeline = EncoderPipeline()
+    counts, arrivals_ns, _ = _ramp(2000.0, 3000, jitter_ns=300_000)
+
+    timestamps_ns = pipeline.process(counts, arrivals_ns).timestamps_ns
+
+    assert (np.diff(timestamps_ns) >= 0).all()
+    np.testing.assert_allclose(np.diff(timestamps_ns[500:]), PERIOD_NS, rtol=0.01)
+
+
+@pytest.mark.parametrize(
+    "estimator, jitter_ns",
+    [(estimator, 0) for estimator in VelocityEstimator]
+    + [
+        (estimator, 300_000)
+        for estimator in VelocityEstimator
+        # alpha-beta runs at the mean period of each block, which only matches
+        # sample by sample on an even clock
+        if estimator != VelocityEstimator.ALPHA_BETA
+    ],
+)
+def test_single_samples_match_blocks(estimator, jitter_ns):
+    counts, arrivals_ns, _ = _ramp(2000.0, 2000, jitter_ns)
+    block_pipeline = EncoderPipeline(estimator)
+    single_pipeline = EncoderPipeline(estimator)
+
+    rng = np.random.default_rng(17)
+    cuts = np.r_[0, np.sort(rng.choice(np.arange(1, 2000), 150, False)), 2000]
+    blocks = [
+        block_pipeline.process(counts[start:stop], arrivals_ns[start:stop])
+        for start, stop in zip(cuts[:-1], cuts[1:])
+    ]
+    singles = [
+        single_pipeline.process(
+            counts[index : index + 1], arrivals_ns[index : index + 1]
+        )
+        for index in range(2000)
+    ]
+
+    for field in ("positions", "timestamps_ns", "velocities"):
+        np.testing.assert_allclose(
+            np.concatenate([getattr(samples, field) for samples in singles]),
+            np.concatenate([getattr(samples, field) for samples in blocks]),
+            rtol=1e-5,
+            err_msg=field,
+        )
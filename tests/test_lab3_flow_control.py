@@ -0,0 +1,147 @@
+import pytest
+
+from MECH423Lab3GUI.serial_protocol.lab3_serial_protocol import SerialControlBytes
+from MECH423Lab3GUI.worker.lab3_flow_control import AckFlowControl
+
+MS = 1_000_000
+
+
+def _sequence(marker: bytearray) -> int:
+    assert (marker[1] << 8) + marker[2] == SerialControlBytes.ECHO
+    return marker[4]
+
+
+def _send(flow_control: AckFlowControl, count: int, now_ns: int = 0) -> list:
+    markers = []
+    for _ in range(count):
+        assert flow_control.can_send()
+        marker = flow_control.on_sent(now_ns)
+        if marker is not None:
+            markers.append(marker)
+    return markers
+
+
+def test_disabled_sends_freely():
+    flow_control = AckFlowControl()
+
+    assert not flow_control.enabled
+    assert flow_control.credit == -1
+    assert _send(flow_control, 100) == []
+    assert flow_control.in_flight == 0
+
+
+@pytest.mark.parametrize("window", [-1, 128, 1000])
+def test_invalid_window(window):
+    with pytest.raises(ValueError):
+        AckFlowControl(window)
+
+
+def test_marker_every_half_window():
+    flow_control = AckFlowControl(8)
+    markers = _send(flow_control, 3)
+    assert markers == []
+    assert flow_control.credit == 5
+
+    # the fourth command completes an interval, the marker counts as in flight
+    markers = _send(flow_control, 1)
+    assert [_sequence(marker) for marker in markers] == [0]
+    assert flow_control.in_flight == 5
+    assert flow_control.unmarked == 0
+
+
+def test_window_full_waits_for_acknowledgement():
+    flow_control = AckFlowControl(4)
+    markers = _send(flow_control, 3)
+
+    # a marker after two commands, and one as the window fills up
+    assert len(markers) == 2
+    assert flow_control.in_flight == 5
+    assert not flow_control.can_send()
+    assert flow_control.credit == 0
+
+    assert flow_control.acknowledge(_sequence(markers[0]), 5 * MS)
+    assert flow_control.in_flight == 2
+    assert flow_control.can_send()
+    assert flow_control.statistics()["acked"] == 3
+    assert flow_control.statistics()["rtt_p50_ms"] == 5.0
+
+
+def test_acknowledgement_is_cumulative():
+    flow_control = AckFlowControl(16)
+    markers = _send(flow_control, 8)
+    _send(flow_control, 4, 1 * MS)
+    markers.append(flow_control.flush(1 * MS))
+    assert flow_control.in_flight == 14
+
+    # the second echo releases everything sent before it
+    assert flow_control.acknowledge(_sequence(markers[1]), 3 * MS)
+    assert flow_control.in_flight == 0
+    assert flow_control.next_deadline_ns() is None
+    # a late echo of the first marker changes nothing
+    assert not flow_control.acknowledge(_sequence(markers[0]), 4 * MS)
+    assert flow_control.in_flight == 0
+
+
+def test_flush_marks_remaining_commands():
+    flow_control = AckFlowControl(8)
+    assert flow_control.flush(0) is None
+
+    _send(flow_control, 2)
+    marker = flow_control.flush(10 * MS)
+    assert flow_control.unmarked == 0
+    assert flow_control.in_flight == 3
+    assert flow_control.flush(10 * MS) is None
+
+    flow_control.acknowledge(_sequence(marker), 12 * MS)
+    assert flow_control.in_flight == 0
+
+
+def test_expire_releases_unanswered_markers():
+    flow_control = AckFlowControl(8)
+    _send(flow_control, 4)
+    _send(flow_control, 2, 100 * MS)
+    flow_control.flush(100 * MS)
+    assert flow_control.in_flight == 8
+    assert flow_control.next_deadline_ns() == AckFlowControl.ACK_TIMEOUT_NS
+
+    assert flow_control.expire(AckFlowControl.ACK_TIMEOUT_NS - 1) == 0
+    assert flow_control.expire(AckFlowControl.ACK_TIMEOUT_NS) == 1
+    assert flow_control.in_flight == 3
+    assert flow_control.enabled
+    assert flow_control.statistics()["ack_timeouts"] == 1
+
+
+def test_consecutive_timeouts_fall_back_to_open_loop():
+    flow_control = AckFlowControl(2)
+    for index in range(AckFlowControl.MAX_CONSECUTIVE_TIMEOUTS):
+        assert flow_control.enabled
+        # a marker follows every command with a window of 2
+        assert len(_send(flow_control, 1, index * AckFlowControl.ACK_TIMEOUT_NS)) == 1
+        assert not flow_control.can_send()
+        assert flow_control.expire((index + 1) * AckFlowControl.ACK_TIMEOUT_NS) == 1
+
+    assert not flow_control.enabled
+    assert flow_control.window == 0
+    assert flow_control.in_flight == 0
+    assert flow_control.can_send()
+
+
+def test_acknowledgement_resets_timeout_count():
+    flow_control = AckFlowControl(2)
+    for index in range(2 * AckFlowControl.MAX_CONSECUTIVE_TIMEOUTS):
+        (marker,) = _send(flow_control, 1, index * AckFlowControl.ACK_TIMEOUT_NS)
+        if index % 2:
+            flow_control.acknowledge(_sequence(marker), 0)
+        else:
+            flow_control.expire((index + 1) * AckFlowControl.ACK_TIMEOUT_NS)
+
+    assert flow_control.enabled
+    assert flow_control.statistics()["ack_timeouts"] == 3
+
+
+def test_sequence_wraps():
+    flow_control = AckFlowControl(2)
+    for index in range(300):
+        (marker,) = _send(flow_control, 1)
+        assert _sequence(marker) == index % 256
+        assert flow_control.acknowledge(_sequence(marker), 0)
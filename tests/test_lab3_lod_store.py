@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from MECH423Lab3GUI.telemetry.lab3_lod_store import LodStore
+
+SAMPLES = 20_000
+
+
+@pytest.fixture(params=[False, True], ids=["memory", "spilled"])
+def filled(request):
+    rng = np.random.default_rng(423)
+    store = LodStore(2, factor=4, chunk_size=256)
+    store.set_spill_to_disk(request.param)
+    x = np.arange(SAMPLES) * 1e-3
+    values = rng.normal(0, 1, (2, SAMPLES)).cumsum(axis=1)
+    # uneven batches, as serial reads arrive
+    cuts = np.r_[0, np.sort(rng.choice(np.arange(1, SAMPLES), 300, False)), SAMPLES]
+    for start, stop in zip(cuts[:-1], cuts[1:]):
+        store.append(x[start:stop], *values[:, start:stop])
+    yield store, x, values
+    store.clear()
+
+
+def test_append_builds_levels(filled):
+    store, x, _ = filled
+
+    assert len(store) == SAMPLES
+    assert store.x_last == x[-1]
+    assert store.level_count > 3
+    assert store.x_at(1234) == x[1234]
+
+
+def test_query_full_resolution(filled):
+    store, x, values = filled
+    x_points, value_points = store.query(1.0, 2.0, 10_000)
+
+    # one sample before the range so that the curve enters it
+    np.testing.assert_array_equal(x_points, x[999:2001])
+    np.testing.assert_array_equal(value_points, values[:, 999:2001])
+
+
+@pytest.mark.parametrize("x_range", [(0.0, 20.0), (3.3, 17.1), (19.5, 25.0)])
+@pytest.mark.parametrize("max_points", [64, 500, 3000])
+def test_query_keeps_envelope(filled, x_range, max_points):
+    store, x, values = filled
+    x_start, x_stop = x_range
+    x_points, value_points = store.query(x_start, x_stop, max_points)
+
+    inside = (x >= x_start) & (x <= x_stop)
+    assert value_points.shape == (2, len(x_points))
+    # rows not yet gathered into the chosen level come from finer levels
+    assert len(x_points) <= max_points + 2 * 4 * store.level_count
+    assert (np.diff(x_points) >= 0).all()
+    assert x_points[0] <= x[inside][0]
+    assert x_points[-1] >= x[inside][-1]
+    assert (value_points.min(axis=1) <= values[:, inside].min(axis=1)).all()
+    assert (value_points.max(axis=1) >= values[:, inside].max(axis=1)).all()
+
+
+def test_query_outside_data(filled):
+    store, x, values = filled
+    x_points, value_points = store.query(-2.0, -1.0, 100)
+    assert len(x_points) == 0
+    assert value_points.shape == (2, 0)
+
+    # only the sample the curve leaves the data from
+    x_points, value_points = store.query(100.0, 200.0, 100)
+    np.testing.assert_array_equal(x_points, x[-1:])
+    np.testing.assert_array_equal(value_points, values[:, -1:])
+
+
+def test_append_rejects_x_going_back(filled):
+    store, _, _ = filled
+    with pytest.raises(ValueError):
+        store.append(np.array([1.0]), np.zeros(1), np.zeros(1))
+    assert len(store) == SAMPLES
+
+    # equal x is allowed
+    store.append(np.array([store.x_last]), np.zeros(1), np.zeros(1))
+    assert len(store) == SAMPLES + 1
+
+
+def test_append_checks_channels():
+    with pytest.raises(ValueError):
+        LodStore(2).append(np.zeros(1), np.zeros(1))
+
+
+def test_clear_starts_over(filled):
+    store, _, _ = filled
+    store.clear()
+
+    assert len(store) == 0
+    assert store.level_count == 1
+    assert store.x_last == -np.inf
+    store.append(np.array([0.0, 0.001]), np.zeros(2), np.ones(2))
+    x, values = store.query(0.0, 1.0, 100)
+    np.testing.assert_array_equal(x, [0.0, 0.001])
+    np.testing.assert_array_equal(values, [[0, 0], [1, 1]])
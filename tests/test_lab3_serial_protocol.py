@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from MECH423Lab3GUI.serial_protocol.lab3_serial_protocol import (
+    SERIAL_CONTROL_PAYLOAD_LENGTH,
+    SERIAL_PACKET_LENGTH,
+    SerialControlBytes,
+    SerialFraming,
+    SerialPacket,
+    crc16_ccitt,
+    encode_fixed_command,
+    encode_frame,
+    encode_serial_packets,
+)
+
+rng = np.random.default_rng(423)
+PACKETS = [
+    SerialPacket(
+        control,
+        bytearray(
+            rng.integers(0, 0x100, SERIAL_CONTROL_PAYLOAD_LENGTH[control], np.uint8)
+        ),
+    )
+    for control in SerialControlBytes
+    for _ in range(4)
+]
+
+
+def test_crc16_ccitt_check_value():
+    # CRC-16/CCITT-FALSE
+    assert crc16_ccitt(b"123456789") == 0x29B1
+
+
+@pytest.mark.parametrize("packet", PACKETS)
+def test_fixed_round_trip(packet):
+    frame = packet.to_bytearray()
+
+    assert len(frame) == SERIAL_PACKET_LENGTH
+    assert SerialPacket.from_bytes(frame) == packet
+
+
+@pytest.mark.parametrize("packet", PACKETS)
+def test_compact_round_trip(packet):
+    frame = packet.to_compact_bytearray()
+
+    assert SerialPacket.from_bytes(frame) == packet
+
+
+@pytest.mark.parametrize("packet", PACKETS)
+def test_encode_frame_matches_framing(packet):
+    fixed = packet.to_bytearray()
+
+    assert encode_frame(fixed, SerialFraming.FIXED) == fixed
+    assert encode_frame(fixed, SerialFraming.COMPACT) == packet.to_compact_bytearray()
+    assert SerialPacket.from_bytes(encode_frame(fixed, SerialFraming.COMPACT)) == packet
+
+
+def test_pack_into_reused_buffer():
+    buffer = bytearray(b"\xaa" * (2 * SERIAL_PACKET_LENGTH))
+    for offset, packet in zip((0, SERIAL_PACKET_LENGTH), PACKETS[-2:]):
+        packet.pack_into(buffer, offset)
+
+    assert buffer[:SERIAL_PACKET_LENGTH] == PACKETS[-2].to_bytearray()
+    assert buffer[SERIAL_PACKET_LENGTH:] == PACKETS[-1].to_bytearray()
+
+
+def test_encode_serial_packets_matches_single_frames():
+    control = SerialControlBytes.TWO_AXIS_CONTROL
+    data = rng.integers(0, 0x100, (9, SERIAL_CONTROL_PAYLOAD_LENGTH[control]), np.uint8)
+    frames = encode_serial_packets(control, data)
+
+    for row, frame in zip(data, frames):
+        assert bytes(frame) == SerialPacket(control, bytearray(row)).to_bytearray()
+
+
+def test_encode_fixed_command_is_cached():
+    control = SerialControlBytes.STEPPER_MOTOR_SINGLE_STEP
+
+    assert encode_fixed_command(control, b"\x01") is encode_fixed_command(
+        control, b"\x01"
+    )
+    assert SerialPacket.from_bytes(encode_fixed_command(control, b"\x01")) == (
+        SerialPacket(control, bytearray(b"\x01"))
+    )
+
+
+@pytest.mark.parametrize("index", range(1, SERIAL_PACKET_LENGTH))
+def test_fixed_checksum_detects_corruption(index):
+    frame = PACKETS[0].to_bytearray()
+    frame[index] ^= 0x01
+
+    with pytest.raises(ValueError):
+        SerialPacket.from_bytes(frame)
+
+
+@pytest.mark.parametrize("packet", PACKETS[::4])
+def test_compact_crc_detects_every_single_bit_error(packet):
+    frame = packet.to_compact_bytearray()
+    # the length byte is checked on its own, every other bit is covered by
+    # the CRC
+    for index in range(2, len(frame)):
+        for bit in range(8):
+            corrupted = bytearray(frame)
+            corrupted[index] ^= 1 << bit
+            with pytest.raises(ValueError):
+                SerialPacket.from_bytes(corrupted)
+
+
+@pytest.mark.parametrize(
+    "frame",
+    [
+        b"",
+        b"\x00" * SERIAL_PACKET_LENGTH,
+        PACKETS[0].to_bytearray()[:-1],
+        PACKETS[0].to_compact_bytearray()[:-1],
+        PACKETS[0].to_compact_bytearray()[:3],
+    ],
+)
+def test_invalid_frames(frame):
+    with pytest.raises(ValueError):
+        SerialPacket.from_bytes(frame)
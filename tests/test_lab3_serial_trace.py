@@ -0,0 +1,89 @@
+import struct
+
+import pytest
+
+from MECH423Lab3GUI.telemetry.lab3_serial_trace import (
+    SERIAL_TRACE_FILE_HEADER,
+    SERIAL_TRACE_FILE_MAGIC,
+    SerialTraceDirection,
+    SerialTraceWriter,
+    read_serial_trace,
+)
+
+RECORDS = [
+    (1_000, SerialTraceDirection.TX, b"\xff\x00\x01\x00\x00\x00"),
+    (2_500, SerialTraceDirection.RX, bytes(range(256)) * 3),
+    (2_500, SerialTraceDirection.RX, b""),
+    (-7, SerialTraceDirection.TX, b"\x42"),
+]
+
+
+def _write(path, records, batch_size: int = 1 << 16) -> None:
+    with SerialTraceWriter(path, batch_size) as writer:
+        for timestamp_ns, direction, data in records:
+            writer.write(direction, data, timestamp_ns)
+        assert writer.record_count == len(records)
+
+
+@pytest.mark.parametrize("batch_size", [1, 100, 1 << 16])
+def test_round_trip(tmp_path, batch_size):
+    path = tmp_path / "trace.bin"
+    _write(path, RECORDS, batch_size)
+
+    assert list(read_serial_trace(path)) == RECORDS
+
+
+def test_flush_makes_records_readable(tmp_path):
+    path = tmp_path / "trace.bin"
+    with SerialTraceWriter(path) as writer:
+        writer.write(*RECORDS[0][1:], RECORDS[0][0])
+        writer.flush()
+        assert list(read_serial_trace(path)) == RECORDS[:1]
+
+
+@pytest.mark.parametrize("cut", [1, 5, 14])
+def test_truncated_last_record_is_ignored(tmp_path, cut):
+    path = tmp_path / "trace.bin"
+    _write(path, RECORDS[:2])
+    path.write_bytes(path.read_bytes()[:-cut])
+
+    assert list(read_serial_trace(path)) == RECORDS[:1]
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        b"",
+        b"L3S",
+        SERIAL_TRACE_FILE_HEADER.pack(b"L3RC", 1),
+        SERIAL_TRACE_FILE_HEADER.pack(SERIAL_TRACE_FILE_MAGIC, 99),
+    ],
+)
+def test_rejects_other_files(tmp_path, header):
+    path = tmp_path / "trace.bin"
+    path.write_bytes(header)
+
+    with pytest.raises(ValueError):
+        list(read_serial_trace(path))
+
+
+def test_record_over_64_kib(tmp_path):
+    path = tmp_path / "trace.bin"
+    records = [
+        (1, SerialTraceDirection.RX, bytes(range(256)) * 1024),
+        (2, SerialTraceDirection.TX, b"\x01"),
+    ]
+    _write(path, records)
+
+    assert list(read_serial_trace(path)) == records
+
+
+def test_reads_version_1(tmp_path):
+    path = tmp_path / "trace.bin"
+    record_header = struct.Struct("<qBxH")
+    data = SERIAL_TRACE_FILE_HEADER.pack(SERIAL_TRACE_FILE_MAGIC, 1)
+    for timestamp_ns, direction, payload in RECORDS:
+        data += record_header.pack(timestamp_ns, direction, len(payload)) + payload
+    path.write_bytes(data)
+
+    assert list(read_serial_trace(path)) == RECORDS
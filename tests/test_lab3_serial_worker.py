@@ -0,0 +1,132 @@
+import os
+import time
+import uuid
+
+import pytest
+
+from MECH423Lab3GUI.instrumentation.lab3_metrics import metrics
+from MECH423Lab3GUI.serial_protocol.lab3_motor_commands import (
+    dc_motor_duty_command,
+    stepper_motor_single_step_command,
+)
+from MECH423Lab3GUI.serial_protocol.lab3_serial_protocol import SerialFraming
+from MECH423Lab3GUI.simulator.lab3_mcu_simulator import (
+    MCUSimulatorPty,
+    MCUSimulatorSocket,
+)
+from MECH423Lab3GUI.worker.lab3_serial_worker import SerialWorker
+
+BAUD_RATE = 115200
+
+
+@pytest.fixture
+def simulator_socket():
+    simulator_socket = MCUSimulatorSocket(telemetry_rate=1000.0)
+    simulator_socket.start()
+    yield simulator_socket
+    simulator_socket.stop()
+
+
+@pytest.fixture
+def worker(qt_app):
+    scope = f"test_{uuid.uuid4().hex[:8]}"
+    worker = SerialWorker(metrics_scope=scope)
+    worker.scope = scope
+    worker.events = []
+    worker.packet_count = 0
+    worker.signal_opened.connect(lambda opened: worker.events.append(opened))
+    worker.signal_connection_lost.connect(lambda: worker.events.append("lost"))
+    worker.signal_framing_changed.connect(
+        lambda framing: worker.events.append(SerialFraming(framing))
+    )
+    worker.signal_tx_statistics.connect(
+        lambda statistics: setattr(worker, "tx_statistics", statistics)
+    )
+
+    def count_packets(batch):
+        worker.packet_count += len(batch)
+
+    worker.signal_packets_received.connect(count_packets)
+    yield worker
+    worker.slot_close()
+
+
+def _open(worker, simulator_socket, framing=SerialFraming.FIXED, window=0):
+    worker.slot_open(simulator_socket.port_name, BAUD_RATE, framing, window)
+    assert worker.events[0] is True
+
+
+def test_receives_telemetry(worker, simulator_socket, process_events):
+    _open(worker, simulator_socket)
+
+    assert process_events(2.0, lambda: worker.packet_count >= 100)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="pseudo terminals need posix")
+def test_receives_telemetry_over_a_pty(worker, process_events):
+    simulator_pty = MCUSimulatorPty(telemetry_rate=1000.0)
+    simulator_pty.start()
+    try:
+        _open(worker, simulator_pty)
+        assert process_events(2.0, lambda: worker.packet_count >= 100)
+    finally:
+        worker.slot_close()
+        simulator_pty.stop()
+
+
+def test_commands_reach_the_simulator(worker, simulator_socket, process_events):
+    simulator = simulator_socket.simulator
+    _open(worker, simulator_socket)
+
+    worker.slot_write(dc_motor_duty_command(-1000), time.perf_counter_ns())
+    worker.slot_write(stepper_motor_single_step_command(True), time.perf_counter_ns())
+
+    assert process_events(2.0, lambda: simulator.rx_packet_count == 2)
+    assert simulator.dc_motor_duty == -1000
+    assert simulator.stepper_motor_position == 1
+    # the time since the command was issued is recorded once it was written
+    histogram = metrics.scope(worker.scope).histogram("tx_end_to_end_latency_ns")
+    assert process_events(2.0, lambda: histogram.count == 2)
+
+
+def test_switches_framing(worker, simulator_socket, process_events):
+    simulator = simulator_socket.simulator
+    _open(worker, simulator_socket, SerialFraming.COMPACT)
+
+    assert process_events(2.0, lambda: SerialFraming.COMPACT in worker.events)
+    worker.slot_write(dc_motor_duty_command(500), time.perf_counter_ns())
+    assert process_events(2.0, lambda: simulator.dc_motor_duty == 500)
+    assert simulator.rx_checksum_error_count == 0
+
+
+def test_flow_control_is_acknowledged(worker, simulator_socket, process_events):
+    simulator = simulator_socket.simulator
+    _open(worker, simulator_socket, window=8)
+
+    for _ in range(40):
+        worker.slot_write(
+            stepper_motor_single_step_command(True), time.perf_counter_ns()
+        )
+    assert process_events(5.0, lambda: simulator.stepper_motor_position == 40)
+    # the markers the scheduler added are acknowledged as well
+    assert process_events(
+        2.0,
+        lambda: getattr(worker, "tx_statistics", {}).get("acked", 0) > 40
+        and worker.tx_statistics["in_flight"] == 0,
+    )
+    assert worker.tx_statistics["sent"] == 40
+    assert worker.tx_statistics["ack_timeouts"] == 0
+
+
+def test_reports_lost_connection(worker, simulator_socket, process_events):
+    _open(worker, simulator_socket)
+    simulator_socket.stop()
+
+    assert process_events(2.0, lambda: "lost" in worker.events)
+
+
+@pytest.mark.parametrize("port_name", ["socket://127.0.0.1:x", "socket://127.0.0.1"])
+def test_rejects_invalid_address(worker, port_name):
+    worker.slot_open(port_name, BAUD_RATE, SerialFraming.FIXED, 0)
+
+    assert worker.events == [False]
@@ -0,0 +1,207 @@
+import multiprocessing
+import os
+import uuid
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from MECH423Lab3GUI.telemetry.lab3_encoder_dsp import ENCODER_COUNT_OFFSET
+from MECH423Lab3GUI.telemetry.lab3_shared_telemetry import (
+    SharedTelemetryPublisher,
+    SharedTelemetryReader,
+)
+
+
+def _samples(start: int, count: int) -> tuple[np.ndarray, np.ndarray]:
+    # position i at count 0x4000 + i, wrapping the 16 bit counter
+    indices = np.arange(start, start + count)
+    counts = ((ENCODER_COUNT_OFFSET + indices) % 0x10000).astype(np.uint16)
+    return counts, indices * 10
+
+
+@pytest.fixture
+def name():
+    return f"mech423_lab3_test_{uuid.uuid4().hex[:12]}"
+
+
+def test_read_follows_publisher(name):
+    with SharedTelemetryPublisher(name, capacity=64) as publisher:
+        publisher.publish(*_samples(0, 5))
+        with SharedTelemetryReader(name) as reader:
+            # reading starts with records published after opening
+            assert len(reader.read()) == 0
+            publisher.publish(*_samples(5, 10))
+            records = reader.read()
+
+            np.testing.assert_array_equal(records["position"], np.arange(5, 15))
+            np.testing.assert_array_equal(
+                records["timestamp_ns"], np.arange(5, 15) * 10
+            )
+            assert reader.record_count == 15
+            assert reader.dropped_count == 0
+            assert len(reader.read()) == 0
+
+
+def test_read_limit(name):
+    with SharedTelemetryPublisher(name, capacity=64) as publisher:
+        with SharedTelemetryReader(name) as reader:
+            publisher.publish(*_samples(0, 20))
+
+            assert list(reader.read(8)["position"]) == list(range(8))
+            assert list(reader.read()["position"]) == list(range(8, 20))
+
+
+def test_wraparound_and_dropped_records(name):
+    with SharedTelemetryPublisher(name, capacity=16) as publisher:
+        with SharedTelemetryReader(name) as reader:
+            for start in range(0, 40, 7):
+                publisher.publish(*_samples(start, 7))
+
+            # 42 records written, the ring holds the newest 16
+            records = reader.read()
+            np.testing.assert_array_equal(records["position"], np.arange(26, 42))
+            assert reader.dropped_count == 26
+
+            publisher.publish(*_samples(42, 3))
+            np.testing.assert_array_equal(reader.read()["position"], [42, 43, 44])
+            assert reader.dropped_count == 26
+
+
+def test_batch_larger_than_ring(name):
+    with SharedTelemetryPublisher(name, capacity=16) as publisher:
+        with SharedTelemetryReader(name) as reader:
+            publisher.publish(*_samples(0, 50))
+
+            records = reader.read()
+            np.testing.assert_array_equal(records["position"], np.arange(34, 50))
+            np.testing.assert_array_equal(records["count"], _samples(34, 16)[0])
+            assert reader.dropped_count == 34
+
+
+def test_latest(name):
+    with SharedTelemetryPublisher(name, capacity=16) as publisher:
+        with SharedTelemetryReader(name) as reader:
+            publisher.publish(*_samples(0, 30))
+
+            np.testing.assert_array_equal(
+                reader.latest(4)["position"], [26, 27, 28, 29]
+            )
+            # no more than the ring holds
+            assert len(reader.latest(100)) == 16
+            # latest does not consume
+            assert len(reader.read()) == 16
+
+
+def test_reader_does_not_unlink(name):
+    with SharedTelemetryPublisher(name, capacity=16) as publisher:
+        with SharedTelemetryReader(name) as reader:
+            assert reader.is_open
+        # the segment outlives its readers
+        with SharedTelemetryReader(name) as reader:
+            publisher.publish(*_samples(0, 3))
+            assert len(reader.read()) == 3
+
+    with pytest.raises(FileNotFoundError):
+        SharedTelemetryReader(name)
+
+
+def test_reader_sees_close(name):
+    publisher = SharedTelemetryPublisher(name, capacity=16)
+    with SharedTelemetryReader(name) as reader:
+        publisher.close()
+        assert not reader.is_open
+
+
+def test_running_publisher_is_not_replaced(name):
+    with SharedTelemetryPublisher(name, capacity=16) as publisher:
+        with pytest.raises(FileExistsError, match=str(os.getpid())):
+            SharedTelemetryPublisher(name, capacity=16)
+
+        with SharedTelemetryReader(name) as reader:
+            publisher.publish(*_samples(0, 3))
+            assert len(reader.read()) == 3
+
+
+def test_other_memory_is_not_replaced(name):
+    memory = shared_memory.SharedMemory(name, True, 4096)
+    try:
+        with pytest.raises(FileExistsError):
+            SharedTelemetryPublisher(name, capacity=16)
+        assert bytes(memory.buf[:4]) == bytes(4)
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def _abandon(name: str) -> None:
+    publisher = SharedTelemetryPublisher(name, capacity=16)
+    publisher.publish(*_samples(0, 3))
+    # exits without closing
+    os._exit(0)
+
+
+def test_abandoned_publisher_is_replaced(name):
+    process = multiprocessing.get_context("spawn").Process(
+        target=_abandon, args=(name,)
+    )
+    process.start()
+    process.join(30)
+    with SharedTelemetryReader(name) as reader:
+        assert reader.is_open
+
+    with SharedTelemetryPublisher(name, capacity=16) as publisher:
+        with SharedTelemetryReader(name) as reader:
+            assert reader.record_count == 0
+            publisher.publish(*_samples(0, 3))
+            assert len(reader.read()) == 3
+
+
+def _publish(name: str, batches: int, ready, start, done, release) -> None:
+    with SharedTelemetryPublisher(name, capacity=4096) as publisher:
+        ready.set()
+        start.wait()
+        for batch in range(batches):
+            publisher.publish(*_samples(batch * 7, 7))
+        done.set()
+        # the reader finishes before the segment goes away
+        release.wait()
+
+
+def test_reader_in_another_process_sees_consistent_records(name):
+    context = multiprocessing.get_context("spawn")
+    ready, start, done, release = (context.Event() for _ in range(4))
+    batches = 20_000
+    process = context.Process(
+        target=_publish, args=(name, batches, ready, start, done, release)
+    )
+    process.start()
+    try:
+        assert ready.wait(30)
+        with SharedTelemetryReader(name) as reader:
+            start.set()
+            received = 0
+            finished = False
+            while not finished:
+                finished = done.is_set()
+                records = reader.read()
+                received += len(records)
+                # the whole ring starts with the records overwritten next
+                for records in (records, reader.latest(reader.capacity)):
+                    # a torn copy would mix records from different batches
+                    positions = records["position"]
+                    np.testing.assert_array_equal(np.diff(positions), 1)
+                    np.testing.assert_array_equal(
+                        records["timestamp_ns"], positions * 10
+                    )
+                    np.testing.assert_array_equal(
+                        records["count"],
+                        (ENCODER_COUNT_OFFSET + positions) % 0x10000,
+                    )
+
+            assert received + reader.dropped_count == batches * 7
+    finally:
+        start.set()
+        release.set()
+        process.join(30)
+    assert process.exitcode == 0
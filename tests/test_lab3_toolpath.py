@@ -0,0 +1,201 @@
+import numpy as np
+import pytest
+
+from MECH423Lab3GUI.motion.lab3_toolpath import (
+    GCODE_ARC_TOLERANCE_CM,
+    StreamingTrajectoryPlanner,
+    ToolpathReader,
+    iter_csv,
+    iter_gcode,
+)
+from MECH423Lab3GUI.motion.lab3_trajectory_planner import (
+    X_ENCODER_TICKS_PER_CM,
+    Y_HALF_STEPS_PER_CM,
+    VelocityProfile,
+    plan_polyline,
+)
+
+SPEED = 5.0
+
+
+def gcode(*lines: str) -> list[tuple[float, float, float]]:
+    return list(iter_gcode(lines, SPEED))
+
+
+def test_gcode_units():
+    points = gcode("G21 G1 X10 Y-5", "G20 G1 X1 Y0.5", "G21 X3")
+
+    np.testing.assert_allclose(
+        points, [(1.0, -0.5, SPEED), (2.54, 1.27, SPEED), (0.3, 1.27, SPEED)]
+    )
+
+
+def test_gcode_absolute_and_relative():
+    points = gcode("G1 X10 Y10", "G91", "G1 X5", "G1 Y-20", "G90 G1 X0")
+
+    np.testing.assert_allclose(
+        [point[:2] for point in points],
+        [(1.0, 1.0), (1.5, 1.0), (1.5, -1.0), (0.0, -1.0)],
+    )
+
+
+def test_gcode_feed_rate():
+    # F is in mm per minute, capped at the configured speed
+    points = gcode("G1 X1 F60", "G1 X2", "G0 X3", "G1 X4 F6000")
+
+    np.testing.assert_allclose([point[2] for point in points], [0.1, 0.1, SPEED, SPEED])
+
+
+def test_gcode_motion_is_modal():
+    points = gcode("G1 F60", "G0 X10", "X20", "G1 X30", "X40", "Y10")
+
+    np.testing.assert_allclose(
+        [point[2] for point in points], [SPEED, SPEED, 0.1, 0.1, 0.1]
+    )
+
+
+def _assert_on_arc(points, center, radius):
+    points = np.array(points)[:, :2]
+    assert np.hypot(*(points - center).T) == pytest.approx(radius)
+    # chord middles stay within the tolerance
+    middles = (points[1:] + points[:-1]) / 2
+    assert (radius - np.hypot(*(middles - center).T) <= GCODE_ARC_TOLERANCE_CM).all()
+
+
+def test_gcode_clockwise_arc():
+    points = gcode("G1 X10 F60", "G2 X20 Y0 I5 J0")[1:]
+
+    _assert_on_arc(points, (1.5, 0.0), 0.5)
+    # clockwise from the left goes over the top
+    assert all(y > 0 for _, y, _ in points[:-1])
+    assert points[-1] == (2.0, 0.0, 0.1)
+    assert {speed for _, _, speed in points} == {0.1}
+
+
+def test_gcode_counterclockwise_arc_is_modal():
+    points = gcode("G1 X10", "G3 X20 Y0 I5", "X30 I5 J0")[1:]
+
+    # counterclockwise from the left goes under the bottom
+    assert all(y < 1e-12 for _, y, _ in points)
+    _assert_on_arc(points[: len(points) // 2], (1.5, 0.0), 0.5)
+    _assert_on_arc(points[len(points) // 2 :], (2.5, 0.0), 0.5)
+    assert points[-1][:2] == (3.0, 0.0)
+
+
+def test_gcode_full_circle():
+    points = gcode("G0 X10", "G2 I-10 J0")[1:]
+
+    _assert_on_arc(points, (0.0, 0.0), 1.0)
+    assert len(points) > 8
+    np.testing.assert_allclose(points[-1][:2], (1.0, 0.0))
+
+
+@pytest.mark.parametrize(
+    "radius, center", [(20, (1.0, -(3**0.5))), (-20, (1.0, 3**0.5))]
+)
+def test_gcode_radius_arc(radius, center):
+    points = gcode(f"G2 X20 Y0 R{radius}")
+
+    _assert_on_arc(points, center, 2.0)
+    # a negative radius takes the long way round
+    assert (max(y for _, y, _ in points) > 2) == (radius < 0)
+
+
+def test_gcode_relative_arc():
+    points = gcode("G91 G1 X10 Y10", "G3 X-10 Y10 I-10")
+
+    _assert_on_arc(points[1:], (0.0, 1.0), 1.0)
+    np.testing.assert_allclose(points[-1][:2], (0.0, 2.0))
+
+
+@pytest.mark.parametrize(
+    "line",
+    ["G2 X20 Y0 I3 J0", "G2 X20 Y0", "G2 X20 Y0 R5", "G28 X0", "G4 P1", "G18"],
+)
+def test_gcode_rejects_unsupported_moves(line):
+    with pytest.raises(ValueError, match="line 2"):
+        gcode("G1 X1", line)
+
+
+def test_gcode_skips_comments_and_other_words():
+    points = gcode(
+        "; header",
+        "(tool change)",
+        "M3 S1000",
+        "G1 X10 (move) Y20 ; done",
+        "",
+        "N10 G17 G94 G1 Z5",
+    )
+
+    assert points == [(1.0, 2.0, SPEED)]
+
+
+def test_csv():
+    points = list(iter_csv(["x,y,speed", "1, 2", "", "3;4;2.5", "5,6,99", "7"], SPEED))
+
+    assert points == [(1.0, 2.0, SPEED), (3.0, 4.0, 2.5), (5.0, 6.0, SPEED)]
+
+
+@pytest.mark.parametrize(
+    "lines", [["G1 X1 F0"], ["G1 X1", "G1 X2 F-60"], ["G1 X" + "9" * 400]]
+)
+def test_gcode_rejects_invalid_values(lines):
+    with pytest.raises(ValueError, match=f"line {len(lines)}"):
+        gcode(*lines)
+
+
+@pytest.mark.parametrize("line", ["nan,1", "1,inf", "1,2,0", "1,2,-3"])
+def test_csv_rejects_invalid_values(line):
+    with pytest.raises(ValueError, match="line 2"):
+        list(iter_csv(["0,0", line], SPEED))
+
+
+def _planned(path, segments_per_chunk: int) -> list:
+    return list(
+        StreamingTrajectoryPlanner(
+            ToolpathReader(path, SPEED),
+            30.0,
+            VelocityProfile.TRAPEZOIDAL,
+            segments_per_chunk,
+        )
+    )
+
+
+@pytest.mark.parametrize("segments_per_chunk", [1, 4, 7, 64])
+def test_streaming_planner_matches_whole_path(tmp_path, segments_per_chunk):
+    rng = np.random.default_rng(423)
+    points = np.round(rng.uniform(-40, 40, (23, 2)), 3)
+    path = tmp_path / "path.nc"
+    path.write_text("G21 G90\n" + "".join(f"G1 X{x} Y{y} F600\n" for x, y in points))
+    # the stage position is the origin of the path
+    whole = plan_polyline(
+        np.vstack([(0.0, 0.0), points / 10]),
+        np.full(len(points), 1.0),
+        30.0,
+        VelocityProfile.TRAPEZOIDAL,
+    )
+
+    chunks = _planned(path, segments_per_chunk)
+
+    assert len(chunks) == -(-len(points) // segments_per_chunk)
+    np.testing.assert_array_equal(
+        np.concatenate([chunk.x_steps for chunk in chunks]), whole.x_steps
+    )
+    np.testing.assert_array_equal(
+        np.concatenate([chunk.y_steps for chunk in chunks]), whole.y_steps
+    )
+    assert whole.x_steps.sum() == np.rint(points[-1, 0] / 10 * X_ENCODER_TICKS_PER_CM)
+    assert whole.y_steps.sum() == np.rint(points[-1, 1] / 10 * Y_HALF_STEPS_PER_CM)
+
+
+def test_reader_progress(tmp_path):
+    path = tmp_path / "path.csv"
+    path.write_text("x,y\n1,0\n1,1\n")
+    reader = ToolpathReader(path, SPEED)
+    assert reader.progress == 0.0
+
+    points = iter(reader)
+    next(points)
+    assert 0.0 < reader.progress < 1.0
+    assert list(points) == [(1.0, 1.0, SPEED)]
+    assert reader.progress == 1.0
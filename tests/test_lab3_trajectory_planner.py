@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from MECH423Lab3GUI.motion.lab3_trajectory_planner import (
+    TRAJECTORY_TICK_S,
+    X_ENCODER_TICKS_PER_CM,
+    Y_HALF_STEPS_PER_CM,
+    VelocityProfile,
+    plan_line,
+    plan_polyline,
+    velocity_profile,
+)
+
+
+@pytest.mark.parametrize("profile", list(VelocityProfile))
+@pytest.mark.parametrize("length", [0.013, 1.0, 7.31, 40.0])
+def test_velocity_profile_covers_length(profile, length):
+    velocity = velocity_profile(length, 5.0, 20.0, profile)
+
+    assert velocity.sum() * TRAJECTORY_TICK_S == pytest.approx(length)
+    assert (velocity >= 0).all()
+
+
+@pytest.mark.parametrize(
+    "profile", [VelocityProfile.TRAPEZOIDAL, VelocityProfile.S_CURVE]
+)
+def test_velocity_profile_ramps_from_rest(profile):
+    velocity = velocity_profile(20.0, 5.0, 20.0, profile)
+
+    assert velocity[0] < velocity.max() / 10
+    assert velocity[-1] < velocity.max() / 10
+    # rescaling to the exact length only nudges the peak
+    assert velocity.max() == pytest.approx(5.0, rel=0.02)
+
+
+def test_velocity_profile_empty_segment():
+    assert len(velocity_profile(0.0, 5.0, 20.0, VelocityProfile.S_CURVE)) == 0
+
+
+@pytest.mark.parametrize("profile", list(VelocityProfile))
+@pytest.mark.parametrize(
+    "target", [(3.0, 4.0), (-2.37, 0.91), (0.0, -5.555), (12.3, 0.0)]
+)
+def test_plan_line_reaches_target_exactly(profile, target):
+    x_cm, y_cm = target
+    trajectory = plan_line(x_cm, y_cm, 5.0, 20.0, profile)
+
+    assert trajectory.x_steps.sum() == np.rint(x_cm * X_ENCODER_TICKS_PER_CM)
+    assert trajectory.y_steps.sum() == np.rint(y_cm * Y_HALF_STEPS_PER_CM)
+    assert trajectory.frames.shape == (len(trajectory), 16)
+
+
+def test_plan_line_stepper_intervals():
+    trajectory = plan_line(5.0, 0.5, 5.0, 20.0, VelocityProfile.TRAPEZOIDAL)
+
+    idle = trajectory.y_steps == 0
+    assert (trajectory.stepper_intervals[idle] == 0xFFFF).all()
+    assert (trajectory.stepper_intervals[~idle] >= 1).all()
+    assert (trajectory.stepper_intervals <= 0xFFFF).all()
+
+
+def test_plan_line_rejects_steps_beyond_packet_range():
+    with pytest.raises(ValueError):
+        plan_line(1000.0, 0.0, 1e6, 0.0, VelocityProfile.CONSTANT)
+
+
+def test_chunked_polyline_matches_whole_polyline():
+    rng = np.random.default_rng(423)
+    points = np.cumsum(rng.uniform(-3, 3, (13, 2)), axis=0)
+    speeds = rng.uniform(1, 8, len(points) - 1)
+    whole = plan_polyline(points, speeds, 30.0, VelocityProfile.S_CURVE)
+
+    # chunks share their end points and are planned against the same origin
+    chunks = [
+        plan_polyline(
+            points[start : start + 5],
+            speeds[start : start + 4],
+            30.0,
+            VelocityProfile.S_CURVE,
+            origin_cm=points[0],
+        )
+        for start in range(0, len(points) - 1, 4)
+    ]
+
+    np.testing.assert_array_equal(
+        np.concatenate([chunk.x_steps for chunk in chunks]), whole.x_steps
+    )
+    np.testing.assert_array_equal(
+        np.concatenate([chunk.y_steps for chunk in chunks]), whole.y_steps
+    )
+    assert whole.x_steps.sum() == np.rint(
+        (points[-1, 0] - points[0, 0]) * X_ENCODER_TICKS_PER_CM
+    )
+    assert whole.y_steps.sum() == np.rint(
+        (points[-1, 1] - points[0, 1]) * Y_HALF_STEPS_PER_CM
+    )
@@ -0,0 +1,201 @@
+import time
+
+import pytest
+
+from MECH423Lab3GUI.serial_protocol.lab3_serial_protocol import (
+    SerialControlBytes,
+    SerialPacket,
+)
+from MECH423Lab3GUI.worker.lab3_tx_scheduler import TxScheduler
+
+FRAME_TIME_S = 16 / 960  # one fixed frame at 9600 baud
+
+
+def _command(control: SerialControlBytes, value: int) -> bytearray:
+    return SerialPacket(
+        control, bytearray([int(value > 0), abs(value) >> 8, abs(value) & 0xFF])
+    ).to_bytearray()
+
+
+def duty(value: int) -> bytearray:
+    return _command(SerialControlBytes.DC_MOTOR_OPEN_LOOP_VOLTAGE, value)
+
+
+def position(value: int) -> bytearray:
+    return _command(SerialControlBytes.DC_MOTOR_ABSOLUTE_POSITION, value)
+
+
+def stepper_speed(value: int) -> bytearray:
+    return _command(SerialControlBytes.STEPPER_MOTOR_OPEN_LOOP_SPEED, value)
+
+
+STEPPER_STOP = SerialPacket(
+    SerialControlBytes.STEPPER_MOTOR_OPEN_LOOP_SPEED, bytearray([0, 0xFF, 0xFF])
+).to_bytearray()
+FILLER = SerialPacket(
+    SerialControlBytes.STEPPER_MOTOR_SINGLE_STEP, bytearray([1])
+).to_bytearray()
+
+
+@pytest.fixture
+def scheduler(qt_app):
+    scheduler = TxScheduler()
+    scheduler.sent = []
+    scheduler.issued = []
+    scheduler.signal_dispatch.connect(
+        lambda frame, issued_ns: (
+            scheduler.sent.append(bytes(frame)),
+            scheduler.issued.append(issued_ns),
+        )
+    )
+    yield scheduler
+    scheduler.clear()
+
+
+def _fill_bucket(scheduler: TxScheduler) -> None:
+    # two frames use up the burst at 9600 baud, later ones wait for tokens
+    scheduler.submit(FILLER)
+    scheduler.submit(FILLER)
+    assert scheduler.sent == [bytes(FILLER)] * 2
+
+
+def _drain(scheduler: TxScheduler, process_events) -> list[bytes]:
+    assert process_events(2.0, lambda: scheduler.queue_depth == 0)
+    # nothing else follows
+    process_events(3 * FRAME_TIME_S)
+    return scheduler.sent[2:]
+
+
+def test_sends_within_burst_immediately(scheduler):
+    scheduler.submit(duty(10))
+
+    assert scheduler.sent == [bytes(duty(10))]
+    assert scheduler.queue_depth == 0
+
+
+def test_coalesces_queued_values(scheduler, process_events):
+    _fill_bucket(scheduler)
+    for value in (10, 20, 30):
+        scheduler.submit(duty(value))
+    assert scheduler.queue_depth == 1
+
+    assert _drain(scheduler, process_events) == [bytes(duty(30))]
+    assert scheduler.statistics()["coalesced"] == 2
+
+
+def test_issue_time_follows_frame(scheduler, process_events):
+    before_ns = time.perf_counter_ns()
+    _fill_bucket(scheduler)
+    # frames submitted without one are issued when they are submitted
+    assert all(issued_ns >= before_ns for issued_ns in scheduler.issued)
+
+    # a coalesced value carries the time the newest one was issued
+    scheduler.submit(duty(10), 2)
+    scheduler.submit(duty(20), 3)
+    assert _drain(scheduler, process_events) == [bytes(duty(20))]
+    assert scheduler.issued[-1] == 3
+
+
+def test_does_not_coalesce_different_controls(scheduler, process_events):
+    _fill_bucket(scheduler)
+    scheduler.submit(duty(10))
+    scheduler.submit(stepper_speed(20))
+    scheduler.submit(FILLER)
+
+    assert _drain(scheduler, process_events) == [
+        bytes(duty(10)),
+        bytes(stepper_speed(20)),
+        bytes(FILLER),
+    ]
+
+
+def test_urgent_position_goes_first(scheduler, process_events):
+    _fill_bucket(scheduler)
+    scheduler.submit(stepper_speed(20))
+    scheduler.submit(position(100))
+
+    assert _drain(scheduler, process_events) == [
+        bytes(position(100)),
+        bytes(stepper_speed(20)),
+    ]
+
+
+def test_urgent_supersedes_urgent(scheduler, process_events):
+    _fill_bucket(scheduler)
+    scheduler.submit(position(100))
+    scheduler.submit(position(200))
+
+    assert _drain(scheduler, process_events) == [bytes(position(200))]
+
+
+def test_clear_drops_queued_frames(scheduler, process_events):
+    _fill_bucket(scheduler)
+    scheduler.submit(duty(10))
+    scheduler.clear()
+
+    assert scheduler.queue_depth == 0
+    assert _drain(scheduler, process_events) == []
+
+
+def test_token_bucket_paces_frames(scheduler, process_events):
+    times = []
+    scheduler.signal_dispatch.connect(lambda *_: times.append(time.perf_counter()))
+    for _ in range(8):
+        scheduler.submit(FILLER)
+    assert len(times) == 2
+
+    assert process_events(2.0, lambda: len(times) == 8)
+    # the burst goes out at once, the rest at the byte rate
+    assert times[1] - times[0] < FRAME_TIME_S / 2
+    assert times[-1] - times[1] >= 6 * FRAME_TIME_S * 0.9
+
+
+def test_higher_baud_rate_paces_faster(scheduler, process_events):
+    scheduler.set_baud_rate(115200)
+    start = time.perf_counter()
+    for _ in range(40):
+        scheduler.submit(FILLER)
+
+    assert process_events(2.0, lambda: len(scheduler.sent) == 40)
+    # 38 frames after the burst take 53 ms at 115200 baud, 633 ms at 9600
+    assert time.perf_counter() - start < 38 * FRAME_TIME_S / 2
+
+
+def test_urgent_drops_stale_commands_for_the_same_motor(scheduler, process_events):
+    _fill_bucket(scheduler)
+    scheduler.submit(duty(50))
+    scheduler.submit(stepper_speed(20))
+    scheduler.submit(position(100))
+
+    # the queued duty would otherwise undo the position move
+    assert _drain(scheduler, process_events) == [
+        bytes(position(100)),
+        bytes(stepper_speed(20)),
+    ]
+
+
+def test_normal_after_urgent_stop_keeps_order(scheduler, process_events):
+    _fill_bucket(scheduler)
+    scheduler.submit(stepper_speed(20))
+    scheduler.submit(STEPPER_STOP)
+    scheduler.submit(stepper_speed(30))
+
+    assert _drain(scheduler, process_events) == [
+        bytes(STEPPER_STOP),
+        bytes(stepper_speed(30)),
+    ]
+
+
+def test_idle_commands_get_a_marker(scheduler, process_events):
+    scheduler.set_flow_control_window(8)
+    scheduler.submit(duty(10))
+    assert scheduler.sent == [bytes(duty(10))]
+
+    # one command is short of the acknowledgement interval
+    assert process_events(
+        10 * TxScheduler.ACK_IDLE_MS / 1e3, lambda: len(scheduler.sent) == 2
+    )
+    marker = scheduler.sent[1]
+    assert (marker[1] << 8) + marker[2] == SerialControlBytes.ECHO
+    scheduler.acknowledge(marker[4], 0)
+    assert scheduler.credit == 8